@@ -6,18 +6,24 @@ import sys
 from .version import __version__
 from . import meshmerizeme_logger as logger
 
-import platform
-import matplotlib
-if platform.system() == "Darwin":
-    try:
-        matplotlib.use("Qt5Agg")
-    except:
-        logger.warning("The Qt5Agg backend was not found for matplotlib, so some graphical features may not work properly. " \
-                      + "Please see the MeshmerizeMe wiki on Github for more details.")
-        matplotlib.use("TkAgg")
-else:
-    matplotlib.use("TkAgg")
-
 from .geo_obj import *
-from .tools import *
 
+# The contour tools need OpenCV, SciPy and pyplot, which take long to import.
+# Their names are only resolved on first use (PEP 562), so that meshing does not
+# pay for them. The matplotlib backend is selected by mpl_backend when pyplot is
+# first needed.
+_TOOLS_NAMES = {
+    "eps", "cubic_smooth_bezier", "dotproduct", "brightness_v2", "Contours",
+    "brightness", "get_rets", "get_diameters", "Chanvese", "bwdist",
+    "show_curve_and_phi", "im2double", "mask2phi", "get_curvature", "sussman",
+    "sussman_sign", "convergence"
+}
+
+def __getattr__(name):
+    if name in _TOOLS_NAMES:
+        from . import tools
+        return getattr(tools, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | _TOOLS_NAMES)
@@ -5,12 +5,17 @@
 # Classes to handle the various geo_objects
 #      - Vertex: the x,y grid of points. It's elements will be used as
 #           as references for other objects in the plane.
+#      - VertexArray: many vertices stored in one (N,2) array.
 #      - Spring
 #      - Beam
 #      - Porous Point
 #      - Mass
 # ==============================================================================
 
+import json
+import itertools
+import numpy as np
+
 class Vertex():
     """
     defines the x,y Lagrangian nodes
@@ -31,6 +36,124 @@ class Vertex():
         """
         return repr(self.x) + " " + repr(self.y) + "\n" # neede to implement
 
+class VertexView(Vertex):
+    """
+    Vertex backed by one row of the array of a VertexArray. Changing its
+    x or y changes the VertexArray.
+    """
+    def __init__(self, coords, index):
+        self._coords = coords
+        self._index = index
+
+    @property
+    def x(self):
+        return float(self._coords[self._index, 0])
+
+    @x.setter
+    def x(self, x):
+        self._coords[self._index, 0] = x
+
+    @property
+    def y(self):
+        return float(self._coords[self._index, 1])
+
+    @y.setter
+    def y(self, y):
+        self._coords[self._index, 1] = y
+
+class VertexArray():
+    """
+    defines many x,y Lagrangian nodes at once, stored in an (N,2) float64
+    array instead of one Vertex object per node. Indexing and iterating
+    give Vertex views of the rows, so it can be used like a list of Vertex.
+    """
+    def __init__(self, coords):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+    @classmethod
+    def from_complex(cls, points):
+        """
+        Creates a VertexArray from an array of complex coordinates x + iy.
+        """
+        points = np.asarray(points, dtype=complex)
+        return cls(np.column_stack((points.real, points.imag)))
+
+    @classmethod
+    def from_vertices(cls, vertices):
+        """
+        Creates a VertexArray from a list of Vertex objects.
+        """
+        return cls([ vertex.getPos() for vertex in vertices ])
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return VertexArray(self.coords[index])
+        if index < 0:
+            index += len(self.coords)
+        if not 0 <= index < len(self.coords):
+            raise IndexError("VertexArray index out of range")
+        return VertexView(self.coords, index)
+
+    def __iter__(self):
+        for index in range(len(self.coords)):
+            yield VertexView(self.coords, index)
+
+    def getType(self):
+        return "vertex"
+
+    def get_distances(self):
+        """
+        Returns the Euclidean distances between consecutive vertices.
+        """
+        return np.hypot(*np.diff(self.coords, axis=0).T)
+
+    def get_spacing_errors(self, ds, point_counts=None):
+        """
+        Returns the relative errors |distance - ds|/ds of the distances between
+        consecutive vertices.
+
+        Args:
+            ds: desired distance between vertices.
+            point_counts: optional number of vertices of each path, if the
+                vertices of several paths follow each other. The distances
+                between the last vertex of a path and the first vertex of the
+                next path are left out.
+        """
+        rel_errors = np.abs(self.get_distances() - ds) / ds
+        if point_counts is None:
+            return rel_errors
+        path_ends = np.cumsum(point_counts)[:-1]
+        path_ends = path_ends[(path_ends > 0) & (path_ends < len(self.coords))]
+        return np.delete(rel_errors, path_ends - 1)
+
+    def get_vertex_spacing_errors(self, ds, point_counts=None):
+        """
+        Returns the relative spacing error of each vertex, which is the error
+        of its distance to the previous vertex (see get_spacing_errors). It is
+        NaN for the first vertex of each path.
+
+        Args:
+            ds: desired distance between vertices.
+            point_counts: optional number of vertices of each path, if the
+                vertices of several paths follow each other.
+        """
+        vertex_errors = np.empty(len(self.coords))
+        vertex_errors[:1] = np.nan
+        vertex_errors[1:] = np.abs(self.get_distances() - ds) / ds
+        if point_counts is not None:
+            path_starts = np.cumsum(point_counts)[:-1]
+            vertex_errors[ path_starts[path_starts < len(self.coords)] ] = np.nan
+        return vertex_errors
+
+    def printString(self):
+        """
+        Print vertex strings of all vertices for the .node file.
+        """
+        return _format_array_columns([ self.coords[:, 0], self.coords[:, 1] ])
+
 class Spring():
     """
     defines a spring element.
@@ -106,20 +229,341 @@ class Mass():
                repr(self.kg) + "\n"
         return mstring
 
+#===============================================================================
+# Functions to connect vertices with springs and beams
+#===============================================================================
+
+# Relative tolerance (w.r.t. the extent of a path) within which the first and
+# last vertex of a path must coincide for the path to be treated as closed.
+CLOSED_PATH_TOL = 1e-9
+
+def connect_vertices(vertex_vec, point_counts=None):
+    """
+    Returns the (0-based) ids of the vertices connected by springs and beams.
+    Consecutive vertices of each path are connected by a spring, and each
+    vertex with two neighbors is the middle of a beam. The vertices of several
+    paths can follow each other, see VertexArray.get_spacing_errors.
+
+    A path whose last vertex coincides with its first is closed: its last
+    vertex is left out and its first vertex is connected to its second to last
+    one instead, so that the springs and beams wrap around.
+
+    Returns:
+        spring_ids: (M,2) array of (master, slave) vertex ids.
+        beam_ids: (K,3) array of (left, middle, right) vertex ids.
+    """
+    coords = vertex_vec.coords if isinstance(vertex_vec, VertexArray) else np.asarray(vertex_vec, dtype=np.float64).reshape(-1, 2)
+    if point_counts is None:
+        point_counts = [len(coords)]
+    spring_ids = [np.zeros((0, 2), dtype=np.int64)]
+    beam_ids = [np.zeros((0, 3), dtype=np.int64)]
+    start = 0
+    for count in point_counts:
+        stop = start + count
+        ids = np.arange(start, stop)
+        path_coords = coords[start:stop]
+        is_closed = count >= 4 and np.all( np.abs(path_coords[0] - path_coords[-1])
+                                           <= CLOSED_PATH_TOL * max(1.0, np.ptp(path_coords, axis=0).max()) )
+        if is_closed:
+            ids = ids[:-1]
+            spring_ids.append( np.column_stack((ids, np.roll(ids, -1))) )
+            beam_ids.append( np.column_stack((np.roll(ids, 1), ids, np.roll(ids, -1))) )
+        else:
+            spring_ids.append( np.column_stack((ids[:-1], ids[1:])) )
+            beam_ids.append( np.column_stack((ids[:-2], ids[1:-1], ids[2:])) )
+        start = stop
+    return np.concatenate(spring_ids), np.concatenate(beam_ids)
+
+def get_spring_columns(vertex_vec, spring_ids, stiff, beta, index_base=1):
+    """
+    Returns the columns of the springs between the given vertex ids for
+    write_geo_arrays. The resting length of each spring is the distance
+    between its vertices.
+
+    Args:
+        index_base: id of the first vertex in the file, 1 for IB2d and 0 for IBAMR.
+    """
+    coords = vertex_vec.coords if isinstance(vertex_vec, VertexArray) else np.asarray(vertex_vec, dtype=np.float64).reshape(-1, 2)
+    segment_vectors = coords[spring_ids[:, 1]] - coords[spring_ids[:, 0]]
+    return {
+        "master" : spring_ids[:, 0] + index_base,
+        "slave" : spring_ids[:, 1] + index_base,
+        "stiff" : stiff,
+        "restlen" : np.hypot(segment_vectors[:, 0], segment_vectors[:, 1]),
+        "beta" : beta
+    }
+
+def get_beam_columns(vertex_vec, beam_ids, stiff, index_base=1):
+    """
+    Returns the columns of the beams through the given vertex ids for
+    write_geo_arrays. The curvature of each beam is the cross product of its
+    two segments, as used by the beam force of IB2d, so that the beams are at
+    rest in the meshed geometry.
+
+    Args:
+        index_base: id of the first vertex in the file, 1 for IB2d and 0 for IBAMR.
+    """
+    coords = vertex_vec.coords if isinstance(vertex_vec, VertexArray) else np.asarray(vertex_vec, dtype=np.float64).reshape(-1, 2)
+    left_vectors = coords[beam_ids[:, 1]] - coords[beam_ids[:, 0]]
+    right_vectors = coords[beam_ids[:, 2]] - coords[beam_ids[:, 1]]
+    return {
+        "lID" : beam_ids[:, 0] + index_base,
+        "mID" : beam_ids[:, 1] + index_base,
+        "rID" : beam_ids[:, 2] + index_base,
+        "kb" : stiff,
+        "c" : right_vectors[:, 0] * left_vectors[:, 1] - right_vectors[:, 1] * left_vectors[:, 0]
+    }
+
 #===============================================================================
 # Function to write the various geometry files
 #===============================================================================
+
+# Columns of each geometry file in the order they are written, with their type.
+# The names are the attribute names of the matching geo_object class.
+GEO_COLUMNS = {
+    "vertex" : [("x", float), ("y", float)],
+    "spring" : [("master", int), ("slave", int), ("stiff", float), ("restlen", float), ("beta", float)],
+    "beam"   : [("lID", int), ("mID", int), ("rID", int), ("kb", float), ("c", float)],
+    "porous" : [("lagID", int), ("pcoeff", float), ("stenID", int)],
+    "mass"   : [("lagID", int), ("stiff", float), ("kg", float)]
+}
+
+# Number of rows formatted at once by the bulk writers.
+WRITE_CHUNK_SIZE = 2**16
+
+def _format_rows(columns, value_formats=None):
+    """
+    Formats the rows of the given columns (lists of Python numbers) like the
+    printString methods do, i.e. the repr of each value separated by spaces,
+    or with the given %-format of each column.
+    """
+    num_rows = len(columns[0])
+    row_format = " ".join(value_formats or ["%r"] * len(columns)) + "\n"
+    return (row_format * num_rows) % tuple(itertools.chain.from_iterable(zip(*columns)))
+
+def _format_array_columns(columns):
+    """
+    Formats the rows of the given columns (numpy arrays of equal length). Floats are
+    written with 17 significant digits, which reads back every float64 exactly,
+    integers as they are.
+    """
+    value_formats = [ "%.17g" if column.dtype.kind == "f" else "%d" for column in columns ]
+    return _format_rows([ column.tolist() for column in columns ], value_formats)
+
+def _get_column_arrays(geo_type, columns):
+    """
+    Returns the given columns of geo_type as arrays of equal length, in the order of GEO_COLUMNS.
+    """
+    if geo_type not in GEO_COLUMNS:
+        raise ValueError(f"Unknown geometry type '{geo_type}'. Choose one of {sorted(GEO_COLUMNS)}.")
+    missing_names = [ name for name, _ in GEO_COLUMNS[geo_type] if name not in columns ]
+    if len(missing_names) > 0:
+        raise ValueError(f"Missing column(s) {missing_names} for geometry type '{geo_type}'.")
+    arrays = [ np.asarray(columns[name], dtype=np.int64 if column_type is int else np.float64)
+               for name, column_type in GEO_COLUMNS[geo_type] ]
+    return [ np.atleast_1d(array) for array in np.broadcast_arrays(*arrays) ]
+
+# Width reserved for the element count on the first line of a file whose count is
+# not known in advance (see GeoFileWriter). The count is padded with spaces.
+HEADER_WIDTH = 20
+
+class GeoFileWriter():
+    """
+    Writes a geometry file chunk by chunk, so that the whole geometry never has
+    to be held in memory. If the number of elements is not given in advance,
+    space for it is reserved on the first line and filled in on close.
+    """
+    def __init__(self, filename, geo_type, count=None):
+        """
+        Args:
+            filename: name of the file without the extension.
+            geo_type: type of the elements, see GEO_COLUMNS.
+            count: number of elements that will be written, if known.
+        """
+        if geo_type not in GEO_COLUMNS:
+            raise ValueError(f"Unknown geometry type '{geo_type}'. Choose one of {sorted(GEO_COLUMNS)}.")
+        self.fname = filename + "." + geo_type
+        self.geo_type = geo_type
+        self.count = count
+        self.num_written = 0
+        self.f = open(self.fname, "w", buffering=2**20)
+        if count is None:
+            self.f.write(" " * HEADER_WIDTH + "\n")
+        else:
+            self.f.write(repr(count)+"\n")
+
+    def write(self, **columns):
+        """
+        Writes the elements given by one array (or scalar) per column, see write_geo_arrays.
+        """
+        self.write_columns(_get_column_arrays(self.geo_type, columns))
+
+    def write_columns(self, columns):
+        """
+        Writes the rows of the given columns (numpy arrays or lists of equal length),
+        in the order of GEO_COLUMNS, WRITE_CHUNK_SIZE rows at a time.
+        """
+        n = len(columns[0])
+        is_arrays = all( isinstance(column, np.ndarray) for column in columns )
+        for start in range(0, n, WRITE_CHUNK_SIZE):
+            chunk_columns = [ column[start:start + WRITE_CHUNK_SIZE] for column in columns ]
+            self.f.write(_format_array_columns(chunk_columns) if is_arrays else _format_rows(chunk_columns))
+        self.num_written += n
+
+    def close(self):
+        if self.f.closed:
+            return
+        if self.count is None:
+            self.f.seek(0)
+            self.f.write(repr(self.num_written).ljust(HEADER_WIDTH))
+        self.f.close()
+        if self.count is not None and self.num_written != self.count:
+            raise ValueError(f"Wrote {self.num_written} elements to {self.fname}, but its header says {self.count}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Extension of the file with the spacing error of each vertex, see SpacingErrorWriter.
+SPACING_ERRORS_EXTENSION = "spacing.npy"
+
+# Length reserved for the header of a .npy file whose shape is not known in
+# advance (see SpacingErrorWriter), a multiple of 64 as required by the format.
+NPY_HEADER_LENGTH = 128
+
+def _get_npy_header(num_elements, dtype):
+    header_dict = repr({ "descr" : np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order" : False, "shape" : (num_elements,) })
+    header_start = np.lib.format.MAGIC_PREFIX + bytes([1, 0]) + (NPY_HEADER_LENGTH - 10).to_bytes(2, "little")
+    return header_start + header_dict.ljust(NPY_HEADER_LENGTH - len(header_start) - 1).encode("latin1") + b"\n"
+
+class SpacingErrorWriter():
+    """
+    Writes the relative spacing error of each vertex (see
+    VertexArray.get_vertex_spacing_errors) to a .npy file chunk by chunk, like
+    GeoFileWriter. The errors are stored as float32, and the number of errors
+    in the header is filled in on close. The file can be read with np.load.
+    """
+    def __init__(self, filename):
+        """
+        Args:
+            filename: name of the file without the extension.
+        """
+        self.fname = filename + "." + SPACING_ERRORS_EXTENSION
+        self.num_written = 0
+        self.f = open(self.fname, "wb", buffering=2**20)
+        self.f.write(_get_npy_header(0, np.float32))
+
+    def write(self, vertex_errors):
+        vertex_errors = np.asarray(vertex_errors, dtype=np.float32)
+        self.f.write(vertex_errors.astype("<f4", copy=False).tobytes())
+        self.num_written += len(vertex_errors)
+
+    def close(self):
+        if self.f.closed:
+            return
+        self.f.seek(0)
+        self.f.write(_get_npy_header(self.num_written, np.float32))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_spacing_errors(filename, vertex_errors):
+    """
+    writes the relative spacing error of each vertex to the .spacing.npy file
+    based on filename, see SpacingErrorWriter.
+    """
+    with SpacingErrorWriter(filename) as writer:
+        writer.write(vertex_errors)
+
+def write_geo_arrays(filename, geo_type, **columns):
+    """
+    writes the .OBJ file of geo_type (e.g. "spring") based on filename from one
+    array per column, without creating a geo_object per element. The columns of
+    each geo_type are listed in GEO_COLUMNS; a scalar is used for all elements.
+    Values are written with the same round-trip precision as writeFile.
+
+    Example:
+        write_geo_arrays("test", "spring", master=ids[:-1], slave=ids[1:],
+                         stiff=1e-4, restlen=lengths, beta=4)
+    """
+    arrays = _get_column_arrays(geo_type, columns)
+    with GeoFileWriter(filename, geo_type, len(arrays[0])) as writer:
+        writer.write_columns(arrays)
+
+def write_vertex_chunks(filename, chunks, count=None):
+    """
+    writes the .vertex file based on filename from an iterator of chunks of
+    vertices, as they are produced. Each chunk is a VertexArray, an (N,2) array
+    or an array of complex coordinates x + iy.
+
+    Returns:
+        The number of vertices written.
+    """
+    with GeoFileWriter(filename, "vertex", count) as writer:
+        for chunk in chunks:
+            if isinstance(chunk, VertexArray):
+                chunk = chunk.coords
+            chunk = np.asarray(chunk)
+            if np.iscomplexobj(chunk):
+                writer.write(x=chunk.real, y=chunk.imag)
+            else:
+                chunk = chunk.reshape(-1, 2)
+                writer.write(x=chunk[:, 0], y=chunk[:, 1])
+        return writer.num_written
+
+def write_npz(filename, vertex_vec, params):
+    """
+    writes the .npz file based on filename, a binary alternative to the text
+    files which holds the whole mesh:
+        - vertices: (N,2) array of the vertex coordinates.
+        - path_offsets: (P+1,) array; the vertices of path i are
+              vertices[path_offsets[i]:path_offsets[i+1]].
+        - spacing_errors: (N-1,) array of the relative spacing error between
+              consecutive vertices (NaN between paths).
+        - params: the numbers and strings of params (e.g. the input2d
+              parameters) as a JSON string.
+        - spring_<column> and beam_<column>: the columns of the springs and
+              beams in params['Springs'] and params['Beams'], if any.
+    The arrays are stored uncompressed, so that they can be memory-mapped
+    (see geo_viewer.read_npz).
+    """
+    coords = vertex_vec.coords if isinstance(vertex_vec, VertexArray) else np.asarray(vertex_vec, dtype=np.float64).reshape(-1, 2)
+    point_counts = params.get('PathPointCounts', [len(coords)])
+    path_offsets = np.concatenate(([0], np.cumsum(point_counts))).astype(np.int64)
+    spacing_errors = VertexArray(coords).get_vertex_spacing_errors(params['Ds'], point_counts)[1:]
+    scalar_params = { key : value for key, value in params.items()
+                      if isinstance(value, (int, float, str)) and not isinstance(value, bool) }
+    arrays = {
+        "vertices" : coords,
+        "path_offsets" : path_offsets,
+        "spacing_errors" : spacing_errors,
+        "params" : np.array(json.dumps(scalar_params))
+    }
+    for geo_type, key in [("spring", 'Springs'), ("beam", 'Beams')]:
+        if key in params:
+            for name, column in zip(GEO_COLUMNS[geo_type], _get_column_arrays(geo_type, params[key])):
+                arrays[geo_type + "_" + name[0]] = column
+    np.savez(filename + ".npz", **arrays)
+
 def writeFile(filename, geo_list):
     """
-    writes the .OBJ files based on filename.
+    writes the .OBJ files based on filename. geo_list is a list of
+    geometry objects of the same type, or a VertexArray.
     """
-    fname = filename + "." + geo_list[0].getType()
-    f = open(fname, "w")
-    n = len(geo_list)
-    f.write(repr(n)+"\n")
-    for elem in geo_list:
-        f.write(elem.printString())
-    f.close()
+    if isinstance(geo_list, VertexArray):
+        write_geo_arrays(filename, "vertex", x=geo_list.coords[:, 0], y=geo_list.coords[:, 1])
+        return
+    geo_type = geo_list[0].getType()
+    # Keep the values as they are, so that they are printed exactly like printString does.
+    columns = [ [ getattr(elem, name) for elem in geo_list ] for name, _ in GEO_COLUMNS[geo_type] ]
+    with GeoFileWriter(filename, geo_type, len(geo_list)) as writer:
+        writer.write_columns(columns)
 
 #===============================================================================
 # Testing function to make sure that this file is working correctly.
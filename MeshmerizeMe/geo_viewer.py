@@ -2,47 +2,150 @@
 # -*- coding: utf-8 -*-
 
 import os
+import json
+import struct
+import zipfile
 import argparse
-import matplotlib.pyplot as plt
+import numpy as np
 from .input_parser import fetch_input_params
 from . import meshmerizeme_logger as logger
 
 def read_vertices(fname):
     """
     Function reads in supplied .vertex file and returns the vertex coordinates
-    as a vector of complex numbers. These have the IB2d coordinate system, not
-    the one ready to be plotted in PyQt.
-    """
-    vec = []
-    f = open(fname, 'r')
-    i = 0 # counter variable
-    for line in f:
-        if i>0:
-            # do stuff
-            parts = line.split()
-            num = complex(float(parts[0]), float(parts[1]))
-            vec.append(num)
-        i += 1
-    return vec
+    as an (N,2) array of x and y values. These have the IB2d coordinate system,
+    not the one ready to be plotted in PyQt.
 
-def plot_points(vec, params, display=True, path=None):
+    The number of vertices is taken from the header line, and the coordinates
+    are parsed in one bulk read instead of line by line.
+    """
+    with open(fname, 'r') as f:
+        count = int(f.readline().split()[0])
+        coords = np.fromfile(f, dtype=np.float64, count=2*count, sep=' ')
+    if coords.size != 2*count:
+        raise ValueError(f"{fname} announces {count} vertices, but contains {coords.size // 2}.")
+    return coords.reshape(count, 2)
+
+def read_npz(fname):
+    """
+    Function reads in a .npz file written by geo_obj.write_npz. The arrays
+    are memory-mapped instead of read, so only the parts which are used are
+    loaded from disk.
+
+    Returns:
+        dictionary with the arrays of the file, and the params dictionary
+        under 'params'.
+    """
+    arrays = {}
+    with zipfile.ZipFile(fname) as zip_file, open(fname, 'rb') as f:
+        for zip_info in zip_file.infolist():
+            name = zip_info.filename[:-len('.npy')]
+            if zip_info.compress_type != zipfile.ZIP_STORED or name == 'params':
+                arrays[name] = np.load(zip_file.open(zip_info))
+                continue
+            # The local file header is 30 bytes, followed by the file name and an extra field.
+            f.seek(zip_info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(zip_info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError("Cannot memory-map {} in {}.".format(name, fname))
+            if np.prod(shape) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(fname, dtype=dtype, mode='r', shape=shape,
+                                         order='F' if fortran_order else 'C', offset=f.tell())
+    arrays['params'] = json.loads(str(arrays['params']))
+    return arrays
+
+# Meshes with more vertices than this are rasterized into an image instead of
+# being drawn as a scatter plot when saved to disk.
+RASTER_THRESHOLD = 100000
+
+def _as_coords(vec):
+    coords = np.asarray(vec)
+    if np.iscomplexobj(coords):
+        coords = np.column_stack((coords.real, coords.imag))
+    return coords.reshape(-1, 2)
+
+def rasterize_points(coords, extent, shape):
+    """
+    Counts the points falling into each pixel of an image covering extent.
+
+    Args:
+        coords: (N,2) array of x and y values.
+        extent: [xmin, xmax, ymin, ymax] of the image.
+        shape: (rows, columns) of the image.
+
+    Returns:
+        Array of the given shape with the number of points per pixel. Row 0 is
+        at ymin; points outside of extent are ignored.
+    """
+    rows, columns = shape
+    xmin, xmax, ymin, ymax = extent
+    i = np.floor( (coords[:, 1] - ymin) * (rows / (ymax - ymin)) )
+    j = np.floor( (coords[:, 0] - xmin) * (columns / (xmax - xmin)) )
+    inside = (i >= 0) & (i < rows) & (j >= 0) & (j < columns)
+    pixels = i[inside].astype(np.intp) * columns + j[inside].astype(np.intp)
+    return np.bincount(pixels, minlength=rows * columns).reshape(rows, columns)
+
+def _draw_points(ax, coords, params, dpi=None):
     """
-    Plots vec as a scatter plot.
-    """
-    x = [elem.real for elem in vec]
-    y = [elem.imag for elem in vec]
-    plt.scatter(x, y, s=2)
-    title_string = params['string_name'] + ' Experiment'
-    plt.title(title_string)
-    plt.xlabel('Width in meters')
-    plt.ylabel('Height in meters')
-    plt.axis([0, params['Lx']*1.1, 0, params['Ly']*1.1])
-    plt.axes().set_aspect('equal')
-    plt.grid(True)
-    if display:
-        plt.show()
+    Draws coords onto ax, as a scatter plot or, for dense meshes drawn at the
+    given dpi, as an image of the pixels which hold at least one point.
+    """
+    extent = [0, params['Lx']*1.1, 0, params['Ly']*1.1]
+    ax.set_title(params['string_name'] + ' Experiment')
+    ax.set_xlabel('Width in meters')
+    ax.set_ylabel('Height in meters')
+    if dpi is not None and len(coords) > RASTER_THRESHOLD:
+        # Size the image to the pixels the axes cover in the saved file.
+        ax.set_aspect('equal')
+        ax.axis(extent)
+        ax.figure.canvas.draw()
+        bbox = ax.get_window_extent()
+        shape = (max(1, int(bbox.height)), max(1, int(bbox.width)))
+        counts = rasterize_points(coords, extent, shape)
+        # Every pixel holding a point gets the color of the scatter plot.
+        from matplotlib.colors import ListedColormap
+        ax.imshow(np.ma.masked_equal(counts, 0), extent=extent, origin='lower',
+                  interpolation='nearest', cmap=ListedColormap(['C0']), aspect='equal')
     else:
-        plt.savefig(path, dpi=400)
+        ax.scatter(coords[:, 0], coords[:, 1], s=2)
+    ax.axis(extent)
+    ax.set_aspect('equal')
+    ax.grid(True)
+
+def save_points(vec, params, path, dpi=400):
+    """
+    Saves the plot of vec to path without a display, so that several files can
+    be rendered at once in different processes. Meshes with more than
+    RASTER_THRESHOLD vertices are rasterized directly into an image buffer.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(dpi=dpi)
+    FigureCanvasAgg(fig)
+    _draw_points(fig.add_subplot(), _as_coords(vec), params, dpi=dpi)
+    fig.savefig(path, dpi=dpi)
+
+def plot_points(vec, params, display=True, path=None):
+    """
+    Plots vec as a scatter plot. vec is an (N,2) array of x and y values;
+    a sequence of complex numbers is accepted as well. If display is False,
+    the plot is saved to path with save_points instead.
+    """
+    if not display:
+        save_points(vec, params, path)
+        return
+    from .mpl_backend import get_pyplot
+    plt = get_pyplot()
+    _draw_points(plt.gca(), _as_coords(vec), params)
+    plt.show()
 
 def main(infilepath):
     path, infile = os.path.split(infilepath)
@@ -0,0 +1,280 @@
+"""Python module with an on-disk cache of meshed SVG files.
+
+Each entry is stored under a key which hashes everything the vertices depend on:
+the path data of the SVG and its aggregate transforms, the input2d values which
+define the experimental space (Lx, Ly, Nx, Ny) and the estimator settings. An
+unchanged file can therefore be written straight from the cache, while any change
+to its geometry or settings results in a new key. Entries are evicted in least
+recently used order once the cache grows beyond its maximum size.
+"""
+
+import os
+import io
+import json
+import hashlib
+import tempfile
+import numpy as np
+from .geo_obj import VertexArray
+from . import meshmerizeme_logger as logger
+from . import points_estimation
+from . import svg_parser
+
+# Bump this whenever the meshing algorithms change, to invalidate old entries.
+CACHE_VERSION = 2
+
+# USER_CONFIG settings which do not affect the fitted points.
+IGNORED_USER_CONFIG_KEYS = ["path", "ds", "point_params", "show_graph", "num_parallel_processes"]
+
+# MESH_CONFIG settings which affect the vertices.
+MESH_CONFIG_KEYS = ["per_path", "incremental"]
+
+# Default cache settings which users can override via CLI arguments.
+CACHE_CONFIG = {
+    "use_cache" : True,
+    "cache_dir" : os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "MeshmerizeMe"),
+    "max_cache_size" : 512 * 2**20 # bytes
+}
+
+
+def get_settings(params, user_config=None, mesh_config=None):
+    """
+    Returns the settings which the vertices depend on, besides the paths, as a JSON string.
+    """
+    if user_config is None:
+        user_config = points_estimation.USER_CONFIG
+    if mesh_config is None:
+        mesh_config = svg_parser.MESH_CONFIG
+    settings = {
+        "version" : CACHE_VERSION,
+        "input2d" : [ float(params[key]) for key in ["Lx", "Ly", "Nx", "Ny"] ],
+        "space" : [ *params["Space"].get_origin(), *params["Space"].get_max_size() ],
+        "user_config" : { key : value for key, value in user_config.items() if key not in IGNORED_USER_CONFIG_KEYS },
+        "mesh_config" : { key : mesh_config[key] for key in MESH_CONFIG_KEYS }
+    }
+    return json.dumps(settings, sort_keys=True, default=repr)
+
+
+def get_cache_key(path_list, params, user_config=None, mesh_config=None):
+    """Hash everything the vertices of the given paths depend on.
+
+    Args:
+        path_list: python list containing path SvgObjects.
+        params: dictionary containing all parameters.
+        user_config: estimator settings. Defaults to points_estimation.USER_CONFIG.
+        mesh_config: meshing settings. Defaults to svg_parser.MESH_CONFIG.
+
+    Returns:
+        Hexadecimal SHA-256 digest.
+    """
+    sha256 = hashlib.sha256()
+    sha256.update( get_settings(params, user_config, mesh_config).encode() )
+    for path in path_list:
+        sha256.update( path.get("d").encode() )
+        sha256.update( b"\0" )
+        sha256.update( np.ascontiguousarray(path.get_aggregate_transform_matrix(), dtype=np.float64).tobytes() )
+    return sha256.hexdigest()
+
+
+def get_source_key(source, params, user_config=None, mesh_config=None):
+    """
+    Hashes the absolute name of the source file and the settings, but not its contents,
+    so that the latest meshing of an edited file can be found.
+    """
+    sha256 = hashlib.sha256()
+    sha256.update( get_settings(params, user_config, mesh_config).encode() )
+    sha256.update( os.path.abspath(source).encode() )
+    return sha256.hexdigest()
+
+
+class MeshCache():
+    """
+    Directory of .npz files, one per key, each holding the arrays of a meshed file.
+    The modification time of a file records when it was last used. Small .ref files
+    store the key of an entry under a name (see set_reference).
+    """
+    def __init__(self, cache_dir=None, max_size=None):
+        """
+        Args:
+            cache_dir: Directory of the cache. Defaults to CACHE_CONFIG["cache_dir"].
+            max_size: Maximum total size of the cache in bytes. Defaults to CACHE_CONFIG["max_cache_size"].
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else CACHE_CONFIG["cache_dir"]
+        self.max_size = max_size if max_size is not None else CACHE_CONFIG["max_cache_size"]
+
+    def get_file_name(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get(self, key):
+        """
+        Returns a dictionary with the arrays stored under key, or None if there is no such entry.
+        """
+        file_name = self.get_file_name(key)
+        try:
+            with np.load(file_name) as entry:
+                arrays = { name : entry[name] for name in entry.files }
+        except (OSError, ValueError, EOFError) as e:
+            if os.path.exists(file_name):
+                logger.debug(f"Ignoring unreadable cache entry {file_name}: {e}")
+            return None
+        try:
+            os.utime(file_name) # Mark the entry as recently used.
+        except OSError:
+            pass # The entry was evicted by another process in the meantime.
+        return arrays
+
+    def put(self, key, **arrays):
+        """
+        Stores the given arrays under key and evicts old entries if the cache is too large.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        # Write to a temporary file first, so that other processes never read a partial entry.
+        file_descriptor, temporary_file_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as temporary_file:
+                temporary_file.write(buffer.getbuffer())
+            os.replace(temporary_file_name, self.get_file_name(key))
+        except BaseException:
+            os.unlink(temporary_file_name)
+            raise
+        self.evict()
+
+    def get_reference(self, name):
+        """
+        Returns the key stored under name with set_reference, or None.
+        """
+        try:
+            with open(os.path.join(self.cache_dir, name + ".ref")) as reference_file:
+                return reference_file.read().strip()
+        except OSError:
+            return None
+
+    def set_reference(self, name, key):
+        """
+        Stores key under name, e.g. to find the latest entry of a source file.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_descriptor, temporary_file_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w") as temporary_file:
+            temporary_file.write(key)
+        os.replace(temporary_file_name, os.path.join(self.cache_dir, name + ".ref"))
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache, including its references,
+        is no larger than max_size. References to missing or evicted entries are removed too.
+        """
+        entries = []
+        references = {} # Sizes and file names of the references, by the key they store.
+        with os.scandir(self.cache_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                is_entry = dir_entry.name.endswith(".npz")
+                if not is_entry and not dir_entry.name.endswith(".ref"):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+                if is_entry:
+                    entries.append( (stat.st_mtime, stat.st_size, dir_entry.path) )
+                else:
+                    key = self.get_reference(dir_entry.name[:-len(".ref")])
+                    references.setdefault(key, []).append( (stat.st_size, dir_entry.path) )
+        cache_size = sum(size for _, size, _ in entries) + sum(size for key_references in references.values() for size, _ in key_references)
+
+        def remove(file_name, size):
+            nonlocal cache_size
+            try:
+                os.unlink(file_name)
+            except OSError:
+                pass
+            cache_size -= size
+
+        entry_keys = { os.path.basename(file_name)[:-len(".npz")] for _, _, file_name in entries }
+        for key in [ key for key in references if key not in entry_keys ]:
+            for size, file_name in references.pop(key):
+                remove(file_name, size)
+        for _, size, file_name in sorted(entries):
+            if cache_size <= self.max_size:
+                break
+            remove(file_name, size)
+            for reference_size, reference_file_name in references.pop(os.path.basename(file_name)[:-len(".npz")], []):
+                remove(reference_file_name, reference_size)
+
+
+def get_mesh_cache():
+    """
+    Returns the MeshCache selected by CACHE_CONFIG, or None if caching is disabled.
+    """
+    if not CACHE_CONFIG["use_cache"]:
+        return None
+    return MeshCache()
+
+
+# Prefix of the arrays of the mesh record (see svg_parser.make_mesh_record) in a cache entry.
+MESH_RECORD_PREFIX = "mesh_record_"
+
+def make_vertices(path_list, params, cache=None, source=None):
+    """Like svg_parser.make_vertices, but reuses the vertices of an unchanged file from the cache.
+
+    If the file has changed, MESH_CONFIG["incremental"] is set and the cache holds
+    the latest meshing of the same source file, only the changed segments are refit
+    (see svg_parser.remesh_changed_segments). Otherwise the whole file is refit.
+
+    Args:
+        path_list: python list containing path SvgObjects.
+        params: dictionary containing all parameters.
+        cache: MeshCache to use. Defaults to get_mesh_cache().
+        source: name of the SVG file the paths were read from, if any.
+
+    Returns:
+        vertex_vec: VertexArray containing all vertex points obtained from the
+        svg file.
+    """
+    if cache is None:
+        cache = get_mesh_cache()
+    if cache is None:
+        return svg_parser.make_vertices(path_list, params)
+
+    key = get_cache_key(path_list, params)
+    source_key = get_source_key(source, params) if source is not None else None
+    entry = cache.get(key)
+    if entry is not None:
+        logger.info("Loaded vertices from the cache.")
+        if "path_point_counts" in entry:
+            params['PathPointCounts'] = entry["path_point_counts"].tolist()
+        else:
+            params.pop('PathPointCounts', None)
+        if source_key is not None:
+            cache.set_reference(source_key, key)
+        vertex_vec = VertexArray(entry["vertices"])
+        svg_parser.report_spacing_errors(vertex_vec, params)
+        svg_parser.make_springs_and_beams(vertex_vec, params)
+        return vertex_vec
+
+    mesh_record = None
+    if source_key is not None and svg_parser.MESH_CONFIG["incremental"]:
+        previous_key = cache.get_reference(source_key)
+        previous_entry = cache.get(previous_key) if previous_key is not None else None
+        if previous_entry is not None and MESH_RECORD_PREFIX + "vertex_segments" in previous_entry:
+            mesh_record = { name[len(MESH_RECORD_PREFIX):] : array for name, array in previous_entry.items()
+                            if name.startswith(MESH_RECORD_PREFIX) }
+            mesh_record["vertices"] = previous_entry["vertices"]
+            logger.info("Refitting the changed segments of the previous meshing from the cache.")
+
+    vertex_vec = svg_parser.make_vertices(path_list, params, mesh_record=mesh_record)
+    arrays = { "vertices" : vertex_vec.coords }
+    if "PathPointCounts" in params:
+        arrays["path_point_counts"] = np.asarray(params['PathPointCounts'], dtype=np.int64)
+    if "MeshRecord" in params:
+        for name, array in params['MeshRecord'].items():
+            if name != "vertices":
+                arrays[MESH_RECORD_PREFIX + name] = array
+    try:
+        cache.put(key, **arrays)
+        if source_key is not None:
+            cache.set_reference(source_key, key)
+    except OSError as e:
+        logger.debug(f"Could not write to the cache: {e}")
+    return vertex_vec
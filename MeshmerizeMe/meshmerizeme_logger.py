@@ -34,6 +34,14 @@ def init_file_handler(full_file_name_without_exention):
     file_handler.setFormatter(formatter)
     file_memory_handler = logging.handlers.MemoryHandler(capacity=1000, target=file_handler) # Flush the logs after every 1000 records.
     logger.addHandler(file_memory_handler)
+    return file_memory_handler
+
+def close_file_handler(file_memory_handler):
+    # Stop logging to the file, e.g. once the file it belongs to has been processed.
+    logger.removeHandler(file_memory_handler)
+    file_handler = file_memory_handler.target
+    file_memory_handler.close() # Flushes the remaining records to the file.
+    file_handler.close()
 
 def debug(message):
     logger.debug(message)
@@ -0,0 +1,41 @@
+"""Python module which selects the interactive matplotlib backend on first use.
+
+Importing pyplot is slow, so the modules of MeshmerizeMe only do so when they
+actually show a plot, through get_pyplot. Plots which are only saved to disk use
+the Agg backend directly (see geo_viewer.save_points) and never import pyplot.
+"""
+
+import platform
+from . import meshmerizeme_logger as logger
+
+_backend_configured = False
+
+
+def configure_backend():
+    """
+    Selects the Qt5Agg backend on macOS (falling back to TkAgg) and TkAgg elsewhere.
+    Only the first call has an effect.
+    """
+    global _backend_configured
+    if _backend_configured:
+        return
+    _backend_configured = True
+    import matplotlib
+    if platform.system() == "Darwin":
+        try:
+            matplotlib.use("Qt5Agg")
+        except:
+            logger.warning("The Qt5Agg backend was not found for matplotlib, so some graphical features may not work properly. " \
+                          + "Please see the MeshmerizeMe wiki on Github for more details.")
+            matplotlib.use("TkAgg")
+    else:
+        matplotlib.use("TkAgg")
+
+
+def get_pyplot():
+    """
+    Returns matplotlib.pyplot, configuring the backend first.
+    """
+    configure_backend()
+    import matplotlib.pyplot as plt
+    return plt
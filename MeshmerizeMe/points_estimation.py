@@ -1,23 +1,32 @@
 
 """Python module to find equally spaced points on an SVG path."""
 
+import abc
 import svgpathtools
 from numpy import linspace
 import numpy as np
 from . import meshmerizeme_logger as logger
-from tqdm import tqdm
-import time
-from multiprocess import Process, Array, Value, Manager
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+from . import worker_pool
+from multiprocess import Process, Array
+
+ERROR_TOL = 0.10 # Error tolerance: 10% relative error
+
+# Order of the Gauss-Legendre rule used to integrate arc lengths.
+GAUSS_LEGENDRE_ORDER = 5
+
+# Minimum distance between consecutive points kept by the lbfgs and newton optimizers, relative to ds.
+MIN_POINT_SPACING = 1e-3
 
 # Default config settings which users can override via CLI arguments.
 USER_CONFIG = {
+    "estimator" : "gradient_descent",
+    "optimizer" : "gradient_descent",
     "path" : None,
     "ds" : None,
     "min_T" : 0,
     "max_T" : 1,
     "point_params" : None,
+    "fixed_endpoints" : False,
     "subpath_length" : 25,
     "num_points" : None,
     "learning_rate" : 0.00005,
@@ -27,11 +36,390 @@ USER_CONFIG = {
     "num_parallel_processes" : 10
 }
 
+class PathEvaluator():
+    """
+    Vectorized evaluator for an svgpathtools Path.
+
+    The path is compiled once into NumPy arrays: Bezier segments are degree-elevated
+    to cubics and stored as an (S,4) array of complex control points, arcs are stored
+    through their center/radius/angle parameters, and the segment boundaries in terms
+    of the path parameter T are stored as an (S+1,) array. Points and first derivatives
+    can then be evaluated for a whole array of parameters T in a single batched call.
+
+    The results match svgpathtools' Path.point and Path.derivative, including the
+    convention that derivatives are divided by the absolute segment length.
+    """
+    BEZIER = 0
+    ARC = 1
+
+    def __init__(self, segment_types, control_points, arc_params, segment_lengths=None):
+        """
+        Args:
+            segment_types: (S,) array with PathEvaluator.BEZIER or PathEvaluator.ARC per segment.
+            control_points: (S,4) complex array of cubic control points. For arcs, the columns
+                            hold the start point, the complex radius, 0 and the end point.
+            arc_params: (S,5) float array of (center.real, center.imag, rotation, theta, delta)
+                        for arcs (unused for Bezier segments).
+            segment_lengths: (S,) array of the lengths of the segments. If None, they are
+                             computed with integrate_segment_lengths.
+        """
+        self.segment_types = np.asarray(segment_types, dtype=np.int8)
+        self.control_points = np.asarray(control_points, dtype=complex)
+        self.arc_params = np.asarray(arc_params, dtype=float)
+        self.num_segments = len(self.segment_types)
+        if self.num_segments == 0:
+            raise ValueError("This path contains no segments!")
+        if segment_lengths is None:
+            segment_lengths = self.integrate_segment_lengths()
+        self.segment_lengths = np.asarray(segment_lengths, dtype=float)
+
+        # Mirror svgpathtools.Path._calc_lengths so that T maps to the same segment parameter t.
+        self.total_length = sum(self.segment_lengths.tolist())
+        if self.total_length == 0:
+            fractions = self.segment_lengths
+        else:
+            fractions = self.segment_lengths / self.total_length
+        self.segment_fractions = fractions
+        self.segment_boundaries = np.concatenate(([0.0], np.cumsum(fractions)))
+        # Parameters T at which the path jumps to a new continuous part (e.g. at a moveto inside the path).
+        jump_sizes = np.abs(self.control_points[1:, 0] - self.control_points[:-1, 3])
+        self.jump_params = self.segment_boundaries[1:-1][ jump_sizes > 1e-9 * max(self.total_length, 1.0) ]
+        self._arc_length_table = None
+
+    @classmethod
+    def from_path(cls, path):
+        """
+        Compiles an svgpathtools Path into a PathEvaluator.
+        """
+        segments = list(path)
+        num_segments = len(segments)
+        segment_types = np.full(num_segments, cls.BEZIER, dtype=np.int8)
+        control_points = np.zeros((num_segments, 4), dtype=complex)
+        arc_params = np.zeros((num_segments, 5))
+        for i, segment in enumerate(segments):
+            if isinstance(segment, svgpathtools.Arc):
+                segment_types[i] = cls.ARC
+                control_points[i, 0] = segment.start
+                control_points[i, 1] = segment.radius
+                control_points[i, 3] = segment.end
+                arc_params[i] = (segment.center.real, segment.center.imag, segment.rotation, segment.theta, segment.delta)
+            else:
+                control_points[i] = elevate_to_cubic(segment.bpoints())
+        segment_lengths = [segment.length() for segment in segments]
+        return cls(segment_types, control_points, arc_params, segment_lengths)
+
+    def T2t(self, T):
+        """
+        Vectorized version of svgpathtools.Path.T2t.
+
+        Returns:
+            seg_idx: Array of segment indices for each parameter T.
+            t: Array of segment parameters t for each parameter T.
+        """
+        T = np.asarray(T, dtype=float)
+        seg_idx = np.searchsorted(self.segment_boundaries[1:], T, side="left")
+        seg_idx = np.clip(seg_idx, 0, self.num_segments - 1)
+        segment_start = self.segment_boundaries[seg_idx]
+        fractions = self.segment_fractions[seg_idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(fractions > 0, (T - segment_start) / np.where(fractions > 0, fractions, 1), 0.0)
+        t = np.where(T == 1, 1.0, np.clip(t, 0.0, 1.0))
+        seg_idx = np.where(T == 1, self.num_segments - 1, seg_idx)
+        return seg_idx, t
+
+    def get_continuous_part_indices(self, T):
+        """
+        Returns the index of the continuous part of the path (see jump_params) of each
+        parameter in T. A parameter at a jump belongs to the part which ends there.
+        """
+        return np.searchsorted(self.jump_params, T, side="left")
+
+    def get_continuous_part_bounds(self, T):
+        """
+        Returns the arrays of the smallest and largest parameters of the continuous part
+        of each parameter in T.
+        """
+        part_idx = self.get_continuous_part_indices(T)
+        part_starts = np.concatenate(( [0.0], np.nextafter(self.jump_params, 2.0) ))
+        part_ends = np.concatenate(( self.jump_params, [1.0] ))
+        return part_starts[part_idx], part_ends[part_idx]
+
+    def point(self, T):
+        """
+        Returns the complex coordinates of the path at each parameter in T.
+        """
+        seg_idx, t = self.T2t(T)
+        points = np.empty(t.shape, dtype=complex)
+        is_arc = self.segment_types[seg_idx] == self.ARC
+        is_bezier = ~is_arc
+
+        p = self.control_points[seg_idx[is_bezier]]
+        tb = t[is_bezier]
+        points[is_bezier] = p[...,0] + tb*( 3*(p[...,1] - p[...,0]) + tb*( 3*(p[...,0] + p[...,2]) - 6*p[...,1] + tb*( -p[...,0] + 3*(p[...,1] - p[...,2]) + p[...,3] ) ) )
+
+        if np.any(is_arc):
+            angle, cosphi, sinphi, rx, ry, center = self._arc_terms(seg_idx[is_arc], t[is_arc])
+            x = rx*cosphi*np.cos(angle) - ry*sinphi*np.sin(angle) + center.real
+            y = rx*sinphi*np.cos(angle) + ry*cosphi*np.sin(angle) + center.imag
+            points[is_arc] = x + 1j*y
+        return points
+
+    def derivative(self, T):
+        """
+        Returns the first derivative of the path at each parameter in T.
+        """
+        seg_idx, t = self.T2t(T)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.segment_derivative(seg_idx, t) / self.segment_lengths[seg_idx]
+
+    def segment_derivative(self, seg_idx, t):
+        """
+        Returns the first derivative of the segments seg_idx with respect to their own parameters t.
+        """
+        derivatives = np.empty(t.shape, dtype=complex)
+        is_arc = self.segment_types[seg_idx] == self.ARC
+        is_bezier = ~is_arc
+
+        p = self.control_points[seg_idx[is_bezier]]
+        tb = t[is_bezier]
+        derivatives[is_bezier] = 3*(p[...,1] - p[...,0])*(1 - tb)**2 + 6*(p[...,2] - p[...,1])*(1 - tb)*tb + 3*(p[...,3] - p[...,2])*tb**2
+
+        if np.any(is_arc):
+            arc_idx = seg_idx[is_arc]
+            angle, cosphi, sinphi, rx, ry, center = self._arc_terms(arc_idx, t[is_arc])
+            k = self.arc_params[arc_idx, 4] * np.pi / 180
+            derivatives[is_arc] = k*( -rx*cosphi*np.sin(angle) - ry*sinphi*np.cos(angle) + 1j*( -rx*sinphi*np.sin(angle) + ry*cosphi*np.cos(angle) ) )
+        return derivatives
+
+    def integrate_segment_lengths(self, tolerance=1e-12, intervals_per_segment=4, max_depth=30):
+        """
+        Returns the lengths of all segments, integrated together with the adaptive
+        Gauss-Legendre scheme of ArcLengthTable in the parameter t of each segment.
+        """
+        nodes, weights = np.polynomial.legendre.leggauss(GAUSS_LEGENDRE_ORDER)
+
+        def integrate(seg_idx, t0, t1):
+            half_width = (t1 - t0) / 2
+            t = (t0 + half_width)[:, None] + half_width[:, None] * nodes
+            speeds = np.abs( self.segment_derivative(np.repeat(seg_idx, len(nodes)), t.ravel()) ).reshape(t.shape)
+            return half_width * np.sum(speeds * weights, axis=-1)
+
+        steps = np.linspace(0, 1, intervals_per_segment + 1)
+        seg_idx = np.repeat(np.arange(self.num_segments), intervals_per_segment)
+        t0 = np.tile(steps[:-1], self.num_segments)
+        t1 = np.tile(steps[1:], self.num_segments)
+        segment_lengths = np.zeros(self.num_segments)
+        for depth in range(max_depth + 1):
+            if len(seg_idx) == 0:
+                break
+            t_mid = (t0 + t1) / 2
+            whole = integrate(seg_idx, t0, t1)
+            left = integrate(seg_idx, t0, t_mid)
+            right = integrate(seg_idx, t_mid, t1)
+            converged = np.abs(left + right - whole) <= tolerance * np.maximum(left + right, tolerance)
+            if depth == max_depth:
+                converged[:] = True
+            segment_lengths += np.bincount(seg_idx[converged], weights=(left + right)[converged], minlength=self.num_segments)
+            seg_idx = np.repeat(seg_idx[~converged], 2)
+            t0, t1 = ( np.stack(( t0[~converged], t_mid[~converged] ), -1).ravel(),
+                       np.stack(( t_mid[~converged], t1[~converged] ), -1).ravel() )
+        return segment_lengths
+
+    def speed(self, T):
+        """
+        Returns the magnitude of the derivative of the path with respect to T,
+        i.e. the rate at which arc length grows with T.
+        """
+        return np.abs(self.derivative(T)) * self.total_length
+
+    @property
+    def arc_length_table(self):
+        """
+        The ArcLengthTable of this path. It is built on first access and then reused.
+        """
+        if self._arc_length_table is None:
+            self._arc_length_table = ArcLengthTable(self)
+        return self._arc_length_table
+
+    def length(self, T0=0, T1=1):
+        """
+        Returns the arc length of the path between the parameters T0 and T1.
+        """
+        if T0 == 0 and T1 == 1:
+            return self.total_length
+        arc_lengths = self.arc_length_table.arc_length([T0, T1])
+        return arc_lengths[1] - arc_lengths[0]
+
+    def ilength(self, s):
+        """
+        Returns the parameter(s) T such that self.length(0, T) is s.
+        """
+        return self.arc_length_table.ilength(s)
+
+    def _arc_terms(self, arc_idx, t):
+        center = self.arc_params[arc_idx, 0] + 1j*self.arc_params[arc_idx, 1]
+        phi = self.arc_params[arc_idx, 2] * np.pi / 180
+        angle = (self.arc_params[arc_idx, 3] + t*self.arc_params[arc_idx, 4]) * np.pi / 180
+        radius = self.control_points[arc_idx, 1]
+        return angle, np.cos(phi), np.sin(phi), radius.real, radius.imag, center
+
+
+class ArcLengthTable():
+    """
+    Dense cumulative arc-length table of a path.
+
+    Every segment is split into intervals of the path parameter T, which are bisected
+    until a Gauss-Legendre rule on each interval agrees with the same rule on its two
+    halves. The table stores the interval boundaries T_nodes and the cumulative arc
+    length s_nodes at those boundaries, so that the arc length at any T and its inverse
+    can be computed for whole arrays at once.
+    """
+    def __init__(self, path_evaluator, tolerance=1e-10, intervals_per_segment=8, max_depth=20):
+        """
+        Args:
+            path_evaluator: The PathEvaluator of the path.
+            tolerance: Relative tolerance of the arc length of each interval.
+            intervals_per_segment: Number of intervals each segment is split into before refinement.
+            max_depth: Maximum number of times an interval is bisected.
+        """
+        self.path_evaluator = path_evaluator
+        self.tolerance = tolerance
+        nodes, weights = np.polynomial.legendre.leggauss(GAUSS_LEGENDRE_ORDER)
+        self._nodes = nodes
+        self._weights = weights
+
+        boundaries = path_evaluator.segment_boundaries
+        has_length = boundaries[1:] > boundaries[:-1]
+        steps = np.linspace(0, 1, intervals_per_segment + 1)
+        starts = boundaries[:-1][has_length, None] + np.diff(boundaries)[has_length, None] * steps[None, :-1]
+        ends = boundaries[:-1][has_length, None] + np.diff(boundaries)[has_length, None] * steps[None, 1:]
+        interval_starts = starts.ravel()
+        interval_ends = ends.ravel()
+
+        accepted_starts = []
+        accepted_ends = []
+        accepted_lengths = []
+        for depth in range(max_depth + 1):
+            if len(interval_starts) == 0:
+                break
+            interval_mids = (interval_starts + interval_ends) / 2
+            whole = self._integrate(interval_starts, interval_ends)
+            left = self._integrate(interval_starts, interval_mids)
+            right = self._integrate(interval_mids, interval_ends)
+            error = np.abs(left + right - whole)
+            converged = error <= tolerance * np.maximum(left + right, tolerance)
+            if depth == max_depth:
+                converged[:] = True
+
+            accepted_starts += [ interval_starts[converged], interval_mids[converged] ]
+            accepted_ends += [ interval_mids[converged], interval_ends[converged] ]
+            accepted_lengths += [ left[converged], right[converged] ]
+
+            interval_starts, interval_ends = ( np.concatenate(( interval_starts[~converged], interval_mids[~converged] )),
+                                               np.concatenate(( interval_mids[~converged], interval_ends[~converged] )) )
+
+        if len(accepted_starts) == 0:
+            # The path has no length at all.
+            self.T_nodes = np.asarray([0.0, 1.0])
+            self.s_nodes = np.asarray([0.0, 0.0])
+            return
+        starts = np.concatenate(accepted_starts)
+        ends = np.concatenate(accepted_ends)
+        lengths = np.concatenate(accepted_lengths)
+        order = np.argsort(starts, kind="stable")
+        self.T_nodes = np.concatenate(( starts[order][:1], ends[order] ))
+        self.s_nodes = np.concatenate(( [0.0], np.cumsum(lengths[order]) ))
+
+    def _integrate(self, T0, T1):
+        """
+        Returns the arc lengths between the parameters T0 and T1 (element-wise).
+        """
+        T0 = np.asarray(T0, dtype=float)
+        T1 = np.asarray(T1, dtype=float)
+        half_width = (T1 - T0) / 2
+        T = (T0 + half_width)[..., None] + half_width[..., None] * self._nodes
+        speeds = self.path_evaluator.speed(T.ravel()).reshape(T.shape)
+        return half_width * np.sum(speeds * self._weights, axis=-1)
+
+    @property
+    def total_length(self):
+        return self.s_nodes[-1]
+
+    def _find_intervals(self, T):
+        interval_idx = np.searchsorted(self.T_nodes, T, side="right") - 1
+        return np.clip(interval_idx, 0, len(self.T_nodes) - 2)
+
+    def arc_length(self, T):
+        """
+        Returns the arc length of the path from 0 to each parameter in T.
+        """
+        T = np.clip(np.asarray(T, dtype=float), self.T_nodes[0], self.T_nodes[-1])
+        interval_idx = self._find_intervals(T)
+        return self.s_nodes[interval_idx] + self._integrate(self.T_nodes[interval_idx], T)
+
+    def ilength(self, s, max_newton_steps=8):
+        """
+        Returns the parameters T at which the arc length of the path from 0 reaches each value in s.
+
+        The table is inverted with linear interpolation, which is then refined with Newton's method.
+        Steps that leave the interval of the table containing the solution fall back to bisection.
+        """
+        s = np.clip(np.asarray(s, dtype=float), 0, self.total_length)
+        interval_idx = np.clip(np.searchsorted(self.s_nodes, s, side="right") - 1, 0, len(self.s_nodes) - 2)
+        lower = self.T_nodes[interval_idx]
+        upper = self.T_nodes[interval_idx + 1]
+        s_lower = self.s_nodes[interval_idx]
+        s_interval = self.s_nodes[interval_idx + 1] - s_lower
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.where(s_interval > 0, (s - s_lower) / s_interval, 0.0)
+        T = lower + fraction * (upper - lower)
+
+        s_tolerance = self.tolerance * max(self.total_length, 1.0)
+        for _ in range(max_newton_steps):
+            residual = s_lower + self._integrate(self.T_nodes[interval_idx], T) - s
+            if np.all(np.abs(residual) <= s_tolerance):
+                break
+            lower = np.where(residual < 0, T, lower)
+            upper = np.where(residual > 0, T, upper)
+            speed = self.path_evaluator.speed(T)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                T_newton = T - residual / speed
+            is_bracketed = (speed > 0) & (T_newton >= lower) & (T_newton <= upper)
+            T = np.where(is_bracketed, T_newton, (lower + upper) / 2)
+        return T
+
+
+def elevate_to_cubic(bpoints):
+    """
+    Returns the 4 control points of the cubic Bezier curve equal to the given Line,
+    QuadraticBezier or CubicBezier control points.
+    """
+    bpoints = np.asarray(bpoints, dtype=complex)
+    if len(bpoints) == 2:
+        p0, p1 = bpoints
+        return np.asarray([ p0, p0 + (p1 - p0)/3, p0 + 2*(p1 - p0)/3, p1 ])
+    elif len(bpoints) == 3:
+        p0, p1, p2 = bpoints
+        return np.asarray([ p0, p0 + 2*(p1 - p0)/3, p2 + 2*(p1 - p2)/3, p2 ])
+    return bpoints
+
+def as_path_evaluator(path):
+    """
+    Returns path compiled into a PathEvaluator, unless it already is one. Besides
+    svgpathtools Paths, objects with a to_path_evaluator method (such as
+    svg_parser.PathData) are accepted.
+    """
+    if isinstance(path, PathEvaluator):
+        return path
+    if hasattr(path, "to_path_evaluator"):
+        return path.to_path_evaluator()
+    return PathEvaluator.from_path(path)
+
 def get_point_coords(path, point_params):
-    sorted_point_params = np.sort(point_params)
-    if sorted_point_params[0] < 0.0 or sorted_point_params[-1] > 1.0:
+    point_params = np.asarray(point_params, dtype=float)
+    if np.min(point_params) < 0.0 or np.max(point_params) > 1.0:
         raise Exception("Cannot calculate point coordinates with parameters not in [0,1].")
-    return np.asarray([ path.point(T) for T in point_params ])
+    return as_path_evaluator(path).point(point_params)
 
 def get_segment_lengths(point_coords):
     segment_lengths = np.abs( point_coords[1:] - point_coords[:-1] )
@@ -42,16 +430,181 @@ def get_mean_squared_relative_error(segment_lengths, ds):
     segment_lengths = segment_lengths[~np.isnan(segment_lengths)]
     return np.mean( np.square( (segment_lengths - ds) / ds ) )
 
+def get_mse_and_gradient(path_evaluator, point_params, ds, spans_jump=None):
+    """
+    Fused loss and gradient kernel for the spacing objective.
+
+    Evaluates the points and path derivatives once and computes all per-segment
+    terms with array operations.
+
+    Args:
+        path_evaluator: PathEvaluator of the path.
+        point_params: Array of the parameters T of the points.
+        ds: Desired spacing of points.
+        spans_jump: Optional boolean array which is True for the segments between
+                    consecutive points which span a jump of the path. These are left out.
+
+    Returns:
+        mse: Mean squared relative error of the segment lengths.
+        gradient: Gradient of the mse with respect to point_params, scaled by 1/(2 * path length)
+                  since it uses svgpathtools' convention for path derivatives. The gradient
+                  descent learning rates are tuned to this scale.
+    """
+    num_segments = len(point_params) - 1
+    point_coords = get_point_coords(path_evaluator, point_params)
+    path_derivatives = path_evaluator.derivative(point_params)
+    segment_vectors = point_coords[1:] - point_coords[:-1]
+    segment_lengths = np.abs(segment_vectors)
+    if spans_jump is None:
+        mse = get_mean_squared_relative_error(segment_lengths, ds)
+    else:
+        mse = get_mean_squared_relative_error(segment_lengths[~spans_jump], ds) if not np.all(spans_jump) else 0.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gradient_term_1 = np.clip( (segment_lengths - ds) / segment_lengths, -99999, 99999)
+    if spans_jump is not None:
+        gradient_term_1[spans_jump] = 0.0
+    # Dot products of the segment vectors with the path derivatives at both ends of each segment.
+    gradient_term_2 = segment_vectors.real * path_derivatives[1:].real + segment_vectors.imag * path_derivatives[1:].imag
+    gradient_term_3 = segment_vectors.real * path_derivatives[:-1].real + segment_vectors.imag * path_derivatives[:-1].imag
+
+    gradient = np.zeros(num_segments + 1)
+    gradient[1:] += gradient_term_1 * gradient_term_2
+    gradient[:-1] -= gradient_term_1 * gradient_term_3
+    gradient /= num_segments * ( ds ** 2 )
+
+    return mse, gradient
+
+def get_spacing_residuals_and_jacobian(path_evaluator, point_params, ds, spans_jump=None):
+    """
+    Returns the relative spacing errors r_i = (l_i - ds)/ds of the segments between consecutive
+    points and the two non-zero diagonals of their Jacobian with respect to point_params.
+    Since segment i only depends on the points i and i+1, the Jacobian is bidiagonal and the
+    Gauss-Newton Hessian J^T J of the spacing objective is tridiagonal. The residuals of the
+    segments which span a jump of the path (see get_mse_and_gradient) are zero.
+
+    Returns:
+        residuals: Array with r_i for each segment.
+        jacobian_start: Array with dr_i/dT_i for each segment.
+        jacobian_end: Array with dr_i/dT_(i+1) for each segment.
+    """
+    point_coords = get_point_coords(path_evaluator, point_params)
+    path_derivatives = path_evaluator.derivative(point_params) * path_evaluator.total_length
+    segment_vectors = point_coords[1:] - point_coords[:-1]
+    segment_lengths = np.abs(segment_vectors)
+    residuals = (segment_lengths - ds) / ds
+
+    scale = np.zeros(len(segment_lengths))
+    has_length = segment_lengths > 0
+    scale[has_length] = 1 / (segment_lengths[has_length] * ds)
+    jacobian_start = -scale * ( segment_vectors.real * path_derivatives[:-1].real + segment_vectors.imag * path_derivatives[:-1].imag )
+    jacobian_end = scale * ( segment_vectors.real * path_derivatives[1:].real + segment_vectors.imag * path_derivatives[1:].imag )
+    if spans_jump is not None:
+        residuals[spans_jump] = 0.0
+        jacobian_start[spans_jump] = 0.0
+        jacobian_end[spans_jump] = 0.0
+    return residuals, jacobian_start, jacobian_end
+
+def separate_point_params(point_params, min_gap, lower_bounds, upper_bounds):
+    """
+    Returns the sorted point params moved as little as needed so that consecutive params
+    are at least min_gap apart, within the bounds where there is room for it.
+    """
+    offsets = min_gap * np.arange(len(point_params))
+    point_params = np.maximum.accumulate( np.maximum(np.sort(point_params), lower_bounds) - offsets ) + offsets
+    point_params = np.minimum.accumulate( (np.minimum(point_params, upper_bounds) + offsets)[::-1] )[::-1] - offsets
+    return point_params
+
+def minimize_with_lbfgs(estimator):
+    """
+    Minimizes the spacing MSE of the estimator's point params with scipy's L-BFGS-B,
+    bounded by min_T and max_T and by the continuous part of the path each point is on.
+    """
+    from scipy.optimize import minimize
+
+    lower_bounds, upper_bounds, spans_jump = estimator.get_continuous_point_param_bounds()
+    gradient_scale = 2 * estimator.path_evaluator.total_length
+    def mse_and_gradient(point_params):
+        mse, gradient = get_mse_and_gradient(estimator.path_evaluator, point_params, estimator.ds, spans_jump)
+        return mse, gradient * gradient_scale
+
+    point_params = np.clip(np.asarray(estimator.point_params, dtype=float), lower_bounds, upper_bounds)
+    result = minimize(mse_and_gradient, point_params, jac=True, method="L-BFGS-B",
+                      bounds=list(zip(lower_bounds, upper_bounds)),
+                      options={ "maxiter" : estimator.max_iter, "ftol" : estimator.threshold })
+    return separate_point_params(result.x, estimator.get_min_point_param_gap(), lower_bounds, upper_bounds)
+
+def get_order_preserving_step_size(point_params, step, fraction=0.5):
+    """
+    Returns the largest factor <= 1 for step such that every gap between consecutive
+    point params shrinks by at most the given fraction.
+    """
+    gaps = np.diff(point_params)
+    gap_changes = np.diff(step)
+    is_shrinking = gap_changes < 0
+    if not np.any(is_shrinking):
+        return 1.0
+    return min(1.0, np.min( fraction * gaps[is_shrinking] / -gap_changes[is_shrinking] ))
+
+def minimize_with_newton(estimator):
+    """
+    Minimizes the spacing MSE of the estimator's point params with damped (Levenberg-Marquardt)
+    Gauss-Newton steps. Each step solves the tridiagonal system (J^T J + damping I) dT = -J^T r
+    in linear time. Steps are shortened so that no two points swap or collapse, clipped to
+    the bounds of the point params (including the continuous part of the path each point
+    is on) and only accepted if the MSE decreases.
+    """
+    from scipy.linalg import solve_banded
+
+    lower_bounds, upper_bounds, spans_jump = estimator.get_continuous_point_param_bounds()
+    min_gap = estimator.get_min_point_param_gap()
+    point_params = separate_point_params(np.asarray(estimator.point_params, dtype=float), min_gap, lower_bounds, upper_bounds)
+    residuals, jacobian_start, jacobian_end = get_spacing_residuals_and_jacobian(estimator.path_evaluator, point_params, estimator.ds, spans_jump)
+    mse = np.mean(np.square(residuals))
+    damping = 1e-3
+    for cur_iter in range(estimator.max_iter):
+        gradient = np.zeros(len(point_params))
+        gradient[:-1] += jacobian_start * residuals
+        gradient[1:] += jacobian_end * residuals
+        hessian_bands = np.zeros((3, len(point_params)))
+        hessian_bands[1, :-1] += np.square(jacobian_start)
+        hessian_bands[1, 1:] += np.square(jacobian_end)
+        hessian_bands[0, 1:] = jacobian_start * jacobian_end
+        hessian_bands[2, :-1] = jacobian_start * jacobian_end
+
+        while damping < 1e12:
+            damped_hessian_bands = hessian_bands.copy()
+            damped_hessian_bands[1] += damping * np.maximum(hessian_bands[1], 1e-12)
+            step = solve_banded((1, 1), damped_hessian_bands, -gradient)
+            step = np.clip(point_params + step, lower_bounds, upper_bounds) - point_params
+            new_point_params = point_params + step * get_order_preserving_step_size(point_params, step)
+            new_residuals, new_jacobian_start, new_jacobian_end = get_spacing_residuals_and_jacobian(estimator.path_evaluator, new_point_params,
+                                                                                                    estimator.ds, spans_jump)
+            new_mse = np.mean(np.square(new_residuals))
+            if new_mse <= mse:
+                damping = max(damping / 10, 1e-12)
+                break
+            damping *= 10
+        else:
+            break # No step decreases the MSE any further.
+
+        mse_difference = mse - new_mse
+        point_params, mse = new_point_params, new_mse
+        residuals, jacobian_start, jacobian_end = new_residuals, new_jacobian_start, new_jacobian_end
+        if mse_difference <= estimator.threshold:
+            break
+    return separate_point_params(point_params, min_gap, lower_bounds, upper_bounds)
+
 def graph_point_params_and_mse(args):
     def get_point_coords(path, point_params):
-        coords = [ path.point(T) for T in point_params ]
-        x = [coord.real for coord in coords]
-        y = [coord.imag for coord in coords]
-        coords = [ (x[i], y[i]) for i in range(len(coords)) ]
-        return coords
+        coords = as_path_evaluator(path).point( np.asarray(point_params[:]) )
+        return np.stack((coords.real, coords.imag), -1)
 
     if args["show_graph"] is False:
         return
+    import matplotlib.animation as animation
+    from .mpl_backend import get_pyplot
+    plt = get_pyplot()
     fig = plt.figure()
     
     ax1 = fig.add_subplot(3,1,1)
@@ -100,7 +653,7 @@ def graph_point_params_and_mse(args):
 
 
 
-class PointsEstimator():
+class PointsEstimator(abc.ABC):
     """Finds estimates for equally spaced points on an SVG path."""
     def __init__(self, config=USER_CONFIG):
         """
@@ -114,6 +667,14 @@ class PointsEstimator():
         self.ds = config["ds"]
         self.min_T = config["min_T"]
         self.max_T = config["max_T"]
+        self.config = config
+        self.path_evaluator = as_path_evaluator(self.path)
+
+    @abc.abstractmethod
+    def fit_path(self):
+        """
+        Returns the parameters T of the estimated points on the path.
+        """
 
 class GradientDescentEstimator(PointsEstimator):
     """
@@ -139,15 +700,23 @@ class GradientDescentEstimator(PointsEstimator):
                             -Mean squared error of point distances.
                             -Plot of the estimated points.
             num_parallel_processes: Number of processes to estimate subpaths in parallel.
+            optimizer: Name of the optimizer in OPTIMIZERS used to minimize the relative error:
+                       "gradient_descent" (using learning_rate), "lbfgs" or "newton".
+            fixed_endpoints: Flag to keep the first and last point at min_T and max_T
+                             while fitting a subpath.
         """
         super().__init__(config)
+        self.optimizer = config["optimizer"]
+        if self.optimizer not in OPTIMIZERS:
+            raise ValueError(f"Unknown optimizer '{self.optimizer}'. Choose one of {sorted(OPTIMIZERS)}.")
         self.subpath_length = config["subpath_length"] * self.ds
         self.learning_rate = config["learning_rate"]
         self.max_iter = config["max_iter"]
         self.threshold = config["threshold"]
         self.show_graph = config["show_graph"]
         self.num_parallel_processes = config["num_parallel_processes"]
-        self.num_subpaths = int( self.path.length() / self.subpath_length )
+        self.fixed_endpoints = config["fixed_endpoints"]
+        self.num_subpaths = int( self.path_evaluator.length() / self.subpath_length )
         
         if config["num_points"] is not None:
             self.num_points = config["num_points"]
@@ -159,36 +728,59 @@ class GradientDescentEstimator(PointsEstimator):
                 self.num_segments = self.num_points - 1
                 self.point_params = config["point_params"]
             else:
-                self.num_segments = int( np.ceil( self.path.length(T0=self.min_T, T1=self.max_T) / self.ds ) )
+                self.num_segments = int( np.ceil( self.path_evaluator.length(T0=self.min_T, T1=self.max_T) / self.ds ) )
                 self.num_points = self.num_segments + 1
                 self.point_params = np.linspace(self.min_T, self.max_T, self.num_points)                
 
+        if self.optimizer != "gradient_descent" and config["point_params"] is None:
+            # The second-order optimizers converge much faster from points at equal
+            # arc-length intervals than from points at equal intervals of T.
+            min_s, max_s = self.path_evaluator.arc_length_table.arc_length([self.min_T, self.max_T])
+            self.point_params = np.clip( self.path_evaluator.ilength( np.linspace(min_s, max_s, self.num_points) ), self.min_T, self.max_T )
 
-    def get_mse_gradient(self):
-        point_coords = get_point_coords(self.path, self.point_params)
-        segment_lengths = get_segment_lengths(point_coords)
-        segment_vectors = point_coords[1:] - point_coords[:-1]
-        segment_vectors = np.stack((segment_vectors.real, segment_vectors.imag), -1)
-        path_derivatives = np.asarray([ self.path.derivative(T) for T in self.point_params ])
-        path_derivatives = np.stack((path_derivatives.real, path_derivatives.imag), -1)
-        gradient = np.zeros(self.num_points)
+    def get_point_param_bounds(self):
+        """
+        Returns the arrays of lower and upper bounds of the point params.
+        """
+        lower_bounds = np.full(len(self.point_params), float(self.min_T))
+        upper_bounds = np.full(len(self.point_params), float(self.max_T))
+        if self.fixed_endpoints:
+            upper_bounds[0] = self.min_T
+            lower_bounds[-1] = self.max_T
+        return lower_bounds, upper_bounds
 
-        gradient_term_1 = np.clip( (segment_lengths - self.ds) * np.power(segment_lengths, -1), -99999, 99999)
-        gradient_term_2 = np.asarray([ np.dot( segment_vectors[i], path_derivatives[i+1] ) for i in range(self.num_segments) ])
-        gradient_term_3 = np.asarray([ np.dot( segment_vectors[i], path_derivatives[i] ) for i in range(self.num_segments) ])
+    def get_continuous_point_param_bounds(self):
+        """
+        Returns the bounds of get_point_param_bounds narrowed to the continuous part of
+        the path each point starts on, and a boolean array which is True for the segments
+        between consecutive points which span a jump of the path.
+        """
+        lower_bounds, upper_bounds = self.get_point_param_bounds()
+        point_params = np.clip(np.asarray(self.point_params, dtype=float), lower_bounds, upper_bounds)
+        part_starts, part_ends = self.path_evaluator.get_continuous_part_bounds(point_params)
+        part_idx = self.path_evaluator.get_continuous_part_indices(point_params)
+        spans_jump = part_idx[1:] != part_idx[:-1]
+        return np.maximum(lower_bounds, part_starts), np.minimum(upper_bounds, part_ends), spans_jump
 
-        gradient[1:] += gradient_term_1 * gradient_term_2
-        gradient[:-1] -= gradient_term_1 * gradient_term_3
-        gradient /= self.num_segments * ( self.ds ** 2 )
+    def get_min_point_param_gap(self):
+        """
+        Returns the gap between consecutive point params which corresponds to about
+        MIN_POINT_SPACING * ds along the path.
+        """
+        return MIN_POINT_SPACING * self.ds / max(self.path_evaluator.total_length, self.ds)
 
-        return gradient
+    def get_mse_and_gradient(self):
+        return get_mse_and_gradient(self.path_evaluator, self.point_params, self.ds)
+
+    def get_mse_gradient(self):
+        return self.get_mse_and_gradient()[1]
 
     def init_graph_args(self, init_mse):
         shared_point_params = Array("d", self.point_params)
         iters = Array("i", [i - 50 for i in range(50)])
         costs = Array("d", [init_mse] * 50)
         self.graph_args = {
-            "path" : self.path,
+            "path" : self.path_evaluator,
             "show_graph" : self.show_graph,
             "point_params" : shared_point_params,
             "iters" : iters,
@@ -203,93 +795,301 @@ class GradientDescentEstimator(PointsEstimator):
         self.graph_args["point_params"][:] = self.point_params
 
     def fit_subpath(self):  
+        if OPTIMIZERS[self.optimizer] is not None:
+            self.point_params = OPTIMIZERS[self.optimizer](self)
+            return np.unique(self.point_params)
+
         cur_iter = 0
-        point_coords = get_point_coords(self.path, self.point_params)
-        segment_lengths = get_segment_lengths(point_coords)
-        mse = get_mean_squared_relative_error(segment_lengths, self.ds)
+        mse, mse_gradient = self.get_mse_and_gradient()
         mse_difference = 1
 
-        self.init_graph_args(mse)
-        p = Process(target=graph_point_params_and_mse, args=(self.graph_args,))
-        p.start()
+        if self.show_graph:
+            self.init_graph_args(mse)
+            p = Process(target=graph_point_params_and_mse, args=(self.graph_args,))
+            p.start()
 
         while np.abs(mse_difference) > self.threshold and cur_iter < self.max_iter:
             cur_iter += 1
-            mse_gradient = self.get_mse_gradient()
             self.point_params -= self.learning_rate * mse_gradient
-            self.point_params = np.clip( self.point_params , self.min_T, self.max_T )
-            point_coords = get_point_coords(self.path, self.point_params)
-            segment_lengths = get_segment_lengths(point_coords)
-            new_mse = get_mean_squared_relative_error(segment_lengths, self.ds)
+            self.point_params = np.clip( self.point_params , *self.get_point_param_bounds() )
+            new_mse, mse_gradient = self.get_mse_and_gradient()
             mse_difference = mse - new_mse
             mse = new_mse
-            self.update_graph_args(new_mse)
-        p.join()
-        p.terminate()
+            if self.show_graph:
+                self.update_graph_args(new_mse)
+        if self.show_graph:
+            p.join()
+            p.terminate()
 
         return np.unique(self.point_params)
 
-    def fit_subpaths_in_parallel(self, cur_subpath_index, point_params, config):        
-        while cur_subpath_index.value < self.num_subpaths:
-            subpath_index = cur_subpath_index.value
-            cur_subpath_index.value = subpath_index + 1
-
-            subpath_estimator_config = config
-            subpath_estimator_config["min_T"] = self.subpath_boundary_points[subpath_index]
-            subpath_estimator_config["max_T"] = self.subpath_boundary_points[subpath_index+1]
-            subpath_estimator_config["num_points"] = None
-            subpath_estimator_config["show_graph"] = False
-            subpath_estimator_config["learning_rate"] = 0.0000005
-            subpath_estimator_config["max_iter"] = 500
-
-            subpath_estimator = GradientDescentEstimator(subpath_estimator_config)
-            subpath_params = subpath_estimator.fit_subpath()
-            if subpath_index < self.num_subpaths - 1:
-                subpath_params = subpath_params[:-1] # Remove last point so it is not included twice.
-            point_params.extend( subpath_params ) 
-
-    def log_subpath_progress(self, cur_subpath_index):
-        last_logged_subpath_index = 0
-        next_subpath_index_to_log = cur_subpath_index.value
-        with tqdm(total=self.num_subpaths, desc="Subpaths") as progress_bar:
-            while next_subpath_index_to_log < self.num_subpaths and last_logged_subpath_index < self.num_subpaths:
-                progress_bar.update(next_subpath_index_to_log - last_logged_subpath_index)
-                last_logged_subpath_index = next_subpath_index_to_log
-                next_subpath_index_to_log = cur_subpath_index.value
-                time.sleep(0.1)
-            progress_bar.update(self.num_subpaths - last_logged_subpath_index)
-    
+    def get_subpath_estimator_config(self):
+        """
+        Returns the config used to estimate the points of each subpath.
+        """
+        subpath_estimator_config = self.config.copy()
+        subpath_estimator_config["path"] = self.path_evaluator
+        subpath_estimator_config["ds"] = self.ds
+        subpath_estimator_config["point_params"] = None
+        subpath_estimator_config["num_points"] = None
+        subpath_estimator_config["show_graph"] = False
+        subpath_estimator_config["learning_rate"] = 0.0000005
+        subpath_estimator_config["max_iter"] = 500
+        return subpath_estimator_config
+
+    def allocate_subpath_segments(self):
+        """
+        Splits the num_segments segments of the path between the subpaths in proportion
+        to their lengths, using the largest remainder method so that the counts always
+        add up to num_segments.
+
+        Returns:
+            Array with the number of segments of each subpath.
+        """
+        subpath_lengths = np.diff( self.path_evaluator.arc_length_table.arc_length(self.subpath_boundary_points) )
+        total_length = np.sum(subpath_lengths)
+        if total_length > 0:
+            exact_counts = self.num_segments * subpath_lengths / total_length
+        else:
+            exact_counts = np.full(len(subpath_lengths), self.num_segments / len(subpath_lengths))
+        counts = np.floor(exact_counts).astype(int)
+        num_remaining = self.num_segments - np.sum(counts)
+        largest_remainders = np.argsort(-(exact_counts - counts), kind="stable")[:num_remaining]
+        counts[largest_remainders] += 1
+        return counts
+
+    def get_subpath_tasks(self):
+        """
+        Returns a (min_T, max_T, num_points, offset, num_params) task for every subpath.
+        Subpath i writes its first num_params params to the merged params at offset. The
+        last param of each subpath but the last is left out, because it is the first
+        param of the next subpath.
+        """
+        subpath_num_segments = self.allocate_subpath_segments()
+        offsets = np.concatenate(( [0], np.cumsum(subpath_num_segments)[:-1] ))
+        num_params = subpath_num_segments.copy()
+        num_params[-1] += 1
+        return list(zip( self.subpath_boundary_points[:-1], self.subpath_boundary_points[1:],
+                         (subpath_num_segments + 1).tolist(), offsets.tolist(), num_params.tolist() ))
+
+    def fit_subpaths(self, point_params):
+        """
+        Estimates the points of every subpath, in parallel if num_parallel_processes > 1.
+        The path geometry and settings are sent to each worker once, after which only the
+        subpath tasks are sent, in chunks. Workers write their params straight into the
+        shared memory of point_params at the offset of their subpath.
+
+        Args:
+            point_params: A float64 array with num_points elements, or a worker_pool.SharedArray
+                          of the same size if num_parallel_processes > 1.
+
+        Returns:
+            A list with the number of params written by each subpath.
+        """
+        from tqdm import tqdm
+        subpath_tasks = self.get_subpath_tasks()
+        subpath_estimator_config = self.get_subpath_estimator_config()
+        if self.num_parallel_processes <= 1:
+            return [ write_subpath_params(point_params, subpath_estimator_config, *subpath_task)
+                     for subpath_task in tqdm(subpath_tasks, desc="Subpaths") ]
+
+        pool = worker_pool.get_worker_pool(self.num_parallel_processes)
+        pool.set_shared(SUBPATH_ESTIMATOR_CONFIG_KEY, (subpath_estimator_config, point_params.name, point_params.length))
+        chunksize = max(1, len(subpath_tasks) // (4 * self.num_parallel_processes))
+        try:
+            with tqdm(total=len(subpath_tasks), desc="Subpaths") as progress_bar:
+                return pool.map(fit_subpath_in_worker, subpath_tasks, chunksize, callback=lambda subpath_index: progress_bar.update(1))
+        finally:
+            pool.release_shared_array(point_params.name)
+            pool.del_shared(SUBPATH_ESTIMATOR_CONFIG_KEY)
+
     def fit_path(self):
-        self.subpath_boundary_points = [0]
-        for i in range(self.num_subpaths-1):
-            self.subpath_boundary_points.append( self.path.ilength((i+1) * self.subpath_length) )
-        self.subpath_boundary_points.append(1)
-
-        with Manager() as manager:
-            cur_subpath_index = Value("i", 0)
-            shared_point_params = manager.list()
-            parallel_processes = []
-            for i in range(self.num_parallel_processes):
-                p = Process(target=self.fit_subpaths_in_parallel, args=(cur_subpath_index, shared_point_params, USER_CONFIG.copy()))
-                parallel_processes.append(p)
-                p.start()
-            progress_bar_process = Process(target=self.log_subpath_progress, args=(cur_subpath_index,))
-            parallel_processes.append(progress_bar_process)
-            progress_bar_process.start()
-            for p in parallel_processes:
-                p.join()
-            for p in parallel_processes:
-                p.terminate()
-            self.point_params = shared_point_params[:]
-        self.point_params.sort()
-        if len(self.point_params) > self.num_points: # Too many points
-            self.point_params = self.point_params[:self.num_points]
-        elif len(self.point_params) < self.num_points: # Too few points
-            num_new_points = self.num_points - len(self.point_params)
-            self.point_params.extend( np.random.uniform(self.min_T, self.max_T, num_new_points) )
-            self.point_params.sort()
-        self.point_params = np.asarray(self.point_params)
+        num_subpaths = max(1, self.num_subpaths)
+        self.subpath_boundary_points = [self.min_T]
+        self.subpath_boundary_points += list( self.path_evaluator.ilength( np.arange(1, num_subpaths) * self.subpath_length ) )
+        self.subpath_boundary_points.append(self.max_T)
+
+        if self.num_parallel_processes <= 1:
+            point_params = np.empty(self.num_points)
+            num_params_written = self.fit_subpaths(point_params)
+            return self.fit_merged_subpath_params(point_params, num_params_written)
+        with worker_pool.SharedArray(self.num_points) as shared_point_params:
+            num_params_written = self.fit_subpaths(shared_point_params)
+            return self.fit_merged_subpath_params(shared_point_params.array, num_params_written)
+
+    def fit_merged_subpath_params(self, point_params, num_params_written):
+        """
+        Runs the final aggregate minimization, starting from the merged subpath estimates.
+        point_params may be a view of shared memory; it is used as is, without copying.
+        """
+        expected_num_params = [ subpath_task[4] for subpath_task in self.get_subpath_tasks() ]
+        if num_params_written != expected_num_params:
+            # Some subpath estimates merged coinciding points; drop the unused slots.
+            is_written = np.concatenate([ np.arange(expected) < written for written, expected in zip(num_params_written, expected_num_params) ])
+            point_params = point_params[is_written]
+            logger.debug(f"Subpath estimates merged {self.num_points - len(point_params)} coinciding point(s).")
+            self.num_points = len(point_params)
+            self.num_segments = self.num_points - 1
+        point_params.sort()
+        self.point_params = point_params
         self.point_params = self.fit_subpath()
+        return self.point_params
+
+
+# Name under which the subpath estimator config is shared with the worker processes.
+SUBPATH_ESTIMATOR_CONFIG_KEY = "subpath_estimator_config"
+
+def fit_subpath_with_config(subpath_estimator_config, min_T, max_T, num_points):
+    """
+    Returns the estimated point params of the subpath between min_T and max_T.
+    """
+    subpath_estimator_config = subpath_estimator_config.copy()
+    subpath_estimator_config["min_T"] = min_T
+    subpath_estimator_config["max_T"] = max_T
+    subpath_estimator_config["num_points"] = num_points
+    subpath_estimator = GradientDescentEstimator(subpath_estimator_config)
+    return subpath_estimator.fit_subpath()
+
+def write_subpath_params(point_params, subpath_estimator_config, min_T, max_T, num_points, offset, num_params):
+    """
+    Fits the subpath and writes (up to) its first num_params params into point_params at offset.
+
+    Returns:
+        The number of params written.
+    """
+    subpath_params = fit_subpath_with_config(subpath_estimator_config, min_T, max_T, num_points)[:num_params]
+    point_params[offset:offset + len(subpath_params)] = subpath_params
+    return len(subpath_params)
+
+def fit_subpath_in_worker(min_T, max_T, num_points, offset, num_params):
+    """
+    Task run by the worker pool, using the subpath estimator config and the shared
+    point params array sent to the worker for the current path.
+    """
+    subpath_estimator_config, point_params_name, num_point_params = worker_pool.get_shared(SUBPATH_ESTIMATOR_CONFIG_KEY)
+    point_params = worker_pool.get_shared_array(point_params_name, num_point_params)
+    return write_subpath_params(point_params, subpath_estimator_config, min_T, max_T, num_points, offset, num_params)
+
+
+def fit_window(config, min_T, max_T):
+    """
+    Returns the estimated point params between min_T and max_T, with the first and last
+    point fixed at min_T and max_T. Used to refit a part of a path between points which
+    are kept. The points start at equal arc-length intervals and are then refined by the
+    optimizer of the GradientDescentEstimator, unless the arc_length estimator is selected.
+    """
+    config = config.copy()
+    config["min_T"] = min_T
+    config["max_T"] = max_T
+    config["point_params"] = None
+    config["num_points"] = None
+    point_params = ArcLengthEstimator(config).fit_path()
+    if config["estimator"] == "arc_length" or len(point_params) <= 2:
+        return point_params
+    config["point_params"] = point_params
+    config["fixed_endpoints"] = True
+    config["show_graph"] = False
+    return GradientDescentEstimator(config).fit_subpath()
+
+
+class ArcLengthEstimator(PointsEstimator):
+    """
+    Places the points at equal arc-length intervals using the ArcLengthTable of the path.
+    The table is built once per path and inverted for all points at once, so no iterative
+    minimization over the whole path is needed.
+    """
+    def __init__(self, config=USER_CONFIG):
+        """
+        Args: (See also the PointsEstimator class)
+            num_points: Number of points to fit to the path. Leave this as None to use
+                        ceil(path_length/ds) + 1 points.
+        """
+        super().__init__(config)
+        if config["num_points"] is not None:
+            self.num_points = config["num_points"]
+            self.num_segments = self.num_points - 1
+        else:
+            self.num_segments = int( np.ceil( self.path_evaluator.length(T0=self.min_T, T1=self.max_T) / self.ds ) )
+            self.num_points = self.num_segments + 1
+        self.point_params = np.linspace(self.min_T, self.max_T, self.num_points)
+
+    def fit_path(self):
+        if self.num_segments < 1:
+            return self.point_params
+        arc_length_table = self.path_evaluator.arc_length_table
+        min_s, max_s = arc_length_table.arc_length([self.min_T, self.max_T])
+        self.point_params = arc_length_table.ilength( np.linspace(min_s, max_s, self.num_points) )
+        self.point_params[0] = self.min_T
+        self.point_params[-1] = self.max_T
+        self.point_params = np.maximum.accumulate(self.point_params)
 
+        if np.max(self.get_rel_spacing_errors()) > ERROR_TOL:
+            # Equal arc lengths only give equal chords where the path is nearly straight, so
+            # the tolerance can be missed at corners. The arc-length points are then a close
+            # initial estimate for a few Newton steps on the chord lengths.
+            self.point_params = self.refine_point_params()
+        rel_errors = self.get_rel_spacing_errors()
+        if np.max(rel_errors) > ERROR_TOL:
+            num_violations = np.count_nonzero(rel_errors > ERROR_TOL)
+            logger.warning(f"Arc-length estimate has a max. relative spacing error of {100*np.max(rel_errors):.5f}% at point "
+                           f"{int(np.argmax(rel_errors))}; {num_violations} of {len(rel_errors)} spacings exceed the error "
+                           f"tolerance of {100*ERROR_TOL:.0f}% after refinement.")
         return self.point_params
 
+    def get_rel_spacing_errors(self):
+        """
+        Returns the relative errors of the distances between consecutive points. Distances
+        across a jump of the path are not spacings and have an error of 0.
+        """
+        segment_lengths = get_segment_lengths( get_point_coords(self.path_evaluator, self.point_params) )
+        part_idx = self.path_evaluator.get_continuous_part_indices(self.point_params)
+        return np.where(part_idx[1:] != part_idx[:-1], 0.0, np.abs(segment_lengths - self.ds) / self.ds)
+
+    def refine_point_params(self):
+        """
+        Returns the point params refined by the "newton" optimizer of the
+        GradientDescentEstimator, keeping the first and last point at min_T and max_T.
+        """
+        config = self.config.copy()
+        config["path"] = self.path_evaluator
+        config["point_params"] = self.point_params
+        config["num_points"] = None
+        config["optimizer"] = "newton"
+        config["fixed_endpoints"] = True
+        config["show_graph"] = False
+        point_params = GradientDescentEstimator(config).fit_subpath()
+        point_params[0] = self.min_T # Undo the rounding of separate_point_params.
+        point_params[-1] = self.max_T
+        return point_params
+
+
+# Optimizers which users can select via the "optimizer" setting. Gradient descent
+# is implemented by GradientDescentEstimator.fit_subpath itself.
+OPTIMIZERS = {
+    "gradient_descent" : None,
+    "lbfgs" : minimize_with_lbfgs,
+    "newton" : minimize_with_newton
+}
+
+# Estimators which users can select via the "estimator" setting.
+ESTIMATORS = {
+    "gradient_descent" : GradientDescentEstimator,
+    "arc_length" : ArcLengthEstimator
+}
+
+def get_estimator(config=USER_CONFIG):
+    """
+    Returns an instance of the PointsEstimator selected by config["estimator"].
+    """
+    try:
+        estimator_class = ESTIMATORS[ config["estimator"] ]
+    except KeyError:
+        raise ValueError(f"Unknown estimator '{config['estimator']}'. Choose one of {sorted(ESTIMATORS)}.")
+    return estimator_class(config)
+
+def fit_path_with_config(config):
+    """
+    Returns the estimated point params of config["path"], using the estimator selected by config.
+    Used to fit independent paths in the worker processes.
+    """
+    return get_estimator(config).fit_path()
@@ -1,12 +1,16 @@
 import sys, os
 import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 #import MeshmerizeMe.uidesign as ui
 import MeshmerizeMe.svg_parser as svg_parser
 from MeshmerizeMe.input_parser import fetch_input_params
 import MeshmerizeMe.geo_viewer as geo_viewer
-from MeshmerizeMe.geo_obj import writeFile
+from MeshmerizeMe.geo_obj import writeFile, write_geo_arrays, write_npz, write_spacing_errors
 import MeshmerizeMe.meshmerizeme_logger as logger
-from MeshmerizeMe.points_estimation import USER_CONFIG
+import MeshmerizeMe.worker_pool as worker_pool
+import MeshmerizeMe.mesh_cache as mesh_cache
+from MeshmerizeMe.points_estimation import USER_CONFIG, ESTIMATORS, OPTIMIZERS
 
 def batch(args):
     """
@@ -14,17 +18,30 @@ def batch(args):
     Takes into account whether the user wants to mesh or plot the files.
     """
     logger.info("MeshmerizeMe started in batch mode Will read from stdin.")
-    for line in sys.stdin:
-        path = line.strip()
-        if path=='':
-            break            
-        elif args.plot:
+    if args.plot and args.jobs > 1:
+        plot_files_in_parallel(read_batch_fnames(), args.jobs)
+    elif args.plot:
+        for path in read_batch_fnames():
             plot_file(path, display=False)
-        else:
+    elif args.jobs > 1:
+        mesh_files_in_parallel(read_batch_fnames(), args.jobs)
+    else:
+        for path in read_batch_fnames():
             mesh_file(path)
     logger.info("Thank you for using MeshmerizeMe.")
 
 
+def read_batch_fnames():
+    """
+    Yields the file names read from stdin, up to the first empty line.
+    """
+    for line in sys.stdin:
+        path = line.strip()
+        if path=='':
+            break
+        yield path
+
+
 def plot_file(fname, display=True):
     """
     Plots the file specified by fname. If display is set to False, the files
@@ -34,17 +51,25 @@ def plot_file(fname, display=True):
     """
     fpath, v_name = os.path.split(fname)
     logger.info(("Processing {} for plotting.".format(v_name)))
-    finput2d = os.path.join(fpath, 'input2d')
-    params = fetch_input_params(finput2d)
-    logger.info(("Successfully loaded simulation parameters from {}.".format(
-                                finput2d)))
-    vec = geo_viewer.read_vertices(fname)
-    outputpath = fpath+params['string_name']+'.png'
+    if fname.endswith('.npz'):
+        mesh = geo_viewer.read_npz(fname)
+        params = mesh['params']
+        logger.info(("Successfully loaded simulation parameters from {}.".format(
+                                    v_name)))
+        vec = mesh['vertices']
+    else:
+        finput2d = os.path.join(fpath, 'input2d')
+        params = fetch_input_params(finput2d)
+        logger.info(("Successfully loaded simulation parameters from {}.".format(
+                                    finput2d)))
+        vec = geo_viewer.read_vertices(fname)
+    outputpath = os.path.join(fpath, params['string_name']+'.png')
     geo_viewer.plot_points(vec, params, display, path=outputpath)
     if display:
         logger.info(("Finished plotting {}.".format(v_name)))
     else:
         logger.info(("Plotted {} to {}.".format(v_name, outputpath)))
+    return len(vec)
 
 
 def mesh_file(fname):
@@ -55,18 +80,137 @@ def mesh_file(fname):
     logger.info(("Processing {} as SVG source file.".format(svg_name)))
     #all_paths, params = svg_parser.get_paths(args.svgfile)
     all_paths, params = svg_parser.get_paths(fname)
-    logger.info(("Successfully extracted {} path(s) from the image.".format(
+    if svg_parser.MESH_CONFIG["iterparse"] and svg_parser.MESH_CONFIG["stream"]:
+        logger.info("The paths will be meshed as they are read from the image.")
+    else:
+        all_paths = list(all_paths)
+        logger.info(("Successfully extracted {} path(s) from the image.".format(
                                                         len(all_paths))))
     finput2d = os.path.join(fpath, 'input2d')
     params = fetch_input_params(finput2d, params)
     logger.info(("Successfully loaded simulation parameters from {}.".format(
                                 finput2d)))
     outFile = os.path.join(fpath, params['string_name'])
-    logger.init_file_handler(outFile)
-    vertices = svg_parser.make_vertices(all_paths, params)
+    file_handler = logger.init_file_handler(outFile)
+    try:
+        if svg_parser.MESH_CONFIG["stream"]:
+            num_vertices = svg_parser.write_streamed_mesh(outFile, all_paths, params)
+        else:
+            vertices = mesh_cache.make_vertices(all_paths, params, source=fname)
+            num_vertices = len(vertices)
+            write_spacing_errors(outFile, params['SpacingErrors'])
+            if svg_parser.MESH_CONFIG["output_format"] in ["npz", "both"]:
+                write_npz(outFile, vertices, params)
+                logger.info(("The mesh has been written to {}.npz.".format(outFile)))
+        if svg_parser.MESH_CONFIG["output_format"] in ["text", "both"]:
+            if not svg_parser.MESH_CONFIG["stream"]:
+                writeFile(outFile, vertices)
+                if 'Springs' in params:
+                    write_geo_arrays(outFile, "spring", **params['Springs'])
+                if 'Beams' in params:
+                    write_geo_arrays(outFile, "beam", **params['Beams'])
+            logger.info(("Vertices have been written to {}.vertex.".format(outFile)))
+            if svg_parser.MESH_CONFIG["springs"]:
+                logger.info(("Springs have been written to {}.spring.".format(outFile)))
+            if svg_parser.MESH_CONFIG["beams"]:
+                logger.info(("Beams have been written to {}.beam.".format(outFile)))
+        logger.info(("Spacing errors have been written to {}.spacing.npy.".format(outFile)))
+    finally:
+        logger.close_file_handler(file_handler)
+    return num_vertices
+
+
+def mesh_file_job(fname, user_config, mesh_config, cache_config):
+    """
+    Meshes file specified by fname in a worker process of mesh_files_in_parallel,
+    using the settings of the parent process. Errors are caught and reported, so
+    that the remaining files are still processed.
+
+    Returns:
+        Dictionary with the file name, status, number of vertices, elapsed time
+        and error message (if any).
+    """
+    USER_CONFIG.update(user_config)
+    svg_parser.MESH_CONFIG.update(mesh_config)
+    mesh_cache.CACHE_CONFIG.update(cache_config)
+    result = {"file": fname, "status": "ok", "vertices": 0, "seconds": 0.0, "error": ""}
+    start_time = time.perf_counter()
+    try:
+        result["vertices"] = mesh_file(fname)
+    except Exception as e:
+        logger.error("Failed to mesh {}: {}".format(fname, e))
+        result["status"] = "failed"
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start_time
+    return result
 
-    writeFile(outFile, vertices)
-    logger.info(("Vertices have been written to {}.vertex.".format(outFile)))
+
+def mesh_files_in_parallel(fnames, jobs):
+    """
+    Meshes the files specified by fnames with up to jobs files at a time, each
+    in its own process, and logs a summary table once all files are done.
+
+    The processes for the subpath estimation (--num-parallel-processes) are
+    divided between the jobs, so the CPU is not oversubscribed.
+
+    Returns:
+        list with the result of mesh_file_job for each file, in the order of fnames.
+    """
+    user_config = USER_CONFIG.copy()
+    user_config["num_parallel_processes"] = max(1, USER_CONFIG["num_parallel_processes"] // jobs)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [ executor.submit(mesh_file_job, fname, user_config,
+                                    svg_parser.MESH_CONFIG.copy(), mesh_cache.CACHE_CONFIG.copy())
+                    for fname in fnames ]
+        results = [ future.result() for future in futures ]
+    log_summary_table(results)
+    return results
+
+
+def plot_file_job(fname):
+    """
+    Plots file specified by fname to disk in a worker process of
+    plot_files_in_parallel. Errors are caught and reported like in mesh_file_job.
+    """
+    result = {"file": fname, "status": "ok", "vertices": 0, "seconds": 0.0, "error": ""}
+    start_time = time.perf_counter()
+    try:
+        result["vertices"] = plot_file(fname, display=False)
+    except Exception as e:
+        logger.error("Failed to plot {}: {}".format(fname, e))
+        result["status"] = "failed"
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start_time
+    return result
+
+
+def plot_files_in_parallel(fnames, jobs):
+    """
+    Plots the files specified by fnames to disk with up to jobs files at a time,
+    each in its own process, and logs a summary table once all files are done.
+    The plots are rendered headless (see geo_viewer.save_points).
+
+    Returns:
+        list with the result of plot_file_job for each file, in the order of fnames.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(plot_file_job, fnames))
+    log_summary_table(results, action="plot")
+    return results
+
+
+def log_summary_table(results, action="mesh"):
+    """
+    Logs one row per meshed (or plotted) file with its status, number of vertices and time.
+    """
+    name_width = max([len("File")] + [ len(result["file"]) for result in results ])
+    logger.info("{:<{w}}  {:<6}  {:>8}  {:>8}".format("File", "Status", "Vertices", "Time (s)", w=name_width))
+    for result in results:
+        logger.info("{:<{w}}  {:<6}  {:>8}  {:>8.2f}".format(result["file"], result["status"],
+                                result["vertices"], result["seconds"], w=name_width))
+    for result in results:
+        if result["status"] != "ok":
+            logger.info("Failed to {} {}: {}".format(action, result["file"], result["error"]))
 
 
 def process_all_files(args):
@@ -83,8 +227,11 @@ def process_all_files(args):
             plot_file(f.name)
     else:
         logger.info("MeshmerizeMe was started in mesh-mode.")
-        for f in args.fname:
-            mesh_file(f.name)
+        if args.jobs > 1:
+            mesh_files_in_parallel([ f.name for f in args.fname ], args.jobs)
+        else:
+            for f in args.fname:
+                mesh_file(f.name)
         logger.info("MeshmerizeMe finished meshing your files. "
               "Please check your files for integrity.")
     
@@ -106,7 +253,9 @@ def main(args=None):
                 "MeshmerizeMe uses the 'gradient descent' algorithm to minimize the relative error " 
                 "of distances between points. First, the path is split into multiple "
                 "segments which are estimated in parallel. Then, the resulting points "
-                "are used as initial estimates for the final aggregate minimization.",
+                "are used as initial estimates for the final aggregate minimization. "
+                "Alternatively, the 'arc_length' estimator places the points at equal "
+                "arc-length intervals using a precomputed arc-length table of the path.",
                 epilog = "Note that the file argument is optional. If no "
                 "file is specified on the commandline the program will "
                 "start in batch mode. If the user supplies the path to one or "
@@ -118,6 +267,92 @@ def main(args=None):
                 help="Plot existing .vertex file(s).",
                 default=False)
 
+    parser.add_argument('--estimator', type=str, action="store",
+                choices=sorted(ESTIMATORS),
+                help="Algorithm used to estimate equally spaced points on the path.",
+                default=USER_CONFIG["estimator"])
+
+    parser.add_argument('--optimizer', type=str, action="store",
+                choices=sorted(OPTIMIZERS),
+                help="Optimizer used by the gradient_descent estimator to minimize the relative error "
+                "of distances between points. 'lbfgs' (L-BFGS-B) and 'newton' (tridiagonal Gauss-Newton) "
+                "do not use the learning rate and usually need far fewer iterations.",
+                default=USER_CONFIG["optimizer"])
+
+    parser.add_argument('-j', '--jobs', type=int, action="store",
+                help="Number of files to mesh at the same time, each in its own process. "
+                "The --num-parallel-processes are divided between the jobs. A log file "
+                "is written for each file and a summary table is shown at the end. "
+                "In batch plot mode, the number of files to plot to disk at the same time.",
+                default=1)
+
+    parser.add_argument('--per-path', action="store_true",
+                help="Mesh each path of the SVG file independently, in parallel, instead of "
+                "fitting points to one path made of the segments of all paths.",
+                default=svg_parser.MESH_CONFIG["per_path"])
+
+    parser.add_argument('--stream', action="store_true",
+                help="Write the vertices of each path as soon as it is meshed, so that the whole "
+                "mesh is never held in memory. Meshes each path independently like --per-path "
+                "and does not use the mesh cache.",
+                default=svg_parser.MESH_CONFIG["stream"])
+
+    parser.add_argument('--iterparse', action="store_true",
+                help="Parse the SVG file incrementally, keeping only the ancestors of the current "
+                "element in memory, for very large files. Together with --stream, each path is "
+                "meshed and written as soon as it is read.",
+                default=svg_parser.MESH_CONFIG["iterparse"])
+
+    parser.add_argument('--format', type=str, action="store",
+                choices=["text", "npz", "both"],
+                help="Output format of the mesh: the .vertex (and .spring/.beam) text files read by "
+                "IB2d and IBAMR, a single binary .npz file with the vertices, path offsets, spacing "
+                "errors and simulation parameters, or both. The .npz files can also be plotted.",
+                default=svg_parser.MESH_CONFIG["output_format"])
+
+    parser.add_argument('--springs', action="store_true",
+                help="Also write a .spring file connecting consecutive vertices of each path. "
+                "The resting length of each spring is the distance between its vertices.",
+                default=svg_parser.MESH_CONFIG["springs"])
+
+    parser.add_argument('--spring-stiffness', type=float, action="store",
+                help="Stiffness of the springs.",
+                default=svg_parser.MESH_CONFIG["spring_stiffness"])
+
+    parser.add_argument('--spring-beta', type=float, action="store",
+                help="Degree of nonlinearity of the springs.",
+                default=svg_parser.MESH_CONFIG["spring_beta"])
+
+    parser.add_argument('--beams', action="store_true",
+                help="Also write a .beam file for each triplet of consecutive vertices of each path. "
+                "The curvature of each beam is taken from the meshed geometry.",
+                default=svg_parser.MESH_CONFIG["beams"])
+
+    parser.add_argument('--beam-stiffness', type=float, action="store",
+                help="Stiffness of the beams.",
+                default=svg_parser.MESH_CONFIG["beam_stiffness"])
+
+    parser.add_argument('--index-base', type=int, action="store", choices=[0, 1],
+                help="Id of the first vertex in the .spring and .beam files: 1 for IB2d, 0 for IBAMR.",
+                default=svg_parser.MESH_CONFIG["index_base"])
+
+    parser.add_argument('--incremental', action="store_true",
+                help="If an edited file was meshed before with the mesh cache, only refit the "
+                "segments which changed and keep the vertices on the others.",
+                default=svg_parser.MESH_CONFIG["incremental"])
+
+    parser.add_argument('--no-cache', action="store_true",
+                help="Do not reuse or store the vertices of unchanged files in the mesh cache.",
+                default=False)
+
+    parser.add_argument('--cache-dir', type=str, action="store",
+                help="Directory of the mesh cache.",
+                default=mesh_cache.CACHE_CONFIG["cache_dir"])
+
+    parser.add_argument('--max-cache-size', type=float, action="store",
+                help="Maximum size of the mesh cache in MB. The least recently used entries are removed first.",
+                default=mesh_cache.CACHE_CONFIG["max_cache_size"] / 2**20)
+
     parser.add_argument('--subpath-length', type=float, action="store", 
                 help="Length of subpaths to estimate in parallel in terms of ds.",
                 default=USER_CONFIG["subpath_length"])
@@ -154,11 +389,19 @@ def main(args=None):
                 "run in batch-processing mode.")
     
     args = parser.parse_args()
+    if args.stream and args.format != "text":
+        parser.error("--stream only writes the text format.")
+    svg_parser.MESH_CONFIG["output_format"] = args.format
     
     for arg in vars(args):
         user_config_key_name = arg.replace("-","_") 
         if user_config_key_name in USER_CONFIG.keys():
             USER_CONFIG[ user_config_key_name ] = getattr(args, arg)
+        if user_config_key_name in svg_parser.MESH_CONFIG.keys():
+            svg_parser.MESH_CONFIG[ user_config_key_name ] = getattr(args, arg)
+    mesh_cache.CACHE_CONFIG["use_cache"] = not args.no_cache
+    mesh_cache.CACHE_CONFIG["cache_dir"] = args.cache_dir
+    mesh_cache.CACHE_CONFIG["max_cache_size"] = int(args.max_cache_size * 2**20)
 
     if not args.fname:
         # assumes user wants to batch process files from stdi
@@ -167,4 +410,5 @@ def main(args=None):
         # process the given files one by one
         process_all_files(args)
 
+    worker_pool.shutdown_worker_pool()
     logger.shutdown()
@@ -15,24 +15,74 @@ ISSUES:
         - Nested viewBoxes/viewPorts
         - Nested <svg> elements
         - Use of the "preserveAspectRatio" attribute
-        - <use>, <symbol>, and <def> tags
+        - Sizes or viewBoxes on <symbol> elements, which are treated as
+          groups where they are referenced
+    3) With SvgStream, a <use> element can only reference elements inside
+        <defs> or <symbol> elements which appear before it in the file.
+
+    The contents of <defs> and <symbol> elements are only meshed where they
+    are referenced by <use> elements. In per-path mode, the instances of a
+    geometry which differ by a rigid motion are fitted only once, see
+    PathInstances.
+
+    Very large files can be parsed incrementally with SvgStream (the
+    --iterparse option), which never holds the whole document in memory.
 """
 
 import xml.etree.ElementTree as ET
-from svgpathtools import parse_path
 import svgpathtools
 from numpy import linspace
 import numpy as np
-from .geo_obj import Vertex, writeFile
+from .geo_obj import Vertex, VertexArray, GeoFileWriter, SpacingErrorWriter, writeFile, connect_vertices, get_spring_columns, get_beam_columns
 from . import meshmerizeme_logger as logger
 from . import points_estimation
+from . import worker_pool
 import re
+import difflib
+import itertools
+import contextlib
+import functools
 import warnings
-from multiprocess import Process, Array, Value, Manager
 
-ERROR_TOL = 0.10 # Error tolerance: 10% relative error
+ERROR_TOL = points_estimation.ERROR_TOL # Error tolerance: 10% relative error
 
-def get_paths(fname, params={}):
+# Default meshing settings which users can override via CLI arguments.
+MESH_CONFIG = {
+    "per_path" : False,
+    "stream" : False,
+    "springs" : False,
+    "beams" : False,
+    "spring_stiffness" : 1e7,
+    "spring_beta" : 1.0,
+    "beam_stiffness" : 1e7,
+    "index_base" : 1,
+    "output_format" : "text",
+    "iterparse" : False,
+    "incremental" : False
+}
+
+# Number of paths per worker process which make_vertex_chunks meshes at a time.
+STREAM_BATCH_SIZE = 16
+
+# Elements whose contents are only rendered where they are referenced by a <use> element.
+DEFINITION_TAGS = {"defs", "symbol"}
+
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+# Tolerance on the deviation of a transform from a rigid motion, see get_rigid_motion.
+RIGID_MOTION_TOL = 1e-9
+
+# Number of largest spacing errors and of paths with the most violations listed by SpacingReport.
+SPACING_REPORT_WORST_K = 10
+
+# Percentiles of the spacing errors listed by SpacingReport.
+SPACING_REPORT_PERCENTILES = [50, 90, 99]
+
+# Bin edges of the histogram of spacing errors from which SpacingReport reads the
+# percentiles: 100 logarithmic bins per decade, i.e. a resolution of about 2.3%.
+SPACING_HISTOGRAM_EDGES = np.logspace(-8, 4, 12 * 100 + 1)
+
+def get_paths(fname, params={}, iterparse=None):
     """ Extract all paths and size from an svg file.
 
     This function scans over an svg to extract all paths as SvgObjects
@@ -41,12 +91,17 @@ def get_paths(fname, params={}):
     Args:
         fname: filename/path to svg file of interest.
         params: python dictionary to hold the information about the svg.
+        iterparse: If True, parse the file incrementally with SvgStream.
+            Defaults to MESH_CONFIG["iterparse"].
 
     Returns:
-        paths: a list of SvgObjects (svg_parser module).
+        paths: a list of SvgObjects (svg_parser module), or an iterator
+            yielding them as they are parsed if iterparse is set.
         params: dictionary updated with the extracted information.
     """
-    mySvg = Svg(fname)
+    if iterparse is None:
+        iterparse = MESH_CONFIG["iterparse"]
+    mySvg = SvgStream(fname) if iterparse else Svg(fname)
     paths = mySvg.get_paths()
     params['Space'] = mySvg.space
     w, h = params['Space'].get_max_size()
@@ -132,7 +187,7 @@ def points_on_path(path, params):
     ds = params['Ds']
     points_estimation.USER_CONFIG["path"] = path
     points_estimation.USER_CONFIG["ds"] = ds
-    points_estimator = points_estimation.GradientDescentEstimator()
+    points_estimator = points_estimation.get_estimator()
     point_params = points_estimator.fit_path()
     return point_params
 
@@ -150,67 +205,1030 @@ def transform_matrix(params):
     return A
 
 
-def make_vertices(path_list, params):
+def iter_points_on_paths(paths, params):
+    """Fit points to each path independently.
+
+    The paths are fanned out across the worker pool, one task per path. The
+    subpaths of each path are then estimated serially inside its worker.
+
+    Args:
+        paths: python list of path objects.
+        params: dictionary with parameters
+
+    Yields:
+        the numpy array of point params of each path, in the order of paths,
+        as soon as the path and all paths before it are done.
+    """
+    num_processes = points_estimation.USER_CONFIG["num_parallel_processes"]
+    configs = []
+    for path in paths:
+        config = points_estimation.USER_CONFIG.copy()
+        config["path"] = points_estimation.as_path_evaluator(path)
+        config["ds"] = params['Ds']
+        config["num_parallel_processes"] = 1
+        configs.append(config)
+
+    if num_processes <= 1 or len(paths) <= 1:
+        for config in configs:
+            yield points_estimation.fit_path_with_config(config)
+        return
+    pool = worker_pool.get_worker_pool(num_processes)
+    yield from pool.imap(points_estimation.fit_path_with_config, [ (config,) for config in configs ])
+
+
+def points_on_paths(paths, params):
+    """Fit points to each path independently, see iter_points_on_paths.
+
+    Returns:
+        list with the numpy array of point params of each path, in the order
+        of paths.
+    """
+    return list(iter_points_on_paths(paths, params))
+
+
+def get_segment_signatures(path_evaluator):
+    """Return one bytes object per segment which changes whenever the segment does.
+
+    Args:
+        path_evaluator: points_estimation.PathEvaluator of the path, or the
+            dictionary of a mesh record.
+
+    Returns:
+        python list with the signature of each segment.
+    """
+    if isinstance(path_evaluator, dict):
+        segment_types = path_evaluator["segment_types"]
+        control_points = path_evaluator["control_points"]
+        arc_params = path_evaluator["arc_params"]
+    else:
+        segment_types = path_evaluator.segment_types
+        control_points = path_evaluator.control_points
+        arc_params = path_evaluator.arc_params
+    return [ bytes([int(segment_type)]) + np.ascontiguousarray(segment_control_points, dtype=complex).tobytes()
+             + np.ascontiguousarray(segment_arc_params, dtype=float).tobytes()
+             for segment_type, segment_control_points, segment_arc_params in zip(segment_types, control_points, arc_params) ]
+
+
+def make_mesh_record(path_evaluator, point_coords, vertex_segments, vertex_segment_params):
+    """Collect what remesh_changed_segments needs to know about a meshed path.
+
+    Returns:
+        dictionary of numpy arrays with the segments of the path (in experimental
+        space), the (N,2) vertices and the segment index and segment parameter t
+        of each vertex.
+    """
+    return {
+        "segment_types" : path_evaluator.segment_types,
+        "control_points" : path_evaluator.control_points,
+        "arc_params" : path_evaluator.arc_params,
+        "vertices" : np.column_stack((point_coords.real, point_coords.imag)),
+        "vertex_segments" : np.asarray(vertex_segments, dtype=np.int64),
+        "vertex_segment_params" : np.asarray(vertex_segment_params, dtype=float)
+    }
+
+
+def remesh_changed_segments(path_evaluator, mesh_record, params):
+    """Refit only the parts of a path whose segments changed since it was meshed.
+
+    The segments of the path are diffed against those of the mesh record. The
+    vertices on unchanged segments are kept as they are (bit-identical), and
+    the points between the last kept vertex before and the first kept vertex
+    after each change are refit with these two vertices fixed.
+
+    Args:
+        path_evaluator: points_estimation.PathEvaluator of the new path.
+        mesh_record: dictionary returned by make_mesh_record for the old path.
+        params: dictionary with parameters
+
+    Returns:
+        complex numpy array of the point coordinates and the arrays of the
+        segment index and segment parameter t of each point, or None if no
+        vertex can be kept.
+    """
+    old_signatures = get_segment_signatures(mesh_record)
+    new_signatures = get_segment_signatures(path_evaluator)
+    num_old_segments = len(old_signatures)
+    num_new_segments = len(new_signatures)
+    old_to_new_segments = np.full(num_old_segments, -1)
+    is_changed = np.ones(num_new_segments, dtype=bool)
+    matcher = difflib.SequenceMatcher(None, old_signatures, new_signatures, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            old_to_new_segments[i1:i2] = np.arange(j1, j2)
+            is_changed[j1:j2] = False
+
+    old_vertex_segments = mesh_record["vertex_segments"]
+    kept = np.flatnonzero(old_to_new_segments[old_vertex_segments] >= 0)
+    if len(kept) == 0:
+        return None
+    kept_old_segments = old_vertex_segments[kept]
+    kept_segments = old_to_new_segments[kept_old_segments]
+    kept_segment_params = mesh_record["vertex_segment_params"][kept]
+    kept_T = path_evaluator.segment_boundaries[kept_segments] + kept_segment_params * path_evaluator.segment_fractions[kept_segments]
+    kept_T = np.clip(kept_T, 0.0, 1.0)
+    kept_coords = mesh_record["vertices"][kept, 0] + 1j * mesh_record["vertices"][kept, 1]
+
+    def is_unchanged_between(a, b):
+        # True if the path between the kept vertices a and b (or the ends of the path for None) did not change.
+        old_index_a, old_segment_a, segment_a = (-1, -1, -1) if a is None else (kept[a], kept_old_segments[a], kept_segments[a])
+        old_index_b, old_segment_b, segment_b = ((len(old_vertex_segments), num_old_segments, num_new_segments) if b is None
+                                                 else (kept[b], kept_old_segments[b], kept_segments[b]))
+        return (old_index_b == old_index_a + 1 and old_segment_b - old_segment_a == segment_b - segment_a
+                and not np.any(is_changed[max(segment_a, 0):segment_b]))
+
+    # Windows (min_T, max_T, position) to refit; position is the number of kept vertices before the window.
+    windows = []
+    if not is_unchanged_between(None, 0):
+        windows.append( (0.0, kept_T[0], 0) )
+    for a in range(len(kept) - 1):
+        if not is_unchanged_between(a, a + 1):
+            windows.append( (kept_T[a], kept_T[a + 1], a + 1) )
+    if not is_unchanged_between(len(kept) - 1, None):
+        windows.append( (kept_T[-1], 1.0, len(kept)) )
+
+    config = points_estimation.USER_CONFIG.copy()
+    config["path"] = path_evaluator
+    config["ds"] = params['Ds']
+    config["num_parallel_processes"] = 1
+    num_processes = points_estimation.USER_CONFIG["num_parallel_processes"]
+    window_tasks = [ (config, min_T, max_T) for min_T, max_T, _ in windows ]
+    if num_processes <= 1 or len(window_tasks) <= 1:
+        window_params = [ points_estimation.fit_window(*window_task) for window_task in window_tasks ]
+    else:
+        window_params = worker_pool.get_worker_pool(num_processes).map(points_estimation.fit_window, window_tasks)
+
+    # Splice the refit points between the kept vertices; the fixed window ends are kept vertices themselves.
+    coords_pieces, T_pieces, kept_pieces = [], [], []
+    previous_position = 0
+    for (min_T, max_T, position), point_params in zip(windows, window_params):
+        coords_pieces.append(kept_coords[previous_position:position])
+        T_pieces.append(kept_T[previous_position:position])
+        kept_pieces.append(np.ones(position - previous_position, dtype=bool))
+        first = 0 if position == 0 else 1
+        last = len(point_params) if position == len(kept) else len(point_params) - 1
+        point_params = point_params[first:last]
+        coords_pieces.append(path_evaluator.point(point_params))
+        T_pieces.append(point_params)
+        kept_pieces.append(np.zeros(len(point_params), dtype=bool))
+        previous_position = position
+    coords_pieces.append(kept_coords[previous_position:])
+    T_pieces.append(kept_T[previous_position:])
+    kept_pieces.append(np.ones(len(kept) - previous_position, dtype=bool))
+
+    point_coords = np.concatenate(coords_pieces)
+    is_kept = np.concatenate(kept_pieces)
+    vertex_segments, vertex_segment_params = path_evaluator.T2t(np.concatenate(T_pieces))
+    # Keep the exact segment parameters of the kept vertices, so that they stay attached to their segments.
+    vertex_segments[is_kept] = kept_segments
+    vertex_segment_params[is_kept] = kept_segment_params
+    logger.info(f"Kept {len(kept)} vertices and refit {len(windows)} changed part(s) of the path.")
+    # Runs of changed segments, from the index of their first to the index of their last segment.
+    run_edges = np.diff(np.concatenate(([0], is_changed.astype(np.int8), [0])))
+    changed_runs = [ str(start) if start == end else f"{start}-{end}"
+                     for start, end in zip(np.flatnonzero(run_edges == 1), np.flatnonzero(run_edges == -1) - 1) ]
+    if len(changed_runs) > 0:
+        logger.info(f"Refit the changed segment(s) {', '.join(changed_runs)} of the path.")
+    return point_coords, vertex_segments, vertex_segment_params
+
+
+# Tokens of SVG path data, matching the tokenizer of svgpathtools.parse_path.
+PATH_COMMANDS = set('MmZzLlHhVvCcSsQqTtAa')
+PATH_NUM_ARGS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+_PATH_COMMAND_RE = re.compile(r"([MmZzLlHhVvCcSsQqTtAa])")
+_PATH_FLOAT_RE = re.compile(r"[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?")
+_PATH_TOKEN_RE = re.compile(r"[MmZzLlHhVvCcSsQqTtAa]|[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?")
+_PATH_ARC_FLAG_RE = re.compile(r"[01]")
+_PATH_SEPARATOR_RE = re.compile(r"[\s,]*")
+
+# Relative tolerance, with respect to the largest coordinate of a path, on the distance
+# between the endpoints of the segments which parse_path_data omits.
+PATH_ROUNDING_TOL = 1e-12
+
+# Column of the end point among the values of each command.
+PATH_END_COLUMNS = {'M': 0, 'L': 0, 'H': 0, 'V': 0, 'C': 4, 'S': 2, 'Q': 2, 'T': 0, 'A': 5, 'Z': 0}
+# PATH_NUM_ARGS and PATH_END_COLUMNS indexed by the ASCII code of the uppercase command.
+_PATH_NUM_ARGS_TABLE = np.zeros(128, dtype=np.int64)
+_PATH_NUM_ARGS_TABLE[[ ord(command) for command in PATH_NUM_ARGS ]] = list(PATH_NUM_ARGS.values())
+_PATH_END_COLUMN_TABLE = np.zeros(128, dtype=np.int64)
+_PATH_END_COLUMN_TABLE[[ ord(command) for command in PATH_END_COLUMNS ]] = list(PATH_END_COLUMNS.values())
+
+
+class PathData():
+    """
+    Class holds the segments of an SVG path packed into NumPy arrays, without
+    a Python object per segment. See parse_path_data.
+
+    Args:
+        - segment_types: (S,) array with PathData.LINE, QUADRATIC, CUBIC or ARC
+            per segment.
+        - control_points: (S,4) complex array. The first 2, 3 or 4 columns hold
+            the control points of lines, quadratic and cubic Bezier segments;
+            arcs hold their start point, complex radius, 0 and end point.
+        - arc_flags: (S,3) float array with the rotation in degrees and the
+            large_arc and sweep flags of each arc (0 for Bezier segments).
+    """
+    LINE = 1
+    QUADRATIC = 2
+    CUBIC = 3
+    ARC = 4
+
+    def __init__(self, segment_types, control_points, arc_flags):
+        self.segment_types = np.asarray(segment_types, dtype=np.int8)
+        self.control_points = np.asarray(control_points, dtype=complex).reshape(-1, 4)
+        self.arc_flags = np.asarray(arc_flags, dtype=float).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.segment_types)
+
+    @classmethod
+    def concatenate(cls, path_data_list):
+        """
+        Returns the PathData with the segments of all PathData in path_data_list.
+        """
+        path_data_list = list(path_data_list)
+        return cls(np.concatenate([np.zeros(0, dtype=np.int8)] + [ path_data.segment_types for path_data in path_data_list ]),
+                   np.concatenate([np.zeros((0, 4), dtype=complex)] + [ path_data.control_points for path_data in path_data_list ]),
+                   np.concatenate([np.zeros((0, 3))] + [ path_data.arc_flags for path_data in path_data_list ]))
+
+    def get_point_mask(self):
+        """
+        Returns an (S,4) boolean array which is True for the entries of
+        control_points that are points (rather than radii or padding).
+        """
+        is_arc = self.segment_types == self.ARC
+        mask = np.arange(4) <= self.segment_types[:, None]
+        mask[is_arc] = [True, False, False, True]
+        return mask
+
+    def transformed(self, tf):
+        """
+        Returns the PathData transformed by the homogeneous transformation matrix tf.
+
+        All control points (and the endpoints of arcs) are transformed in a single
+        (3, K) matrix multiply. The radii and rotations of arcs are transformed
+        exactly with transform_arc_axes.
+        """
+        mask = self.get_point_mask()
+        points = self.control_points[mask]
+        points_mat = np.ones((3, len(points)))
+        points_mat[0,:] = points.real
+        points_mat[1,:] = points.imag
+        points_transformed_mat = np.matmul(tf, points_mat)
+        control_points = np.zeros_like(self.control_points)
+        control_points[mask] = points_transformed_mat[0] + 1j * points_transformed_mat[1]
+
+        arc_flags = self.arc_flags.copy()
+        is_arc = self.segment_types == self.ARC
+        if np.any(is_arc):
+            radii, rotations, sweeps = transform_arc_axes(self.control_points[is_arc, 1], arc_flags[is_arc, 0], arc_flags[is_arc, 2] != 0, tf)
+            control_points[is_arc, 1] = radii
+            arc_flags[is_arc, 0] = rotations
+            arc_flags[is_arc, 2] = sweeps
+        return PathData(self.segment_types, control_points, arc_flags)
+
+    def get_arc_params(self):
+        """
+        Vectorized version of the parameterization of svgpathtools.Arc.
+
+        Returns:
+            radii: complex array with the radius of each arc, scaled up if no
+                ellipse with the given radius passes through both endpoints.
+            arc_params: (A,5) float array of (center.real, center.imag, rotation,
+                theta, delta) of each arc, as used by points_estimation.PathEvaluator.
+        """
+        is_arc = self.segment_types == self.ARC
+        start = self.control_points[is_arc, 0]
+        end = self.control_points[is_arc, 3]
+        rx = np.abs(self.control_points[is_arc, 1].real)
+        ry = np.abs(self.control_points[is_arc, 1].imag)
+        rotation, large_arc, sweep = self.arc_flags[is_arc].T
+        large_arc = large_arc != 0
+        sweep = sweep != 0
+
+        # See http://www.w3.org/TR/SVG/implnote.html#ArcImplementationNotes
+        rot_matrix = np.exp(1j * np.radians(rotation))
+        zp1 = (1/rot_matrix) * (start - end) / 2
+        x1p, y1p = zp1.real, zp1.imag
+        radius_check = x1p*x1p / (rx*rx) + y1p*y1p / (ry*ry)
+        scale = np.where(radius_check > 1, np.sqrt(np.maximum(radius_check, 1)), 1)
+        rx = rx * scale
+        ry = ry * scale
+        tmp = rx*rx*y1p*y1p + ry*ry*x1p*x1p
+        radicand = (rx*rx*ry*ry - tmp) / tmp
+        radical = np.where(np.isclose(radicand, 0), 0, np.sqrt(np.maximum(radicand, 0)))
+        cp = np.where(large_arc == sweep, -radical, radical) * (rx*y1p/ry - 1j*ry*x1p/rx)
+        center = rot_matrix * cp + (start + end) / 2
+
+        u1 = (x1p - cp.real)/rx + 1j*(y1p - cp.imag)/ry
+        u2 = (-x1p - cp.real)/rx + 1j*(-y1p - cp.imag)/ry
+        u1 = np.clip(u1.real, -1, 1) + 1j*np.clip(u1.imag, -1, 1)
+        u2 = np.clip(u2.real, -1, 1) + 1j*np.clip(u2.imag, -1, 1)
+        theta = np.where(u1.imag > 0, np.degrees(np.arccos(u1.real)),
+                np.where(u1.imag < 0, -np.degrees(np.arccos(u1.real)),
+                np.where(u1.real > 0, 0.0, 180.0)))
+        det_uv = u1.real*u2.imag - u1.imag*u2.real
+        dot_uv = u1.real*u2.real + u1.imag*u2.imag
+        acos_uv = np.degrees(np.arccos(np.clip(dot_uv, -1, 1)))
+        delta = np.where(det_uv > 0, acos_uv, np.where(det_uv < 0, -acos_uv, np.where(dot_uv > 0, 0.0, 180.0)))
+        delta = np.where(~sweep & (delta >= 0), delta - 360, np.where(sweep & large_arc & (delta <= 0), delta + 360, delta))
+        return rx + 1j*ry, np.stack((center.real, center.imag, rotation, theta, delta), -1)
+
+    def to_path_evaluator(self):
+        """
+        Compiles the segments into a points_estimation.PathEvaluator, directly from
+        the arrays. The segment lengths are integrated by quadrature.
+        """
+        PathEvaluator = points_estimation.PathEvaluator
+        p = self.control_points
+        is_arc = self.segment_types == self.ARC
+        control_points = p.copy()
+        is_line = self.segment_types == self.LINE
+        control_points[is_line, 1] = p[is_line, 0] + (p[is_line, 1] - p[is_line, 0])/3
+        control_points[is_line, 2] = p[is_line, 0] + 2*(p[is_line, 1] - p[is_line, 0])/3
+        control_points[is_line, 3] = p[is_line, 1]
+        is_quadratic = self.segment_types == self.QUADRATIC
+        control_points[is_quadratic, 1] = p[is_quadratic, 0] + 2*(p[is_quadratic, 1] - p[is_quadratic, 0])/3
+        control_points[is_quadratic, 2] = p[is_quadratic, 2] + 2*(p[is_quadratic, 1] - p[is_quadratic, 2])/3
+        control_points[is_quadratic, 3] = p[is_quadratic, 2]
+        arc_params = np.zeros((len(self), 5))
+        if np.any(is_arc):
+            control_points[is_arc, 1], arc_params[is_arc] = self.get_arc_params()
+        segment_types = np.where(is_arc, PathEvaluator.ARC, PathEvaluator.BEZIER)
+        return PathEvaluator(segment_types, control_points, arc_params)
+
+    def to_segments(self):
+        """
+        Returns the segments as a list of svgpathtools objects.
+        """
+        segments = []
+        for segment_type, points, (rotation, large_arc, sweep) in zip(self.segment_types.tolist(), self.control_points.tolist(), self.arc_flags.tolist()):
+            if segment_type == self.ARC:
+                segments.append( svgpathtools.Arc(points[0], points[1], rotation, bool(large_arc), bool(sweep), points[3]) )
+            else:
+                segments.append( svgpathtools.bpoints2bezier(points[:segment_type + 1]) )
+        return segments
+
+
+def _tokenize_arc_args(arg_chunk):
+    """
+    Yields the tokens of the arguments of arc commands, whose flags may be
+    written without a separator before the next number (e.g. "0110 0").
+    """
+    pos = 0
+    field = 0
+    while True:
+        pos = _PATH_SEPARATOR_RE.match(arg_chunk, pos).end()
+        if pos >= len(arg_chunk):
+            return
+        if field % 7 in (3, 4):
+            match = _PATH_ARC_FLAG_RE.match(arg_chunk, pos)
+        else:
+            match = _PATH_FLOAT_RE.match(arg_chunk, pos)
+        if match is None:
+            return
+        yield match.group()
+        pos = match.end()
+        field += 1
+
+def tokenize_path_data(d):
+    """
+    Splits SVG path data into a list of command letters and number strings.
+    """
+    if 'A' not in d and 'a' not in d:
+        return _PATH_TOKEN_RE.findall(d)
+    tokens = []
+    command = None
+    for chunk in _PATH_COMMAND_RE.split(d):
+        if chunk in PATH_COMMANDS:
+            command = chunk
+            tokens.append(chunk)
+        elif command in ('A', 'a'):
+            tokens.extend(_tokenize_arc_args(chunk))
+        else:
+            tokens.extend(_PATH_FLOAT_RE.findall(chunk))
+    return tokens
+
+
+def resolve_references(offsets, references, factors=None):
+    """
+    Returns the values v with v[i] = offsets[i] + factors[i] * v[references[i]],
+    where each reference is to an earlier value, or v[i] = offsets[i] where the
+    reference is -1. The chains of references are followed by pointer doubling,
+    so that a chain of length n takes log2(n) vectorized steps.
+    """
+    if factors is None:
+        factors = np.ones(len(offsets))
+    while np.any(references >= 0):
+        has_reference = references >= 0
+        referenced = np.where(has_reference, references, 0)
+        offsets = np.where(has_reference, offsets + factors * offsets[referenced], offsets)
+        factors = np.where(has_reference, factors * factors[referenced], factors)
+        references = np.where(has_reference, references[referenced], -1)
+    return offsets
+
+
+def parse_path_data(d):
+    """Parse SVG path data into packed arrays of segments.
+
+    The result has the same segments as svgpathtools.parse_path, but no Python
+    object is created per segment. The whole string is tokenized with a single
+    regular expression and all numbers are converted at once. Each run of
+    values after a command letter is split into repetitions of the command by
+    index arithmetic, and the current point, which every relative command
+    depends on, is found for all segments at once with resolve_references.
+    Arcs whose endpoints coincide are omitted, as the SVG specification requires.
+
+    Args:
+        d: the d attribute of an SVG path.
+
+    Returns:
+        PathData with the segments of the path.
+
+    Raises:
+        ValueError: if the path data is malformed.
+    """
+    try:
+        path_data = _pack_path_tokens(_PATH_TOKEN_RE.findall(d), d)
+    except ValueError:
+        if 'A' not in d and 'a' not in d:
+            raise
+        path_data = None
+    if path_data is None:
+        # Arc flags may be written without a separator before the next number
+        # (e.g. "a 5 5 0 0110 0"), which only tokenize_path_data splits correctly.
+        path_data = _pack_path_tokens(tokenize_path_data(d), d)
+    return path_data
+
+
+def _pack_path_tokens(tokens, d):
+    """
+    Returns the PathData of the tokens of the path data d, see parse_path_data,
+    or None if an arc flag is not a single 0 or 1.
+    """
+    if len(tokens) == 0:
+        return PathData([], [], [])
+    is_command = [ token in PATH_COMMANDS for token in tokens ]
+    if not is_command[0]:
+        raise ValueError(f"Unallowed implicit command in {d[:100]}")
+    number_tokens = [ token for token, token_is_command in zip(tokens, is_command) if not token_is_command ]
+    values = np.array(number_tokens, dtype=float)
+    command_positions = np.flatnonzero(is_command)
+    commands = np.frombuffer("".join([ tokens[i] for i in command_positions.tolist() ]).encode("ascii"), dtype=np.uint8)
+    is_relative = commands >= ord('a')
+    commands = commands & 0xDF # Uppercase
+
+    # Split the values of each command into repetitions of the command.
+    num_args = _PATH_NUM_ARGS_TABLE[commands]
+    num_values = np.diff(np.append(command_positions, len(tokens))) - 1
+    is_close = commands == ord('Z')
+    if np.any(is_close & (num_values > 0)):
+        raise ValueError(f"Unallowed implicit command in {d[:100]}")
+    is_invalid = ~is_close & ((num_values == 0) | (num_values % np.maximum(num_args, 1) != 0))
+    if np.any(is_invalid):
+        k = int(np.argmax(is_invalid))
+        raise ValueError(f"Invalid path data: command '{chr(commands[k])}' expects {num_args[k]} values per repetition in {d[:100]}")
+    num_repetitions = np.where(is_close, 1, num_values // np.maximum(num_args, 1))
+    run = np.repeat(np.arange(len(commands)), num_repetitions)
+    repetition = np.arange(len(run)) - (np.cumsum(num_repetitions) - num_repetitions)[run]
+    value_starts = (command_positions - np.arange(len(commands)))[run] + repetition * num_args[run]
+    vals = np.append(values, np.zeros(7))[ value_starts[:, None] + np.arange(7) ]
+    command = commands[run]
+    relative = is_relative[run]
+    is_move = (command == ord('M')) & (repetition == 0)
+    command[command == ord('M')] = ord('L') # Implicit moveto commands are treated as lineto commands.
+    command[is_move] = ord('M')
+
+    is_arc = command == ord('A')
+    if np.any(is_arc):
+        flag_positions = (value_starts[is_arc, None] + [3, 4]).ravel().tolist()
+        if not { number_tokens[i] for i in flag_positions } <= {"0", "1"}:
+            return None
+
+    # The end point of each command is absolute, relative to the previous end point,
+    # or the start of the subpath for closepath commands.
+    n = len(command)
+    previous = np.arange(n) - 1
+    end_column = _PATH_END_COLUMN_TABLE[command]
+    x_offsets = vals[np.arange(n), end_column]
+    y_offsets = vals[np.arange(n), end_column + 1]
+    x_references = np.where(relative, previous, -1)
+    y_references = x_references.copy()
+    is_horizontal = command == ord('H')
+    is_vertical = command == ord('V')
+    y_offsets[is_horizontal] = 0.0
+    y_references[is_horizontal] = previous[is_horizontal]
+    y_offsets[is_vertical] = x_offsets[is_vertical]
+    x_offsets[is_vertical] = 0.0
+    x_references[is_vertical] = previous[is_vertical]
+    is_close = command == ord('Z')
+    subpath_starts = np.maximum.accumulate(np.where(is_move, np.arange(n), -1))
+    if np.any(subpath_starts[is_close] < 0):
+        raise ValueError(f"Invalid path data: closepath before the first moveto in {d[:100]}")
+    x_offsets[is_close] = y_offsets[is_close] = 0.0
+    x_references[is_close] = y_references[is_close] = subpath_starts[is_close]
+    end = resolve_references(x_offsets, x_references) + 1j * resolve_references(y_offsets, y_references)
+    start = np.concatenate(([0j], end[:-1]))
+
+    # The first two pairs of values as complex numbers, e.g. the control points of a cubic Bezier segment.
+    pairs = np.ascontiguousarray(vals[:, :4]).view(complex)
+    pairs[relative] += start[relative, None]
+    previous_command = np.concatenate(([0], command[:-1]))
+    is_cubic = (command == ord('C')) | (command == ord('S'))
+    control2 = np.where(command == ord('C'), pairs[:, 1], pairs[:, 0])
+    control1 = np.where(command == ord('C'), pairs[:, 0], start)
+    # The first control point of S is the reflection of the second control point of the previous segment.
+    is_reflected = np.flatnonzero( (command == ord('S')) & ((previous_command == ord('C')) | (previous_command == ord('S'))) )
+    control1[is_reflected] = start[is_reflected] + start[is_reflected] - control2[is_reflected - 1]
+    is_quadratic = (command == ord('Q')) | (command == ord('T'))
+    # The control point of T is the reflection of the control point of the previous segment, which may be a T itself.
+    is_reflected = (command == ord('T')) & ((previous_command == ord('Q')) | (previous_command == ord('T')))
+    control = resolve_references(np.where(command == ord('Q'), pairs[:, 0], np.where(is_reflected, start + start, start)),
+                                 np.where(is_reflected, previous, -1), np.where(is_reflected, -1.0, 1.0))
+
+    # The current point is summed in another order than by svgpathtools, so closepath
+    # commands and arcs are omitted if their endpoints only differ by rounding errors.
+    is_degenerate = np.abs(end - start) <= PATH_ROUNDING_TOL * np.max(np.abs(end))
+    radius = np.abs(vals[:, 0]) + 1j * np.abs(vals[:, 1])
+    is_line = (command == ord('L')) | is_horizontal | is_vertical | (is_close & ~is_degenerate)
+    is_line |= is_arc & ((radius.real == 0) | (radius.imag == 0)) # Arcs with a zero radius are lines.
+    is_arc &= ~is_line & ~is_degenerate
+    segment_types = np.zeros(n, dtype=np.int8)
+    segment_types[is_line] = PathData.LINE
+    segment_types[is_quadratic] = PathData.QUADRATIC
+    segment_types[is_cubic] = PathData.CUBIC
+    segment_types[is_arc] = PathData.ARC
+    control_points = np.zeros((n, 4), dtype=complex)
+    control_points[:, 0] = start
+    control_points[is_line, 1] = end[is_line]
+    control_points[is_quadratic, 1] = control[is_quadratic]
+    control_points[is_quadratic, 2] = end[is_quadratic]
+    control_points[is_cubic, 1] = control1[is_cubic]
+    control_points[is_cubic, 2] = control2[is_cubic]
+    control_points[is_cubic, 3] = end[is_cubic]
+    control_points[is_arc, 1] = radius[is_arc]
+    control_points[is_arc, 3] = end[is_arc]
+    arc_flags = np.zeros((n, 3))
+    arc_flags[is_arc] = np.column_stack(( vals[is_arc, 2], vals[is_arc, 3] != 0, vals[is_arc, 4] != 0 ))
+    is_segment = segment_types != 0
+    return PathData(segment_types[is_segment], control_points[is_segment], arc_flags[is_segment])
+
+
+def transform_path(path, A):
+    """Transform an SvgObject path from SVG space to experimental space.
+
+    The path data is parsed with parse_path_data, and the aggregate transform
+    of the path and A are composed into one matrix, which is applied to all
+    control points of the path in a single multiply (see PathData.transformed).
+
+    Args:
+        path: path SvgObject.
+        A: 3x3 matrix of the transform to experimental space, see transform_matrix.
+
+    Returns:
+        PathData with the transformed segments of the path.
+    """
+    tf = A.dot( path.get_aggregate_transform_matrix() )
+    return parse_path_data( path.get('d') ).transformed(tf)
+
+
+def transform_arc_axes(radii, rotations, sweeps, tf):
+    """Transform the ellipses of arcs by the homogeneous transformation matrix tf.
+
+    An affine map takes the ellipse of an arc to another ellipse, whose radii
+    and rotation are found from the singular value decomposition of the linear
+    part of tf applied to the axes of the original ellipse. A reflection
+    reverses the direction in which the arc is swept.
+
+    Args:
+        radii: complex array with the radii of the arcs.
+        rotations: array with the rotations of the arcs in degrees.
+        sweeps: boolean array with the sweep flags of the arcs.
+        tf: 3x3 homogeneous transformation matrix.
+
+    Returns:
+        The transformed radii, rotations and sweep flags.
+    """
+    radii = np.asarray(radii, dtype=complex)
+    phi = np.radians(rotations)
+    axes = np.empty((len(radii), 2, 2))
+    axes[:, 0, 0] = np.cos(phi) * radii.real
+    axes[:, 0, 1] = -np.sin(phi) * radii.imag
+    axes[:, 1, 0] = np.sin(phi) * radii.real
+    axes[:, 1, 1] = np.cos(phi) * radii.imag
+    U, singular_values, _ = np.linalg.svd( np.matmul(tf[:2,:2], axes) )
+    rotations = np.degrees( np.arctan2(U[:, 1, 0], U[:, 0, 0]) )
+    sweeps = np.asarray(sweeps, dtype=bool)
+    if np.linalg.det(tf[:2,:2]) < 0:
+        sweeps = ~sweeps
+    return singular_values[:, 0] + 1j * singular_values[:, 1], rotations, sweeps
+
+
+def get_rigid_motion(tf, prototype_tf):
+    """Find the transform which takes a path transformed by prototype_tf to the
+    same path transformed by tf, if it preserves distances.
+
+    Args:
+        tf: 3x3 homogeneous transformation matrix.
+        prototype_tf: 3x3 homogeneous transformation matrix.
+
+    Returns:
+        The 3x3 matrix of the rigid motion (including reflections), or None if
+        there is no such motion.
+    """
+    try:
+        motion = tf.dot( np.linalg.inv(prototype_tf) )
+    except np.linalg.LinAlgError:
+        return None
+    linear_part = motion[:2,:2]
+    if not np.allclose( linear_part.T.dot(linear_part), np.identity(2), rtol=0, atol=RIGID_MOTION_TOL ):
+        return None
+    return motion
+
+
+class PathInstances():
+    """
+    Class which finds the paths that are instances of the same geometry (see
+    SvgObject.instance_of) under transforms to experimental space which differ
+    by a rigid motion. A rigid motion preserves the spacing of the vertices, so
+    only the first of these paths, the prototype, needs to be fitted; the
+    vertices of the others are the moved vertices of the prototype.
+
+    Only instances are remembered, so a stream of paths without <use> elements
+    is not held in memory.
+    """
+    def __init__(self, A):
+        """
+        Args:
+            A: 3x3 matrix of the transform to experimental space, see transform_matrix.
+        """
+        self.A = A
+        self.prototypes = {} # Prototypes of the instances, by path data.
+        self.num_reused = 0
+
+    def match(self, path):
+        """
+        Returns the prototype of path and the rigid motion from the prototype to
+        path, or a new prototype and None if path needs to be fitted. A prototype
+        is a dictionary with the transformed "segments" of its path (see
+        transform_path), their number and the "point_coords" of its vertices,
+        which the caller sets once they are fitted.
+        """
+        tf = self.A.dot( path.get_aggregate_transform_matrix() )
+        candidates = self.prototypes.setdefault(path.get('d'), []) if path.instance_of is not None else []
+        for prototype in candidates:
+            motion = get_rigid_motion(tf, prototype["tf"])
+            if motion is not None:
+                self.num_reused += 1
+                return prototype, motion
+        segments = parse_path_data( path.get('d') ).transformed(tf)
+        prototype = { "tf" : tf, "segments" : segments, "num_segments" : len(segments), "point_coords" : None }
+        candidates.append(prototype)
+        return prototype, None
+
+    @staticmethod
+    def get_point_coords(prototype, motion):
+        """
+        Returns the complex coordinates of the vertices of the instance of
+        prototype which is moved by motion (None for the prototype itself).
+        """
+        point_coords = prototype["point_coords"]
+        if motion is None:
+            return point_coords
+        return (motion[0,0] * point_coords.real + motion[0,1] * point_coords.imag + motion[0,2]
+                + 1j * (motion[1,0] * point_coords.real + motion[1,1] * point_coords.imag + motion[1,2]))
+
+
+def make_vertices(path_list, params, per_path=None, mesh_record=None):
     """Takes the paths and turns them into a list of vertex points.
 
     Args:
         path_list: python list containing path SvgObjects.
-        params: dictionary containing all parameters.
+        params: dictionary containing all parameters. The number of vertices
+            of each path is stored in params['PathPointCounts']. Unless in
+            per-path mode, a mesh record of the path (see make_mesh_record) is
+            stored in params['MeshRecord']. See make_springs_and_beams for
+            params['Springs'] and params['Beams'].
+        per_path: if True, mesh each path independently (in parallel) instead
+            of fitting points to one path made of the segments of all paths.
+            Instances of the same geometry are then fitted only once, see
+            PathInstances. Defaults to MESH_CONFIG["per_path"].
+        mesh_record: mesh record of a previous version of the paths. If given,
+            only the changed parts of the path are refit (see
+            remesh_changed_segments). Not used in per-path mode.
 
     Returns:
-        vertex_vec: list containing all vertex points obtained from the
+        vertex_vec: VertexArray containing all vertex points obtained from the
         svg file.
     """
     logger.info("Begin making vertices.")
 
-    vertex_vec = []
-    error_vec = []
-    warning_messages = []
-    ds = params['Ds']
-    segments = []
+    if per_path is None:
+        per_path = MESH_CONFIG["per_path"]
+    params.pop('PathPointCounts', None)
+    params.pop('MeshRecord', None)
+
     A = transform_matrix(params) # Create point transform to target space
 
-    for path in path_list:
-        path_as_svgpathtools_path = parse_path( path.get('d') )
-        path_as_svgpathtools_path = transform( path_as_svgpathtools_path, path.get_aggregate_transform_matrix() )
-
-        for segment in path_as_svgpathtools_path:
-            # Transform curves from SVG space -> experimental space
-            ctrl_points_svg = np.asarray(segment.bpoints() )
-            ctrl_points_svg_mat = np.ones((3, len(ctrl_points_svg) ))
-            ctrl_points_svg_mat[0,:] = ctrl_points_svg.real
-            ctrl_points_svg_mat[1,:] = ctrl_points_svg.imag
-            ctrl_points_transformed_mat = np.matmul(A, ctrl_points_svg_mat)
-            ctrl_points_transformed = ctrl_points_transformed_mat[0] + 1j* ctrl_points_transformed_mat[1]
-            segment_transformed = svgpathtools.bpoints2bezier(ctrl_points_transformed)
-            segments.append(segment_transformed)
-
-    path_transformed = svgpathtools.Path(*segments)
-    pts = points_on_path(path_transformed, params)
-
-    for cur_point_index, p in enumerate(pts):
-        z = path_transformed.point(p)
-        cur_point = Vertex(z.real, z.imag)
-        vertex_vec.append(cur_point)
-        if cur_point_index > 0:
-            previous_point = vertex_vec[cur_point_index - 1]
-            distance = chk_vertex_dist(cur_point, previous_point)
-            rel_error = np.abs((distance - ds) / ds)
-            error_vec.append(rel_error)
-            if rel_error > ERROR_TOL:
-                path_description = str(path.attr)
-                max_description_length = 100
-                if len(path_description) > max_description_length:
-                    path_description = path_description[:max_description_length] + "..."
-                warning_messages.append(f"Max Euclidean distance exceeded by {100*rel_error:.5f}% at vertex { cur_point.getPos() } on the path with attributes { path_description }.")
-
-    for warning_message in warning_messages:
-        logger.warning(warning_message)
-    logger.info(f"Summary - Mean Rel. Err:  {100*np.mean(error_vec):.5f}%.")
-    if len(warning_messages) > 0:
+    if per_path:
+        path_instances = PathInstances(A)
+        prototype_per_path = [ path_instances.match(path) for path in path_list ]
+        # Paths without segments get no vertices.
+        fitted_prototypes = [ prototype for prototype, motion in prototype_per_path if motion is None and prototype["num_segments"] > 0 ]
+        paths_transformed = [ prototype["segments"].to_path_evaluator() for prototype in fitted_prototypes ]
+        point_params_per_path = points_on_paths(paths_transformed, params)
+        for prototype, path_transformed, pts in zip(fitted_prototypes, paths_transformed, point_params_per_path):
+            prototype["point_coords"] = points_estimation.get_point_coords(path_transformed, pts)
+        if path_instances.num_reused > 0:
+            logger.info(f"Reused the vertices of {path_instances.num_reused} instance(s) of other paths.")
+        point_coords_per_path = [ PathInstances.get_point_coords(prototype, motion)
+                                  for prototype, motion in prototype_per_path if prototype["num_segments"] > 0 ]
+        params['PathPointCounts'] = [ len(PathInstances.get_point_coords(prototype, motion)) if prototype["num_segments"] > 0 else 0
+                                      for prototype, motion in prototype_per_path ]
+    else:
+        segments_per_path = [ transform_path(path, A) for path in path_list ]
+        path_evaluator = PathData.concatenate(segments_per_path).to_path_evaluator()
+        remeshed = None
+        if mesh_record is not None:
+            remeshed = remesh_changed_segments(path_evaluator, mesh_record, params)
+        if remeshed is not None:
+            point_coords, vertex_segments, vertex_segment_params = remeshed
+        else:
+            pts = points_on_path(path_evaluator, params)
+            point_coords = points_estimation.get_point_coords(path_evaluator, pts)
+            vertex_segments, vertex_segment_params = path_evaluator.T2t(pts)
+        params['MeshRecord'] = make_mesh_record(path_evaluator, point_coords, vertex_segments, vertex_segment_params)
+        segment_path_indices = np.repeat(np.arange(len(path_list)), [ len(segments) for segments in segments_per_path ])
+        params['PathPointCounts'] = np.bincount(segment_path_indices[vertex_segments], minlength=len(path_list)).tolist()
+        point_coords_per_path = [ point_coords ]
+
+    vertex_vec = VertexArray.from_complex(np.concatenate([np.zeros(0, dtype=complex)] + point_coords_per_path))
+    report_spacing_errors(vertex_vec, params)
+    make_springs_and_beams(vertex_vec, params)
+    return vertex_vec
+
+
+class SpacingReport():
+    """
+    Class which aggregates the relative spacing errors of the vertices of one or
+    more paths (see VertexArray.get_vertex_spacing_errors) into statistics: the
+    mean, percentiles, the worst errors and the runs of consecutive errors above
+    the tolerance on each path. The errors can be added all at once or path by
+    path; only a fixed amount of state is kept, so the percentiles are read from
+    a histogram (see SPACING_HISTOGRAM_EDGES).
+    """
+    def __init__(self, tolerance=ERROR_TOL, worst_k=SPACING_REPORT_WORST_K):
+        """
+        Args:
+            tolerance: relative spacing error above which a spacing is a violation.
+            worst_k: number of worst errors and paths which are kept.
+        """
+        self.tolerance = tolerance
+        self.worst_k = worst_k
+        self.num_vertices = 0
+        self.num_paths = 0
+        self.num_errors = 0
+        self.error_sum = 0.0
+        self.max_error = 0.0
+        self.histogram = np.zeros(len(SPACING_HISTOGRAM_EDGES) + 1, dtype=np.int64)
+        self.num_violations = 0
+        self.num_runs = 0
+        self.num_paths_with_violations = 0
+        # Columns error, vertex index, path index, x and y of the worst errors, in descending order.
+        self.worst_errors = np.zeros((0, 5))
+        # Columns violations, runs, longest run, its first vertex index and path index of the paths
+        # with the most violations, in descending order.
+        self.worst_paths = np.zeros((0, 5), dtype=np.int64)
+
+    def add(self, coords, vertex_errors, point_counts):
+        """
+        Adds the errors of the vertices of the next paths.
+
+        Args:
+            coords: (N,2) array of the vertices.
+            vertex_errors: (N,) array of the relative spacing error of each vertex,
+                NaN at the first vertex of each path.
+            point_counts: number of vertices of each path.
+        """
+        vertex_errors = np.asarray(vertex_errors, dtype=float)
+        path_offsets = np.concatenate(([0], np.cumsum(point_counts, dtype=np.int64)))
+        measured = np.flatnonzero(~np.isnan(vertex_errors))
+        errors = vertex_errors[measured]
+        self.num_errors += len(errors)
+        self.error_sum += float(np.sum(errors))
+        self.histogram += np.bincount(np.searchsorted(SPACING_HISTOGRAM_EDGES, errors, side="right"), minlength=len(self.histogram))
+        if len(errors) > 0:
+            self.max_error = max(self.max_error, float(np.max(errors)))
+            worst = measured[ np.argpartition(errors, -min(self.worst_k, len(errors)))[-self.worst_k:] ]
+            worst_errors = np.column_stack((vertex_errors[worst], worst + self.num_vertices,
+                                            np.searchsorted(path_offsets, worst, side="right") - 1 + self.num_paths,
+                                            coords[worst, 0], coords[worst, 1]))
+            worst_errors = np.concatenate((self.worst_errors, worst_errors))
+            self.worst_errors = worst_errors[ np.argsort(-worst_errors[:, 0], kind="stable")[:self.worst_k] ]
+
+        # Runs of violations never cross paths, since the first vertex of each path has no error.
+        is_violation = np.concatenate(([False], vertex_errors > self.tolerance, [False]))
+        run_bounds = np.flatnonzero(is_violation[1:] != is_violation[:-1])
+        run_starts = run_bounds[::2]
+        run_lengths = run_bounds[1::2] - run_starts
+        if len(run_starts) > 0:
+            run_paths = np.searchsorted(path_offsets, run_starts, side="right") - 1
+            num_paths = len(path_offsets) - 1
+            violations_per_path = np.bincount(run_paths, weights=run_lengths, minlength=num_paths).astype(np.int64)
+            runs_per_path = np.bincount(run_paths, minlength=num_paths)
+            # The longest run of each path, with the earliest first one among equally long runs.
+            order = np.lexsort((run_starts, -run_lengths, run_paths))
+            is_first_of_path = np.concatenate(([True], run_paths[order][1:] != run_paths[order][:-1]))
+            longest_runs = order[is_first_of_path]
+            paths = run_paths[longest_runs]
+            worst_paths = np.column_stack((violations_per_path[paths], runs_per_path[paths], run_lengths[longest_runs],
+                                           run_starts[longest_runs] + self.num_vertices, paths + self.num_paths))
+            worst_paths = np.concatenate((self.worst_paths, worst_paths))
+            self.worst_paths = worst_paths[ np.argsort(-worst_paths[:, 0], kind="stable")[:self.worst_k] ]
+            self.num_violations += int(np.sum(run_lengths))
+            self.num_runs += len(run_starts)
+            self.num_paths_with_violations += len(paths)
+        self.num_vertices += len(vertex_errors)
+        self.num_paths += len(path_offsets) - 1
+
+    def get_mean_error(self):
+        return self.error_sum / max(self.num_errors, 1)
+
+    def get_percentiles(self, percentiles=SPACING_REPORT_PERCENTILES):
+        """
+        Returns the given percentiles of the errors, each rounded up to the next
+        edge of the histogram, but at most the largest error.
+        """
+        cumulative_counts = np.cumsum(self.histogram)
+        ranks = np.maximum(np.ceil(np.asarray(percentiles) / 100 * self.num_errors), 1)
+        bins = np.searchsorted(cumulative_counts, ranks)
+        upper_edges = np.append(SPACING_HISTOGRAM_EDGES, np.inf)[bins]
+        return np.minimum(upper_edges, self.max_error)
+
+    def log(self):
+        """
+        Logs the statistics, with one line per worst error and per path with the most violations.
+        """
+        logger.info(f"Summary - Mean Rel. Err:  {100*self.get_mean_error():.5f}%.")
+        if self.num_errors == 0:
+            return
+        percentiles = ", ".join( f"p{percentile}: {100*value:.5f}%"
+                                 for percentile, value in zip(SPACING_REPORT_PERCENTILES, self.get_percentiles()) )
+        logger.info(f"Spacing errors - {percentiles}, max: {100*self.max_error:.5f}%.")
+        if self.num_violations == 0:
+            return
+        logger.warning(f"{self.num_violations} of {self.num_errors} spacings ({100*self.num_violations/self.num_errors:.3f}%) exceed "
+                       f"the error tolerance of {100*self.tolerance:g}% in {self.num_runs} run(s) on {self.num_paths_with_violations} path(s).")
+        for error, vertex_index, path_index, x, y in self.worst_errors[self.worst_errors[:, 0] > self.tolerance]:
+            logger.warning(f"Max Euclidean distance exceeded by {100*error:.5f}% at vertex {int(vertex_index)} {(x, y)} of path {int(path_index)}.")
+        for num_violations, num_runs, longest_run, longest_run_start, path_index in self.worst_paths:
+            logger.warning(f"Path {path_index} has {num_violations} violation(s) in {num_runs} run(s), the longest of "
+                           f"{longest_run} vertices starting at vertex {longest_run_start}.")
         logger.info("WARNING - Some points have spacing greater than the defined error tolerance. Please see the log file for details.")
 
-    return vertex_vec
+
+def report_spacing_errors(vertex_vec, params):
+    """Measure the spacing errors of all vertices at once and log a SpacingReport.
+
+    Args:
+        vertex_vec: VertexArray of the vertices of the paths.
+        params: dictionary containing all parameters, including the number of
+            vertices of each path in params['PathPointCounts'], if there are
+            several paths. The relative spacing error of each vertex is stored
+            in params['SpacingErrors'], see geo_obj.write_spacing_errors.
+
+    Returns:
+        The SpacingReport.
+    """
+    point_counts = params.get('PathPointCounts', [len(vertex_vec)])
+    params['SpacingErrors'] = vertex_vec.get_vertex_spacing_errors(params['Ds'], point_counts)
+    spacing_report = SpacingReport()
+    spacing_report.add(vertex_vec.coords, params['SpacingErrors'], point_counts)
+    spacing_report.log()
+    return spacing_report
+
+
+def make_vertex_chunks(path_list, params):
+    """Mesh each path independently and yield its vertices as soon as they are ready.
+
+    Unlike make_vertices, the vertices of all paths are never held in memory
+    at the same time, so they can be written with geo_obj.write_vertex_chunks
+    while the remaining paths are meshed. The number of vertices of each path
+    is appended to params['PathPointCounts'] as its chunk is yielded.
+
+    The paths are taken from path_list in batches of STREAM_BATCH_SIZE paths
+    per process, so path_list may also be an iterator such as the one of
+    SvgStream.get_paths.
+
+    Instances of the same geometry are fitted only once, see PathInstances.
+
+    Args:
+        path_list: python list or iterator of path SvgObjects.
+        params: dictionary containing all parameters.
+
+    Yields:
+        VertexArray with the vertices of each path with segments, in the order
+        of path_list.
+    """
+    logger.info("Begin making vertices.")
+
+    params.pop('MeshRecord', None)
+    params['PathPointCounts'] = []
+    ds = params['Ds']
+    A = transform_matrix(params) # Create point transform to target space
+
+    batch_size = STREAM_BATCH_SIZE * max(1, points_estimation.USER_CONFIG["num_parallel_processes"])
+    path_iter = iter(path_list)
+    path_instances = PathInstances(A)
+
+    spacing_report = SpacingReport()
+    while True:
+        path_batch = list(itertools.islice(path_iter, batch_size))
+        if len(path_batch) == 0:
+            break
+        prototype_per_path = [ path_instances.match(path) for path in path_batch ]
+        fitted_prototypes = [ prototype for prototype, motion in prototype_per_path if motion is None and prototype["num_segments"] > 0 ]
+        path_evaluators = [ prototype["segments"].to_path_evaluator() for prototype in fitted_prototypes ]
+        point_params_iter = iter_points_on_paths(path_evaluators, params)
+        path_evaluators_iter = iter(path_evaluators)
+
+        for path, (prototype, motion) in zip(path_batch, prototype_per_path):
+            if prototype["num_segments"] == 0:
+                params['PathPointCounts'].append(0)
+                continue
+            if motion is None:
+                # The prototypes of the instances later in the batch come first, so they are fitted by now.
+                prototype["point_coords"] = points_estimation.get_point_coords(next(path_evaluators_iter), next(point_params_iter))
+                prototype["segments"] = None
+            path_vertex_vec = VertexArray.from_complex( PathInstances.get_point_coords(prototype, motion) )
+            spacing_report.add(path_vertex_vec.coords, path_vertex_vec.get_vertex_spacing_errors(ds), [len(path_vertex_vec)])
+            params['PathPointCounts'].append(len(path_vertex_vec))
+            yield path_vertex_vec
+
+    if path_instances.num_reused > 0:
+        logger.info(f"Reused the vertices of {path_instances.num_reused} instance(s) of other paths.")
+    spacing_report.log()
+
+
+def write_streamed_mesh(filename, path_list, params):
+    """Mesh each path independently and write its vertices (and springs and
+    beams, see make_springs_and_beams) as soon as they are ready, together
+    with their spacing errors (see geo_obj.SpacingErrorWriter).
+
+    Args:
+        filename: name of the files without the extension.
+        path_list: python list or iterator of path SvgObjects.
+        params: dictionary containing all parameters.
+
+    Returns:
+        The number of vertices written.
+    """
+    geo_types = ["vertex"]
+    if MESH_CONFIG["springs"]:
+        geo_types.append("spring")
+    if MESH_CONFIG["beams"]:
+        geo_types.append("beam")
+    with contextlib.ExitStack() as stack:
+        writers = { geo_type : stack.enter_context(GeoFileWriter(filename, geo_type)) for geo_type in geo_types }
+        spacing_error_writer = stack.enter_context(SpacingErrorWriter(filename))
+        for path_vertex_vec in make_vertex_chunks(path_list, params):
+            index_offset = writers["vertex"].num_written
+            writers["vertex"].write(x=path_vertex_vec.coords[:, 0], y=path_vertex_vec.coords[:, 1])
+            spacing_error_writer.write(path_vertex_vec.get_vertex_spacing_errors(params['Ds']))
+            path_params = { 'PathPointCounts' : [len(path_vertex_vec)] }
+            make_springs_and_beams(path_vertex_vec, path_params, index_offset)
+            if "spring" in writers:
+                writers["spring"].write(**path_params['Springs'])
+            if "beam" in writers:
+                writers["beam"].write(**path_params['Beams'])
+        return writers["vertex"].num_written
+
+
+def make_springs_and_beams(vertex_vec, params, index_offset=0):
+    """Connect consecutive vertices of each path with springs and beams.
+
+    Springs are made if MESH_CONFIG["springs"] is set and beams if
+    MESH_CONFIG["beams"] is set, see geo_obj.connect_vertices. Their columns
+    (for geo_obj.write_geo_arrays) are stored in params['Springs'] and
+    params['Beams'].
+
+    Args:
+        vertex_vec: VertexArray of the vertices of the paths.
+        params: dictionary containing all parameters, including the number
+            of vertices of each path in params['PathPointCounts'].
+        index_offset: id of the first vertex of vertex_vec in the .vertex
+            file, relative to MESH_CONFIG["index_base"].
+    """
+    params.pop('Springs', None)
+    params.pop('Beams', None)
+    if not (MESH_CONFIG["springs"] or MESH_CONFIG["beams"]):
+        return
+    index_base = MESH_CONFIG["index_base"] + index_offset
+    spring_ids, beam_ids = connect_vertices(vertex_vec, params.get('PathPointCounts'))
+    if MESH_CONFIG["springs"]:
+        params['Springs'] = get_spring_columns(vertex_vec, spring_ids, MESH_CONFIG["spring_stiffness"],
+                                               MESH_CONFIG["spring_beta"], index_base)
+    if MESH_CONFIG["beams"]:
+        params['Beams'] = get_beam_columns(vertex_vec, beam_ids, MESH_CONFIG["beam_stiffness"], index_base)
 
 
 def chk_vertex_dist(a, b):
@@ -302,12 +1320,23 @@ class Svg():
         """
         Quick function that generates a list of all path and other geometric
         objects in the SVG.
+
+        The aggregate transform matrix of every object is composed top-down
+        from the one of its parent, so each transform is parsed and multiplied
+        only once.
+
+        The element referenced by a <use> element is added as its child, once
+        per <use> element, and the objects of this instance record the id of
+        the referenced element in their instance_of attribute. The contents of
+        <defs> and <symbol> elements are only added where they are referenced.
         """
         objects = []
         element_tree_stack = []
+        ids = { element.get("id") : element for element in rnode.iter() if "id" in element.attrib }
 
-        def push_element_and_its_parent_to_stack(element, parent):
-            element_tree_stack.append( { "element" : element, "parent" : parent } )
+        def push_element_and_its_parent_to_stack(element, parent, instance_of=None, references=(), is_referenced=False):
+            element_tree_stack.append( { "element" : element, "parent" : parent, "instance_of" : instance_of,
+                                         "references" : references, "is_referenced" : is_referenced } )
 
         push_element_and_its_parent_to_stack(rnode, None)
 
@@ -318,10 +1347,28 @@ class Svg():
 
             curElementAsSvgObject = SvgObject(curElement)
             curElementAsSvgObject.parent = parentOfCurElement
+            curElementAsSvgObject.instance_of = curElementAndParent["instance_of"]
+            if curElementAsSvgObject.type == 'use':
+                curElementAsSvgObject.attr = { key : value for key, value in curElement.attrib.items() if key != "transform" }
+                if get_use_transform_str(curElement) is not None:
+                    curElementAsSvgObject.attr["transform"] = get_use_transform_str(curElement)
+            curElementAsSvgObject.update_aggregate_transform_matrix(
+                parentOfCurElement.aggregate_transform_matrix if parentOfCurElement is not None else None )
             objects.append(curElementAsSvgObject)
 
+            if curElementAsSvgObject.type == 'use':
+                reference = get_use_reference(curElement)
+                references = curElementAndParent["references"]
+                if reference not in ids or reference in references:
+                    logger.warning(f"Ignoring the <use> element with the missing or circular reference {reference}.")
+                    continue
+                push_element_and_its_parent_to_stack(ids[reference], curElementAsSvgObject, reference, references + (reference,), True)
+                continue
+            if curElementAsSvgObject.type in DEFINITION_TAGS and not curElementAndParent["is_referenced"]:
+                continue # Only rendered where referenced by a <use> element.
             for child_element in list(curElement)[::-1]: # Push the first child to the stack last.
-                push_element_and_its_parent_to_stack(child_element, curElementAsSvgObject)
+                push_element_and_its_parent_to_stack(child_element, curElementAsSvgObject,
+                                                     curElementAndParent["instance_of"], curElementAndParent["references"])
 
         return objects
 
@@ -333,6 +1380,137 @@ class Svg():
         return paths
 
 
+class SvgStream(Svg):
+    """
+    Class represents an SVG file which is parsed incrementally with iterparse,
+    for documents too large to hold as an ElementTree.
+
+    Only the ancestors of the element being parsed are kept, together with
+    their aggregate transform matrices. Paths are yielded by get_paths as
+    they are encountered and every element is discarded once it has been
+    processed, so the memory used is proportional to the depth of the
+    document rather than its size.
+    """
+
+    def __init__(self, fname):
+        """ Initializer takes file name (fname) and reads the file up to the
+        root element, to find the space of the SVG.
+        """
+        self.events = ET.iterparse(fname, events=("start", "end"))
+        event, root = next(self.events)
+        self.root = root
+        self.rattrib = dict(root.attrib)
+        self.space = self.find_space()
+        self.root_transform_matrix = compose_transform(None, root.get("transform"))
+
+    def get_paths(self):
+        """
+        Generator yielding the path SvgObjects of the file in document order,
+        including the instances of paths referenced by <use> elements.
+        Each has no parent, but its aggregate transform matrix is already set.
+        Can only be iterated once.
+
+        The contents of <defs> and <symbol> elements are kept (detached from
+        the document) for later <use> elements, but not yielded themselves.
+        """
+        element_stack = [self.root]
+        transform_matrix_stack = [self.root_transform_matrix]
+        definitions = {} # Elements with an id inside <defs> and <symbol> elements.
+        definition_depth = 0
+        for event, element in self.events:
+            tag = element.tag.rsplit('}', 1)[-1]
+            if event == "start":
+                transform_str = get_use_transform_str(element) if tag == 'use' else element.get("transform")
+                transform_matrix = compose_transform(transform_matrix_stack[-1], transform_str)
+                element_stack.append(element)
+                transform_matrix_stack.append(transform_matrix)
+                if tag in DEFINITION_TAGS:
+                    definition_depth += 1
+                continue
+
+            element_stack.pop()
+            transform_matrix = transform_matrix_stack.pop()
+            if len(element_stack) == 0:
+                break # End of the root element.
+            if tag in DEFINITION_TAGS:
+                definition_depth -= 1
+            if definition_depth > 0 or tag in DEFINITION_TAGS:
+                if "id" in element.attrib:
+                    definitions[element.get("id")] = element
+                if definition_depth == 0:
+                    element_stack[-1].remove(element) # Keep its contents, but not in the document.
+                continue
+            if tag == 'path':
+                path = SvgObject(element)
+                path.attr = dict(element.attrib)
+                path.aggregate_transform_matrix = transform_matrix
+                yield path
+            elif tag == 'use':
+                for path_element, path_transform_matrix, instance_of in iter_instance_paths(element, transform_matrix, definitions):
+                    path = SvgObject(path_element)
+                    path.attr = dict(path_element.attrib)
+                    path.aggregate_transform_matrix = path_transform_matrix
+                    path.instance_of = instance_of
+                    yield path
+            # The earlier siblings were removed already, so this is a cheap removal of the first child.
+            element.clear()
+            element_stack[-1].remove(element)
+
+
+def get_use_reference(element):
+    """
+    Returns the id of the element referenced by the href of a <use> element, or None.
+    """
+    href = element.get("href", element.get(XLINK_HREF))
+    if href is None or not href.startswith("#"):
+        return None
+    return href[1:]
+
+def get_use_transform_str(element):
+    """
+    Returns the transform of a <use> element, which is its transform attribute
+    followed by a translation by its x and y attributes, or None.
+    """
+    transform_str = element.get("transform", "")
+    x = float(element.get("x", 0))
+    y = float(element.get("y", 0))
+    if x != 0 or y != 0:
+        transform_str += f" translate({x!r}, {y!r})"
+    return transform_str.strip() or None
+
+def iter_instance_paths(use_element, use_transform_matrix, ids, references=()):
+    """Find the paths instantiated by a <use> element, following nested <use> elements.
+
+    Args:
+        use_element: the <use> element.
+        use_transform_matrix: aggregate transform matrix of the <use> element.
+        ids: dictionary with the elements which can be referenced, by id.
+        references: ids referenced by the enclosing <use> elements, to detect cycles.
+
+    Yields:
+        the path element, its aggregate transform matrix and the id of the
+        element referenced by the innermost <use> element.
+    """
+    reference = get_use_reference(use_element)
+    if reference not in ids or reference in references:
+        logger.warning(f"Ignoring the <use> element with the missing or circular reference {reference}.")
+        return
+    referenced_element = ids[reference]
+    references = references + (reference,)
+    element_stack = [ (referenced_element, use_transform_matrix) ]
+    while len(element_stack) > 0:
+        element, parent_transform_matrix = element_stack.pop()
+        tag = element.tag.rsplit('}', 1)[-1]
+        transform_str = get_use_transform_str(element) if tag == 'use' else element.get("transform")
+        transform_matrix = compose_transform(parent_transform_matrix, transform_str)
+        if tag == 'path':
+            yield element, transform_matrix, reference
+        elif tag == 'use':
+            yield from iter_instance_paths(element, transform_matrix, ids, references)
+        elif tag not in DEFINITION_TAGS or element is referenced_element:
+            element_stack.extend( (child_element, transform_matrix) for child_element in list(element)[::-1] )
+
+
 
 class SvgObject():
     """
@@ -352,6 +1530,12 @@ class SvgObject():
             self.type = node.tag    # str holds name of object
         self.attr = node.attrib  # dic with attributes of element
         self.parent = None
+        # Memoized by update_aggregate_transform_matrix together with the parent matrix
+        # and the transform it was composed from, or set by SvgStream.
+        self.aggregate_transform_matrix = None
+        self.composed_from = None
+        # Id of the element referenced by the <use> element this object is an instance of.
+        self.instance_of = None
 
     def __str__(self):
         return f"{self.type} | {self.attr}"
@@ -371,14 +1555,39 @@ class SvgObject():
         """
         Returns a matrix representing the aggregation of all transformations applied to this SvgObject.
         """
-        transform_matrix = np.identity(3)
-        cur_SvgObject = self
-        while cur_SvgObject is not None:
-            svg_transform_string = cur_SvgObject.get("transform") if "transform" in cur_SvgObject.attr else ""
-            cur_transform_matrix = parse_transform(svg_transform_string)
-            transform_matrix = np.dot(cur_transform_matrix, transform_matrix)
-            cur_SvgObject = cur_SvgObject.parent
-        return transform_matrix
+        return self.update_aggregate_transform_matrix().copy()
+
+    def update_aggregate_transform_matrix(self, parent_transform_matrix=None):
+        """
+        Returns the memoized, read-only aggregate transform matrix, composing it again
+        if the transform of this SvgObject or the matrix of its parent has changed.
+
+        find_objects composes the matrices top-down and passes the matrix of the parent
+        as parent_transform_matrix. Otherwise the matrices of all ancestors are brought
+        up to date from the root down, without recursion.
+        """
+        if parent_transform_matrix is None and self.parent is not None:
+            ancestors = []
+            ancestor = self.parent
+            while ancestor is not None:
+                ancestors.append(ancestor)
+                ancestor = ancestor.parent
+            for ancestor in reversed(ancestors):
+                parent_transform_matrix = ancestor._compose_aggregate_transform_matrix(parent_transform_matrix)
+        return self._compose_aggregate_transform_matrix(parent_transform_matrix)
+
+    def _compose_aggregate_transform_matrix(self, parent_transform_matrix):
+        """
+        Composes the aggregate transform matrix from the matrix of the parent (None for
+        the root), unless it was composed from the same parent matrix and transform.
+        """
+        if self.composed_from is None and self.aggregate_transform_matrix is not None:
+            return self.aggregate_transform_matrix # Set by SvgStream, which discards the ancestors.
+        transform_str = self.attr.get("transform")
+        if self.composed_from is None or self.composed_from[0] is not parent_transform_matrix or self.composed_from[1] != transform_str:
+            self.aggregate_transform_matrix = compose_transform(parent_transform_matrix, transform_str)
+            self.composed_from = (parent_transform_matrix, transform_str)
+        return self.aggregate_transform_matrix
 
 
 
@@ -485,36 +1694,29 @@ def parse_transform(transform_str):
 
     return total_transform
 
-# This function was taken (mostly) as is from the svgpathtools library.
-# Minor adjustments were made so that the function can access the
-# svgpathtools.path module.
-# https://github.com/mathandy/svgpathtools
-# commit: 40a515ee63c1f2832628a84279e198fedd858c7e
-def transform(curve, tf):
-    """Transforms the curve by the homogeneous transformation matrix tf"""
-    def to_point(p):
-        return np.array([[p.real], [p.imag], [1.0]])
-
-    def to_vector(z):
-        return np.array([[z.real], [z.imag], [0.0]])
-
-    def to_complex(v):
-        return v.item(0) + 1j * v.item(1)
-
-    if isinstance(curve, svgpathtools.path.Path):
-        return svgpathtools.path.Path(*[transform(segment, tf) for segment in curve])
-    elif svgpathtools.path.is_bezier_segment(curve):
-        return svgpathtools.path.bpoints2bezier([to_complex(tf.dot(to_point(p)))
-                               for p in curve.bpoints()])
-    elif isinstance(curve, svgpathtools.path.Arc):
-        new_start = to_complex(tf.dot(to_point(curve.start)))
-        new_end = to_complex(tf.dot(to_point(curve.end)))
-        new_radius = to_complex(tf.dot(to_vector(curve.radius)))
-        return svgpathtools.path.Arc(new_start, radius=new_radius, rotation=curve.rotation,
-                   large_arc=curve.large_arc, sweep=curve.sweep, end=new_end)
-    else:
-        raise TypeError("Input `curve` should be a Path, Line, "
-                        "QuadraticBezier, CubicBezier, or Arc object.")
+@functools.lru_cache(maxsize=4096)
+def parse_transform_cached(transform_str):
+    """
+    Like parse_transform, but returns the same read-only matrix for repeated
+    transform strings, which are common in documents exported by drawing tools.
+    """
+    transform_matrix = parse_transform(transform_str)
+    transform_matrix.flags.writeable = False
+    return transform_matrix
+
+def compose_transform(parent_transform_matrix, transform_str):
+    """
+    Returns the aggregate transform matrix of an element with the given transform
+    attribute (or None) whose parent has parent_transform_matrix (None for the root).
+    The matrix is read-only and shared with the parent if the element has no transform.
+    """
+    if parent_transform_matrix is None:
+        return parse_transform_cached(transform_str)
+    if not transform_str:
+        return parent_transform_matrix
+    transform_matrix = parent_transform_matrix.dot(parse_transform_cached(transform_str))
+    transform_matrix.flags.writeable = False
+    return transform_matrix
 
 
 def test():
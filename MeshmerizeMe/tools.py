@@ -10,8 +10,10 @@ from scipy.spatial import KDTree
 import numpy as np
 import cv2
 import scipy.ndimage as nd
-import matplotlib.pyplot as plt
 from . import meshmerizeme_logger as logger
+from .mpl_backend import get_pyplot
+
+plt = get_pyplot()
 
 eps = np.finfo(float).eps
 
@@ -0,0 +1,285 @@
+"""Python module with a long-lived pool of worker processes.
+
+The pool is created once per MeshmerizeMe run and shared by all files that are
+processed. Data that every task needs (e.g. the geometry of the path that is
+being fitted) is sent to each worker once with WorkerPool.set_shared, after
+which only small task arguments travel over the pipes.
+"""
+
+import os
+import sys
+import atexit
+import traceback
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from multiprocess import Process, Pipe
+from multiprocess.connection import wait
+
+# State sent to this process with WorkerPool.set_shared. Only used inside workers.
+_SHARED = {}
+
+# SharedArrays this worker has attached to, by name. Only used inside workers.
+_ATTACHED_ARRAYS = {}
+
+# The pool shared by the whole run, see get_worker_pool.
+_worker_pool = None
+
+# Whether this process reports to the resource tracker of the owner of the shared memory.
+# Workers forked after the owner started its tracker inherit it, see _worker_loop.
+_SHARES_OWNER_RESOURCE_TRACKER = True
+
+
+def get_shared(name):
+    """
+    Returns the value which was sent to the current worker under the given name.
+    """
+    return _SHARED[name]
+
+def _set_shared(name, value):
+    _SHARED[name] = value
+
+def _del_shared(name):
+    _SHARED.pop(name, None)
+
+class SharedArray():
+    """
+    One-dimensional float64 array in shared memory. The process which creates it owns
+    the memory and frees it on close; workers attach to it by name with get_shared_array
+    and write their results into it directly, without sending them through the pipes.
+    """
+    def __init__(self, length=None, name=None):
+        """
+        Args:
+            length: Number of elements of the array.
+            name: Name of an existing SharedArray to attach to. If None, new memory is created.
+        """
+        self.length = length
+        self.is_owner = name is None
+        if self.is_owner:
+            self.shared_memory = shared_memory.SharedMemory(create=True, size=max(8 * length, 1))
+        else:
+            self.shared_memory = _attach_shared_memory(name)
+        self.name = self.shared_memory.name
+        self.array = np.ndarray((length,), dtype=np.float64, buffer=self.shared_memory.buf)
+
+    def close(self):
+        self.array = None
+        try:
+            self.shared_memory.close()
+        except BufferError:
+            pass # A view of the array is still in use; the memory is freed once it is released.
+        if self.is_owner:
+            self.shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _attach_shared_memory(name):
+    """
+    Attaches to the shared memory with the given name without tracking it. Only the owner
+    may unlink the memory, so the resource tracker of a worker must not unlink it when
+    the worker exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    attached_memory = shared_memory.SharedMemory(name=name)
+    # A tracker shared with the owner already holds the owner's registration, which the
+    # owner removes again when it unlinks the memory.
+    if not _SHARES_OWNER_RESOURCE_TRACKER:
+        resource_tracker.unregister(attached_memory._name, "shared_memory")
+    return attached_memory
+
+def get_shared_array(name, length):
+    """
+    Returns the array of the SharedArray with the given name, attaching to it on first use.
+    """
+    if name not in _ATTACHED_ARRAYS:
+        _ATTACHED_ARRAYS[name] = SharedArray(length, name=name)
+    return _ATTACHED_ARRAYS[name].array
+
+def _release_shared_array(name):
+    attached_array = _ATTACHED_ARRAYS.pop(name, None)
+    if attached_array is not None:
+        attached_array.close()
+
+def _run_chunk(func, chunk):
+    return [ func(*task) for task in chunk ]
+
+def _worker_loop(connection):
+    """
+    Runs (func, args) messages received from the pool until the pool shuts down.
+    """
+    global _SHARES_OWNER_RESOURCE_TRACKER
+    _SHARES_OWNER_RESOURCE_TRACKER = resource_tracker._resource_tracker._fd is not None
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        func, args = message
+        try:
+            connection.send( (True, func(*args)) )
+        except Exception as e:
+            connection.send( (False, (e, traceback.format_exc())) )
+
+
+class WorkerPool():
+    """
+    Pool of worker processes, each connected to the parent through its own pipe.
+    """
+    def __init__(self, num_processes):
+        """
+        Args:
+            num_processes: Number of worker processes to start.
+        """
+        self.num_processes = num_processes
+        self.pid = os.getpid()
+        self.connections = []
+        self.processes = []
+        for i in range(num_processes):
+            parent_connection, child_connection = Pipe()
+            p = Process(target=_worker_loop, args=(child_connection,), daemon=True)
+            p.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(p)
+
+    def is_alive(self):
+        return self.pid == os.getpid() and all(p.is_alive() for p in self.processes)
+
+    def _receive(self, connection):
+        success, result = connection.recv()
+        if not success:
+            exception, formatted_traceback = result
+            raise RuntimeError(f"A worker process failed with:\n{formatted_traceback}") from exception
+        return result
+
+    def broadcast(self, func, *args):
+        """
+        Calls func(*args) once in every worker process and returns the results.
+        """
+        for connection in self.connections:
+            connection.send( (func, args) )
+        return [ self._receive(connection) for connection in self.connections ]
+
+    def set_shared(self, name, value):
+        """
+        Sends value to every worker once. Tasks can then read it with get_shared(name).
+        """
+        self.broadcast(_set_shared, name, value)
+
+    def del_shared(self, name):
+        self.broadcast(_del_shared, name)
+
+    def release_shared_array(self, name):
+        """
+        Detaches every worker from the SharedArray with the given name.
+        """
+        self.broadcast(_release_shared_array, name)
+
+    def imap_unordered(self, func, tasks, chunksize=1):
+        """
+        Calls func(*task) for every task in tasks and yields (task_index, result)
+        pairs in the order in which the workers finish them.
+
+        The tasks are handed out from a single queue in the parent, chunksize at a time,
+        to whichever worker is idle, so every task is run exactly once.
+        """
+        tasks = list(tasks)
+        chunk_starts = iter(range(0, len(tasks), max(1, chunksize)))
+        busy_connections = {}
+
+        def send_next_chunk(connection):
+            for chunk_start in chunk_starts:
+                chunk = [ tuple(task) for task in tasks[chunk_start:chunk_start + chunksize] ]
+                connection.send( (_run_chunk, (func, chunk)) )
+                busy_connections[connection] = chunk_start
+                return
+
+        try:
+            for connection in self.connections:
+                send_next_chunk(connection)
+            while len(busy_connections) > 0:
+                for connection in wait(list(busy_connections)):
+                    chunk_start = busy_connections.pop(connection)
+                    chunk_results = self._receive(connection)
+                    send_next_chunk(connection)
+                    for i, result in enumerate(chunk_results):
+                        yield chunk_start + i, result
+        finally:
+            # Drain the chunks still in flight if the caller stopped early or a task failed,
+            # so that their results cannot be mistaken for those of the next call.
+            for connection in busy_connections:
+                connection.recv()
+
+    def imap(self, func, tasks, chunksize=1):
+        """
+        Like imap_unordered, but yields only the results, in the order of tasks.
+        Results which finish early are held back until all earlier results were yielded.
+        """
+        finished_results = {}
+        next_task_index = 0
+        for task_index, result in self.imap_unordered(func, tasks, chunksize):
+            finished_results[task_index] = result
+            while next_task_index in finished_results:
+                yield finished_results.pop(next_task_index)
+                next_task_index += 1
+
+    def map(self, func, tasks, chunksize=1, callback=None):
+        """
+        Like imap_unordered, but returns the results in the order of tasks.
+
+        Args:
+            callback: Optional function called with the task index whenever a task finishes.
+        """
+        tasks = list(tasks)
+        results = [None] * len(tasks)
+        for task_index, result in self.imap_unordered(func, tasks, chunksize):
+            results[task_index] = result
+            if callback is not None:
+                callback(task_index)
+        return results
+
+    def shutdown(self):
+        if self.pid != os.getpid():
+            return # Only the process which started the workers may stop them.
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for p in self.processes:
+            p.join(timeout=1)
+            if p.is_alive():
+                p.terminate()
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+        self.processes = []
+
+
+def get_worker_pool(num_processes):
+    """
+    Returns the pool shared by the current run, (re)starting it if it does not
+    exist yet or has a different number of processes.
+    """
+    global _worker_pool
+    if _worker_pool is not None and _worker_pool.pid != os.getpid():
+        _worker_pool = None # Inherited from the parent process through fork.
+    if _worker_pool is None or _worker_pool.num_processes != num_processes or not _worker_pool.is_alive():
+        shutdown_worker_pool()
+        _worker_pool = WorkerPool(num_processes)
+    return _worker_pool
+
+def shutdown_worker_pool():
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.shutdown()
+        _worker_pool = None
+
+atexit.register(shutdown_worker_pool)
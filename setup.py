@@ -29,6 +29,7 @@ setup(
     },
 
     # dependencies
+    python_requires=">=3.8", # multiprocessing.shared_memory is used by worker_pool.SharedArray
     install_requires=[
         "matplotlib >= 3.1.1",
         "multiprocess >= 0.70.8",
@@ -58,7 +59,13 @@ setup(
                  'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
                  'Operating System :: OS Independent',
                  'Operating System :: POSIX :: Linux',
-                 'Programming Language :: Python :: 3.7',
+                 'Programming Language :: Python :: 3',
+                 'Programming Language :: Python :: 3 :: Only',
+                 'Programming Language :: Python :: 3.8',
+                 'Programming Language :: Python :: 3.9',
+                 'Programming Language :: Python :: 3.10',
+                 'Programming Language :: Python :: 3.11',
+                 'Programming Language :: Python :: 3.12',
                  'Topic :: Multimedia :: Graphics',
                  'Topic :: Multimedia :: Graphics :: 2D Modeling',
                  'Topic :: Multimedia :: Graphics :: Capture :: Digital Camera',
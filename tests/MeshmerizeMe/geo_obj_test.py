@@ -0,0 +1,120 @@
+import pytest
+import numpy as np
+from MeshmerizeMe import geo_obj
+
+
+def test_VertexArray():
+    vertices = geo_obj.VertexArray.from_complex([0, 3 + 4j, 6 + 8j])
+    assert len(vertices) == 3
+    assert vertices[1].getPos() == (3.0, 4.0), "Indexing should return a Vertex view of the row."
+    assert vertices[-1].getPos() == (6.0, 8.0)
+    assert [ vertex.getPos() for vertex in vertices[1:] ] == [(3.0, 4.0), (6.0, 8.0)], "Slices should be VertexArrays."
+
+    vertices[0].x = -5
+    assert vertices.coords[0, 0] == -5, "Changing a Vertex view should change the array."
+
+    vertex_list = [ geo_obj.Vertex(0.1, 0.2), geo_obj.Vertex(1/3, 2.5) ]
+    assert geo_obj.VertexArray.from_vertices(vertex_list).printString() == "0.10000000000000001 0.20000000000000001\n0.33333333333333331 2.5\n", \
+        "Should print each vertex on one line with 17 significant digits."
+
+def test_VertexArray_get_spacing_errors():
+    vertices = geo_obj.VertexArray([ [0, 0], [1, 0], [3, 0], [10, 0], [10, 1] ])
+    assert np.allclose(vertices.get_spacing_errors(1), [0, 1, 6, 0]), "Should return |distance - ds|/ds between consecutive vertices."
+    assert np.allclose(vertices.get_spacing_errors(1, point_counts=[3, 0, 2]), [0, 1, 0]), "Should leave out distances between paths."
+    assert np.allclose(vertices.get_vertex_spacing_errors(1, point_counts=[3, 0, 2]), [np.nan, 0, 1, np.nan, 0], equal_nan=True), \
+        "Should return the error of the distance to the previous vertex of the same path."
+
+def test_SpacingErrorWriter(tmp_path):
+    with geo_obj.SpacingErrorWriter(str(tmp_path / "test")) as writer:
+        writer.write([np.nan, 0.5])
+        writer.write(np.arange(1000) / 1000)
+    spacing_errors = np.load(tmp_path / "test.spacing.npy")
+    assert spacing_errors.dtype == np.float32 and spacing_errors.shape == (1002,), "Should fill in the shape on close."
+    assert np.allclose(spacing_errors, np.concatenate(([np.nan, 0.5], np.arange(1000) / 1000)), equal_nan=True)
+
+def test_writeFile(tmp_path):
+    vertex_list = [ geo_obj.Vertex(0.1, 0.2), geo_obj.Vertex(1/3, 2.5) ]
+    geo_obj.writeFile(str(tmp_path / "list"), vertex_list)
+    geo_obj.writeFile(str(tmp_path / "array"), geo_obj.VertexArray.from_vertices(vertex_list))
+    assert np.array_equal(np.loadtxt(tmp_path / "array.vertex", skiprows=1), np.loadtxt(tmp_path / "list.vertex", skiprows=1)), \
+        "A VertexArray should be read back like a list of Vertex."
+    assert (tmp_path / "array.vertex").read_text().split("\n")[0] == "2"
+
+def test_write_geo_arrays(tmp_path):
+    geo_lists = {
+        "vertex" : [ geo_obj.Vertex(0.1, 1/3), geo_obj.Vertex(1e-05, 1e16) ],
+        "spring" : [ geo_obj.Spring(1, 2, 1e-4, 0.5, 4.0), geo_obj.Spring(2, 3, 1e-4, 1/3, 4.0) ],
+        "beam"   : [ geo_obj.Beam(1, 2, 3, 2.5, -0.1) ],
+        "porous" : [ geo_obj.PorousPt(1, 1e-3, -2), geo_obj.PorousPt(2, 1e-3, -1) ],
+        "mass"   : [ geo_obj.Mass(5, 1e5, 0.25) ]
+    }
+    for geo_type, geo_list in geo_lists.items():
+        geo_obj.writeFile(str(tmp_path / "objects"), geo_list)
+        expected = repr(len(geo_list)) + "\n" + "".join( elem.printString() for elem in geo_list )
+        assert (tmp_path / f"objects.{geo_type}").read_text() == expected, "writeFile should write each element's printString."
+
+        columns = { name : np.array([ getattr(elem, name) for elem in geo_list ]) for name, _ in geo_obj.GEO_COLUMNS[geo_type] }
+        geo_obj.write_geo_arrays(str(tmp_path / "arrays"), geo_type, **columns)
+        lines = (tmp_path / f"arrays.{geo_type}").read_text().split("\n")
+        assert lines[0] == repr(len(geo_list)) and lines[-1] == "", "Should write the number of elements on the first line."
+        rows = [ line.split(" ") for line in lines[1:-1] ]
+        for (name, column_type), values in zip(geo_obj.GEO_COLUMNS[geo_type], zip(*rows)):
+            assert [ column_type(value) for value in values ] == columns[name].tolist(), "Arrays should be read back exactly."
+
+    geo_obj.write_geo_arrays(str(tmp_path / "broadcast"), "spring", master=[1, 2], slave=[2, 3], stiff=1e-4, restlen=[0.5, 1/3], beta=4.0)
+    assert (tmp_path / "broadcast.spring").read_text() == "2\n1 2 0.0001 0.5 4\n2 3 0.0001 0.33333333333333331 4\n", \
+        "Scalars should be used for all elements."
+
+def test_format_array_columns():
+    rng = np.random.default_rng(0)
+    floats = np.concatenate(( [0.0, -0.0, 0.1, -1/3, 1e-5, 1e16, 1e23, 5e-324, 1.7976931348623157e308, np.inf, -np.inf],
+                              rng.uniform(-1, 1, 1000), np.frombuffer(rng.bytes(8000), dtype=np.float64) ))
+    floats = floats[~np.isnan(floats)]
+    ints = np.resize([0, -1, 10**17, 2**63 - 1, -2**63], len(floats))
+    rows = [ line.split(" ") for line in geo_obj._format_array_columns([ floats, ints ]).split("\n")[:-1] ]
+    assert [ float(x) for x, _ in rows ] == floats.tolist(), "Floats should be read back exactly."
+    assert [ int(i) for _, i in rows ] == ints.tolist(), "Integers should be written exactly."
+
+def test_write_vertex_chunks(tmp_path):
+    chunks = [ geo_obj.VertexArray([[0.5, 1.5], [2.5, 3.5]]), np.array([[4.5, 5.5]]), np.array([6.5 + 7.5j]) ]
+    num_written = geo_obj.write_vertex_chunks(str(tmp_path / "streamed"), iter(chunks))
+    assert num_written == 4
+    lines = (tmp_path / "streamed.vertex").read_text().split("\n")
+    assert int(lines[0]) == 4, "Should fill in the number of vertices on the first line."
+    assert lines[1:] == ["0.5 1.5", "2.5 3.5", "4.5 5.5", "6.5 7.5", ""]
+
+    geo_obj.write_vertex_chunks(str(tmp_path / "counted"), iter(chunks), count=4)
+    assert (tmp_path / "counted.vertex").read_text().split("\n")[0] == "4", "A known count should be written as is."
+    with pytest.raises(ValueError):
+        geo_obj.write_vertex_chunks(str(tmp_path / "miscounted"), iter(chunks), count=5)
+
+def test_connect_vertices():
+    # An open path of 3 vertices followed by a closed square (with its first vertex repeated at the end).
+    vertices = geo_obj.VertexArray([ [0, 0], [1, 0], [2, 0],
+                                     [0, 0], [1, 0], [1, 1], [0, 1], [0, 0] ])
+    spring_ids, beam_ids = geo_obj.connect_vertices(vertices, point_counts=[3, 5])
+    assert spring_ids.tolist() == [ [0, 1], [1, 2], [3, 4], [4, 5], [5, 6], [6, 3] ], "Closed paths should wrap around."
+    assert beam_ids.tolist() == [ [0, 1, 2], [6, 3, 4], [3, 4, 5], [4, 5, 6], [5, 6, 3] ]
+
+    springs = geo_obj.get_spring_columns(vertices, spring_ids, stiff=1e7, beta=1.0)
+    assert springs["master"].tolist() == [1, 2, 4, 5, 6, 7], "Ids should be 1-based for IB2d by default."
+    assert np.allclose(springs["restlen"], 1), "Resting lengths should be the distances between the vertices."
+
+    beams = geo_obj.get_beam_columns(vertices, beam_ids, stiff=1e7, index_base=0)
+    assert beams["mID"].tolist() == beam_ids[:, 1].tolist()
+    assert np.allclose(beams["c"], [0, -1, -1, -1, -1]), "Curvatures should be the cross products of consecutive segments."
+
+def test_write_npz(tmp_path):
+    from MeshmerizeMe import geo_viewer
+    vertices = geo_obj.VertexArray([ [0, 0], [1, 0], [2, 0], [5, 5], [5, 6.5] ])
+    params = {"Ds":1, "Lx":0.5, "string_name":"test", "PathPointCounts":[3, 2], "Space":object(),
+              "Springs":{"master":[1, 2, 4], "slave":[2, 3, 5], "stiff":1e7, "restlen":[1, 1, 1.5], "beta":1.0}}
+    geo_obj.write_npz(str(tmp_path / "test"), vertices, params)
+
+    mesh = geo_viewer.read_npz(str(tmp_path / "test.npz"))
+    assert isinstance(mesh["vertices"], np.memmap), "Arrays should be memory-mapped."
+    assert np.array_equal(mesh["vertices"], vertices.coords)
+    assert mesh["path_offsets"].tolist() == [0, 3, 5]
+    assert np.allclose(mesh["spacing_errors"], [0, 0, np.nan, 0.5], equal_nan=True), "Spacing errors between paths should be NaN."
+    assert mesh["params"] == {"Ds":1, "Lx":0.5, "string_name":"test"}, "Should store the numbers and strings of params."
+    assert mesh["spring_slave"].tolist() == [2, 3, 5] and mesh["spring_stiff"].tolist() == [1e7] * 3
@@ -0,0 +1,20 @@
+import pytest
+import numpy as np
+from MeshmerizeMe import geo_obj, geo_viewer
+
+
+def test_rasterize_points():
+    coords = np.array([ [0.1, 0.1], [0.15, 0.1], [0.9, 0.6], [2, 0] ])
+    counts = geo_viewer.rasterize_points(coords, [0, 1, 0, 1], (2, 4))
+    assert counts.tolist() == [[2, 0, 0, 0], [0, 0, 0, 1]], "Should count the points per pixel and ignore points outside."
+
+def test_read_vertices(tmp_path):
+    vertices = geo_obj.VertexArray([ [0.1, 0.2], [1/3, 2.5], [-1e-9, 7] ])
+    geo_obj.writeFile(str(tmp_path / "test"), vertices)
+    coords = geo_viewer.read_vertices(str(tmp_path / "test.vertex"))
+    assert coords.shape == (3, 2)
+    assert np.array_equal(coords, vertices.coords), "Should read back the written coordinates exactly."
+
+    (tmp_path / "short.vertex").write_text("3\n0.1 0.2\n")
+    with pytest.raises(ValueError):
+        geo_viewer.read_vertices(str(tmp_path / "short.vertex"))
@@ -0,0 +1,109 @@
+import os
+import time
+import numpy as np
+from MeshmerizeMe import svg_parser, mesh_cache
+
+
+SVG_TEST_FILES_DIRECTORY = os.path.join( os.path.dirname(__file__), "test_cases", "svg_test_files" )
+
+def get_box_paths():
+    svg = svg_parser.Svg( os.path.join(SVG_TEST_FILES_DIRECTORY, "box_paths_nested-grouped_translated.svg") )
+    params = {"Ds":5e-1, "Lx":300, "Ly":300, "Nx":1200, "Ny":1200, "Space":svg_parser.Space("0 0 300 300")}
+    return svg.get_paths(), params
+
+def test_get_cache_key(monkeypatch):
+    paths, params = get_box_paths()
+    key = mesh_cache.get_cache_key(paths, params)
+    assert key == mesh_cache.get_cache_key(*get_box_paths()), "Unchanged files should have the same key."
+
+    params["Nx"] = 600
+    assert mesh_cache.get_cache_key(paths, params) != key, "Changing the input2d values should change the key."
+    params["Nx"] = 1200
+
+    paths[0].attr["transform"] = "translate(1 0)"
+    assert mesh_cache.get_cache_key(paths, params) != key, "Changing a transform should change the key."
+    del paths[0].attr["transform"]
+
+    monkeypatch.setitem(mesh_cache.points_estimation.USER_CONFIG, "num_parallel_processes", 3)
+    monkeypatch.setitem(mesh_cache.points_estimation.USER_CONFIG, "path", "ignored")
+    assert mesh_cache.get_cache_key(paths, params) == key, "Settings which do not affect the points should not change the key."
+    monkeypatch.setitem(mesh_cache.points_estimation.USER_CONFIG, "estimator", "arc_length")
+    assert mesh_cache.get_cache_key(paths, params) != key, "Changing the estimator should change the key."
+
+def test_make_vertices(tmp_path, monkeypatch):
+    cache = mesh_cache.MeshCache(str(tmp_path))
+    paths, params = get_box_paths()
+    vertices = mesh_cache.make_vertices(paths, params, cache)
+    assert len(os.listdir(tmp_path)) == 1, "Should store the meshed file in the cache."
+
+    def fail(*args):
+        raise AssertionError("Should not refit an unchanged file.")
+    monkeypatch.setattr(svg_parser, "make_vertices", fail)
+    cached_vertices = mesh_cache.make_vertices(*get_box_paths(), cache)
+    assert [ v.getPos() for v in cached_vertices ] == [ v.getPos() for v in vertices ], "Cached vertices should be identical."
+
+def test_MeshCache_evict(tmp_path):
+    cache = mesh_cache.MeshCache(str(tmp_path), max_size=np.inf)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, vertices=np.zeros((100, 2)))
+        os.utime(cache.get_file_name(key), (time.time() - 10 + i, time.time() - 10 + i))
+    assert cache.get("a") is not None # Marks "a" as the most recently used entry.
+
+    cache.max_size = 2 * os.path.getsize(cache.get_file_name("a"))
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ["a.npz", "c.npz"], "Should evict the least recently used entry."
+
+def test_MeshCache_evict_references(tmp_path):
+    cache = mesh_cache.MeshCache(str(tmp_path), max_size=np.inf)
+    for i, key in enumerate(["a", "b"]):
+        cache.put(key, vertices=np.zeros((100, 2)))
+        os.utime(cache.get_file_name(key), (time.time() - 10 + i, time.time() - 10 + i))
+        cache.set_reference("source_" + key, key)
+    cache.set_reference("source_missing", "missing")
+
+    cache.evict()
+    assert cache.get_reference("source_missing") is None, "Should remove references to missing entries."
+    # Only one entry fits next to the references.
+    cache.max_size = os.path.getsize(cache.get_file_name("b")) + 2 * os.path.getsize(tmp_path / "source_b.ref")
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ["b.npz", "source_b.ref"], "Should remove the references of evicted entries."
+
+    cache.max_size = os.path.getsize(cache.get_file_name("b"))
+    cache.evict()
+    assert os.listdir(tmp_path) == [], "Should count the size of the references."
+
+def test_make_vertices_refits_changed_segments(tmp_path, monkeypatch):
+    monkeypatch.setitem(mesh_cache.points_estimation.USER_CONFIG, "estimator", "arc_length")
+    cache = mesh_cache.MeshCache(str(tmp_path))
+    paths, params = get_box_paths()
+    source = str(tmp_path / "box.svg")
+
+    mesh_records = []
+    make_vertices = svg_parser.make_vertices
+    def make_vertices_and_record(path_list, params, mesh_record=None):
+        mesh_records.append(mesh_record)
+        return make_vertices(path_list, params, mesh_record=mesh_record)
+    monkeypatch.setattr(svg_parser, "make_vertices", make_vertices_and_record)
+    messages = []
+    monkeypatch.setattr(svg_parser.logger, "info", messages.append)
+
+    mesh_cache.make_vertices(paths, params, cache, source)
+    paths[1].attr["d"] = "M350 200 L350 250 L360 260 L350 300"
+    mesh_cache.make_vertices(paths, params, cache, source)
+    assert mesh_records == [None, None], "Should refit the whole file unless incremental refits are enabled."
+
+    monkeypatch.setitem(svg_parser.MESH_CONFIG, "incremental", True)
+    paths[1].attr["d"] = "M350 200 L350 300"
+    vertices = mesh_cache.make_vertices(paths, params, cache, source)
+    paths[1].attr["d"] = "M350 200 L350 250 L360 260 L350 300"
+    edited_vertices = mesh_cache.make_vertices(paths, params, cache, source)
+    assert mesh_records[-1] is not None, "Should refit the edited file starting from its latest meshing."
+    assert "Refit the changed segment(s) 1-3 of the path." in messages, "Should log which segments were refit."
+    assert [ v.getPos() for v in edited_vertices[:400] ] == [ v.getPos() for v in vertices[:400] ], "Unchanged sides should be kept."
+    assert np.nanmax(params["SpacingErrors"]) <= mesh_cache.points_estimation.ERROR_TOL
+
+    full_params = params.copy()
+    full_vertices = make_vertices(paths, full_params)
+    assert len(full_vertices) == len(edited_vertices), "A full refit should fit as many vertices."
+    assert np.nanmax(full_params["SpacingErrors"]) <= mesh_cache.points_estimation.ERROR_TOL, \
+        "A full and an incremental refit should both be within the error tolerance."
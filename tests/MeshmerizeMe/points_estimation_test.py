@@ -4,7 +4,7 @@ import os
 import xml.etree.ElementTree as ET
 import svgpathtools
 import numpy as np
-from MeshmerizeMe import svg_parser, points_estimation
+from MeshmerizeMe import svg_parser, points_estimation, worker_pool
 
 
 SVG_TEST_FILES_DIRECTORY = os.path.join( os.path.dirname(__file__), "test_cases", "svg_test_files" )
@@ -26,11 +26,14 @@ def PARSED_SVG_TEST_STRUCTURE_PATHS(PARSED_SVG_TEST_STRUCTURE):
 @pytest.fixture
 def POINTS_ESTIMATION_USER_CONFIG(PARSED_SVG_TEST_STRUCTURE_PATHS):
     return {
+        "estimator" : "gradient_descent",
+        "optimizer" : "gradient_descent",
         "path" : PARSED_SVG_TEST_STRUCTURE_PATHS[0],
         "ds" : 50,
         "min_T" : 0,
         "max_T" : 1,
         "point_params" : None,
+        "fixed_endpoints" : False,
         "subpath_length" : 25,
         "num_points" : None,
         "learning_rate" : 0.00005,
@@ -105,3 +108,149 @@ def test_GradientDescentEstimator_fit_path(POINTS_ESTIMATION_USER_CONFIG):
     expected_point_params = np.asarray([ 0.0, 0.07142857, 0.14285714, 0.21428571, 0.28571428, 0.35714285, 0.42857143, 0.5, 0.57142857, 0.64285714, 0.71428571, 0.78571428, 0.85714285, 0.92857143, 1.0 ])
     actual_point_params = estimator.fit_subpath()
     assert np.allclose(expected_point_params, actual_point_params), "Should return correctly calculated point params."
+
+def test_PathEvaluator():
+    path = svgpathtools.parse_path("M 250 100 A 200 100 0 0 0 250 200 L 100 100 Q 175 150 100 200 C 175 100 0 150 100 100 Z")
+    path_evaluator = points_estimation.PathEvaluator.from_path(path)
+    point_params = np.concatenate(( np.linspace(0, 1, 101), path_evaluator.segment_boundaries[1:-1] ))
+    expected_points = np.asarray([ path.point(T) for T in point_params ])
+    expected_derivatives = np.asarray([ path.derivative(T) for T in point_params ])
+    assert path_evaluator.num_segments == 5, "Should compile every segment of the path."
+    assert np.allclose(expected_points, path_evaluator.point(point_params)), "Should match svgpathtools' Path.point for every parameter."
+    assert np.allclose(expected_derivatives, path_evaluator.derivative(point_params)), "Should match svgpathtools' Path.derivative for every parameter."
+
+def test_ArcLengthTable():
+    path = svgpathtools.parse_path("M 250 100 A 200 100 0 0 0 250 200 L 100 100 Q 175 150 100 200 C 175 100 0 150 100 100 Z")
+    path_evaluator = points_estimation.PathEvaluator.from_path(path)
+    arc_length_table = path_evaluator.arc_length_table
+    point_params = np.asarray([0.0, 0.1, 0.35, 0.5, 0.9, 1.0])
+    expected_arc_lengths = np.asarray([ path.length(T0=0, T1=T) for T in point_params ])
+    actual_arc_lengths = arc_length_table.arc_length(point_params)
+    assert np.isclose(arc_length_table.total_length, path.length()), "Total length should match svgpathtools' Path.length."
+    assert np.allclose(expected_arc_lengths, actual_arc_lengths), "Arc lengths should match svgpathtools' Path.length."
+    assert np.allclose(point_params, arc_length_table.ilength(actual_arc_lengths)), "ilength should invert arc_length."
+
+def test_ArcLengthEstimator_fit_path(POINTS_ESTIMATION_USER_CONFIG):
+    POINTS_ESTIMATION_USER_CONFIG["estimator"] = "arc_length"
+    estimator = points_estimation.get_estimator(POINTS_ESTIMATION_USER_CONFIG)
+    assert isinstance(estimator, points_estimation.ArcLengthEstimator), "Should select the estimator named in the config."
+    actual_point_params = estimator.fit_path()
+    assert len(actual_point_params) == 15 and actual_point_params[0] == 0 and actual_point_params[-1] == 1, \
+        "Should fit ceil(length/ds) + 1 points from min_T to max_T."
+    assert np.all(np.diff(actual_point_params) > 0), "Points should stay in order."
+    assert np.max(estimator.get_rel_spacing_errors()) < points_estimation.ERROR_TOL, "Corners of the box should be refined to the error tolerance."
+
+    with pytest.raises(ValueError):
+        POINTS_ESTIMATION_USER_CONFIG["estimator"] = "unknown"
+        points_estimation.get_estimator(POINTS_ESTIMATION_USER_CONFIG) # Should fail for unknown estimators
+
+def test_ArcLengthEstimator_fit_path_error_tolerance(POINTS_ESTIMATION_USER_CONFIG, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(points_estimation.logger, "warning", warnings.append)
+    POINTS_ESTIMATION_USER_CONFIG["path"] = svgpathtools.parse_path("M 0 0 L 100 0")
+    POINTS_ESTIMATION_USER_CONFIG["ds"] = 10
+    points_estimation.ArcLengthEstimator(POINTS_ESTIMATION_USER_CONFIG).fit_path()
+    assert warnings == [], "Should not warn if the spacing errors are within the error tolerance."
+
+    POINTS_ESTIMATION_USER_CONFIG["path"] = svgpathtools.parse_path("M 0 0 L 15 0 L 15 15")
+    points_estimation.ArcLengthEstimator(POINTS_ESTIMATION_USER_CONFIG).fit_path()
+    assert len(warnings) == 1 and "20.50763% at point 0; 2 of 3" in warnings[0], \
+        "Should warn with the error achieved by the refinement if three chords cannot be 10 long around the corner."
+
+@pytest.mark.parametrize("file_name", sorted( file_name for file_name in os.listdir(SVG_TEST_FILES_DIRECTORY) if file_name.endswith(".svg") ))
+def test_ArcLengthEstimator_fit_path_svg_test_files(POINTS_ESTIMATION_USER_CONFIG, file_name, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(points_estimation.logger, "warning", warnings.append)
+    paths, params = svg_parser.get_paths( os.path.join(SVG_TEST_FILES_DIRECTORY, file_name) )
+    params.update({"Ds":2, "Lx":1, "Ly":1, "Space":svg_parser.Space("0 0 300 300")})
+    A = svg_parser.transform_matrix(params)
+    POINTS_ESTIMATION_USER_CONFIG["path"] = svg_parser.PathData.concatenate([ svg_parser.transform_path(path, A) for path in paths ]).to_path_evaluator()
+    POINTS_ESTIMATION_USER_CONFIG["ds"] = 1 / 150
+    estimator = points_estimation.ArcLengthEstimator(POINTS_ESTIMATION_USER_CONFIG)
+    estimator.fit_path()
+    assert np.max(estimator.get_rel_spacing_errors()) <= points_estimation.ERROR_TOL, "Spacings should be within the error tolerance of make_vertices."
+    assert warnings == [], "Should not warn if the refinement reaches the error tolerance."
+
+def test_PointsEstimator_is_abstract(POINTS_ESTIMATION_USER_CONFIG):
+    with pytest.raises(TypeError):
+        points_estimation.PointsEstimator(POINTS_ESTIMATION_USER_CONFIG) # Should require subclasses to implement fit_path
+
+def test_GradientDescentEstimator_fit_subpaths(POINTS_ESTIMATION_USER_CONFIG):
+    POINTS_ESTIMATION_USER_CONFIG["subpath_length"] = 5
+    POINTS_ESTIMATION_USER_CONFIG["num_parallel_processes"] = 2
+    estimator = points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG)
+    estimator.subpath_boundary_points = [0, 0.25, 0.5, 0.75, 1]
+    assert list( estimator.allocate_subpath_segments() ) == [4, 4, 3, 3], "Segments should be split in proportion to the subpath lengths, with ties going to the first subpaths."
+
+    with worker_pool.SharedArray(estimator.num_points) as shared_point_params:
+        parallel_num_params = estimator.fit_subpaths(shared_point_params)
+        parallel_point_params = shared_point_params.array.copy()
+    estimator.num_parallel_processes = 1
+    serial_point_params = np.empty(estimator.num_points)
+    serial_num_params = estimator.fit_subpaths(serial_point_params)
+    assert parallel_num_params == [4, 4, 3, 4], "Each subpath should write its params once, leaving out the shared boundary point."
+    assert serial_num_params == parallel_num_params, "Fitting in-process should write the same number of params."
+    assert np.array_equal(serial_point_params, parallel_point_params), "Workers should write their params at the offset of their subpath."
+    assert np.allclose(parallel_point_params[[0, 4, 8, 11, 14]], [0, 0.25, 0.5, 0.75, 1]), "Each subpath should start at its boundary point."
+
+def test_GradientDescentEstimator_fit_path_is_deterministic(POINTS_ESTIMATION_USER_CONFIG):
+    POINTS_ESTIMATION_USER_CONFIG["subpath_length"] = 3
+    POINTS_ESTIMATION_USER_CONFIG["num_parallel_processes"] = 3
+    first_point_params = points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG).fit_path()
+    second_point_params = points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG).fit_path()
+    assert len(first_point_params) == 15, "Should return exactly num_points params."
+    assert np.array_equal(first_point_params, second_point_params), "Repeated fits should return identical params."
+
+def test_get_mse_and_gradient(POINTS_ESTIMATION_USER_CONFIG):
+    estimator = points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG)
+    estimator.point_params = np.sort( np.random.default_rng(0).uniform(0, 1, estimator.num_points) )
+    mse, gradient = points_estimation.get_mse_and_gradient(estimator.path_evaluator, estimator.point_params, estimator.ds)
+    expected_mse = points_estimation.get_mean_squared_relative_error( points_estimation.get_segment_lengths( points_estimation.get_point_coords(estimator.path, estimator.point_params) ), estimator.ds )
+    assert np.isclose(expected_mse, mse), "Should return the MSE of the segment lengths."
+
+    step = 1e-7
+    for i in [0, 5, estimator.num_points - 1]:
+        shifted_point_params = estimator.point_params.copy()
+        shifted_point_params[i] += step
+        shifted_mse, _ = points_estimation.get_mse_and_gradient(estimator.path_evaluator, shifted_point_params, estimator.ds)
+        # The gradient is scaled by 1/(2 * path length) relative to the exact derivative of the MSE.
+        finite_difference = (shifted_mse - mse) / step / (2 * estimator.path_evaluator.total_length)
+        assert np.isclose(finite_difference, gradient[i], rtol=1e-3, atol=1e-9), "Gradient should match a finite difference of the MSE."
+
+@pytest.mark.parametrize("optimizer", ["lbfgs", "newton"])
+def test_GradientDescentEstimator_fit_subpath_with_optimizer(POINTS_ESTIMATION_USER_CONFIG, optimizer):
+    path = svgpathtools.parse_path("M 100 100 L 250 100 Q 175 150 100 200 C 175 100 0 150 100 100")
+    POINTS_ESTIMATION_USER_CONFIG["path"] = path
+    POINTS_ESTIMATION_USER_CONFIG["ds"] = 2
+    POINTS_ESTIMATION_USER_CONFIG["max_iter"] = 20
+    gradient_descent_mse, _ = points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG).get_mse_and_gradient()
+
+    POINTS_ESTIMATION_USER_CONFIG["optimizer"] = optimizer
+    estimator = points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG)
+    point_params = estimator.fit_subpath()
+    residuals, _, _ = points_estimation.get_spacing_residuals_and_jacobian(estimator.path_evaluator, point_params, estimator.ds)
+    assert len(point_params) == estimator.num_points, "Should not merge any points."
+    assert np.all(point_params >= 0) and np.all(point_params <= 1), "Point params should stay within [min_T, max_T]."
+    assert np.mean(np.square(residuals)) < 1e-2 * gradient_descent_mse, "Should converge far below the MSE of the initial estimate."
+    assert np.max(np.abs(residuals)) < points_estimation.ERROR_TOL, "Spacing errors should be within the error tolerance."
+
+@pytest.mark.parametrize("optimizer", ["lbfgs", "newton"])
+def test_GradientDescentEstimator_fit_path_with_jump(POINTS_ESTIMATION_USER_CONFIG, optimizer):
+    path = svgpathtools.parse_path("M 100 100 L 250 100 M 250 200 Q 175 150 100 200 C 175 100 0 150 100 100")
+    POINTS_ESTIMATION_USER_CONFIG["path"] = path
+    POINTS_ESTIMATION_USER_CONFIG["ds"] = 5
+    POINTS_ESTIMATION_USER_CONFIG["num_parallel_processes"] = 1
+    expected_num_points = len( points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG).fit_path() )
+
+    POINTS_ESTIMATION_USER_CONFIG["optimizer"] = optimizer
+    estimator = points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG)
+    point_params = estimator.fit_path()
+    spacings = np.abs(np.diff( estimator.path_evaluator.point(point_params) ))
+    assert np.allclose(estimator.path_evaluator.jump_params, estimator.path_evaluator.segment_boundaries[[1]]), "Should find the jump at the interior moveto."
+    assert len(point_params) == expected_num_points, "Should not merge any points across the jump."
+    assert np.min(spacings) > 0.1 * estimator.ds, "No two consecutive points should collapse."
+
+def test_GradientDescentEstimator_unknown_optimizer(POINTS_ESTIMATION_USER_CONFIG):
+    with pytest.raises(ValueError):
+        POINTS_ESTIMATION_USER_CONFIG["optimizer"] = "unknown"
+        points_estimation.GradientDescentEstimator(POINTS_ESTIMATION_USER_CONFIG) # Should fail for unknown optimizers
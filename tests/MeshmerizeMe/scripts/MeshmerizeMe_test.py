@@ -0,0 +1,72 @@
+import os
+import shutil
+from MeshmerizeMe import points_estimation, mesh_cache
+from MeshmerizeMe.scripts import MeshmerizeMe
+
+
+TEST_CASES_DIRECTORY = os.path.join( os.path.dirname(__file__), "..", "test_cases" )
+
+def test_mesh_files_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setitem(points_estimation.USER_CONFIG, "estimator", "arc_length")
+    monkeypatch.setitem(points_estimation.USER_CONFIG, "num_parallel_processes", 2)
+    monkeypatch.setitem(mesh_cache.CACHE_CONFIG, "cache_dir", str(tmp_path / "cache"))
+
+    fnames = []
+    for case_name in ["case1", "case2", "case_without_input2d"]:
+        case_directory = tmp_path / case_name
+        case_directory.mkdir()
+        shutil.copy(os.path.join(TEST_CASES_DIRECTORY, "svg_test_files", "box_paths.svg"), case_directory / "box.svg")
+        if case_name != "case_without_input2d":
+            shutil.copy(os.path.join(TEST_CASES_DIRECTORY, "input2d_test_files", "simple_test_case"), case_directory / "input2d")
+        fnames.append( str(case_directory / "box.svg") )
+
+    results = MeshmerizeMe.mesh_files_in_parallel(fnames, jobs=2)
+    assert [ result["file"] for result in results ] == fnames, "Should report the results in the order of the files."
+    assert [ result["status"] for result in results ] == ["ok", "ok", "failed"], "A failed file should not stop the others."
+    assert results[0]["vertices"] == results[1]["vertices"] > 0, "Should report the number of vertices."
+    for case_name in ["case1", "case2"]:
+        assert (tmp_path / case_name / "test.vertex").exists(), "Should write the vertex file."
+        assert (tmp_path / case_name / "test.log").exists(), "Should write a log file per file."
+        assert (tmp_path / case_name / "test.spacing.npy").exists(), "Should write the spacing errors of the vertices."
+
+def test_plot_files_in_parallel(tmp_path):
+    import numpy as np
+    from MeshmerizeMe import geo_obj, geo_viewer
+    fnames = []
+    for case_name, num_vertices in [("sparse", 10), ("dense", geo_viewer.RASTER_THRESHOLD + 1)]:
+        case_directory = tmp_path / case_name
+        case_directory.mkdir()
+        shutil.copy(os.path.join(TEST_CASES_DIRECTORY, "input2d_test_files", "simple_test_case"), case_directory / "input2d")
+        t = np.linspace(0, 2 * np.pi, num_vertices)
+        geo_obj.writeFile(str(case_directory / "test"), geo_obj.VertexArray(np.column_stack((0.25 + 0.2 * np.cos(t), 0.25 + 0.2 * np.sin(t)))))
+        fnames.append( str(case_directory / "test.vertex") )
+    fnames.append( str(tmp_path / "missing.vertex") )
+
+    results = MeshmerizeMe.plot_files_in_parallel(fnames, jobs=2)
+    assert [ result["status"] for result in results ] == ["ok", "ok", "failed"], "A failed file should not stop the others."
+    assert results[1]["vertices"] == geo_viewer.RASTER_THRESHOLD + 1
+    for case_name in ["sparse", "dense"]:
+        assert (tmp_path / case_name / "test.png").exists(), "Should save the plot next to the vertex file."
+
+def test_import_modules():
+    import sys
+    import json
+    import subprocess
+    code = "\n".join([
+        "import sys, time, json",
+        "start_time = time.perf_counter()",
+        "import numpy, svgpathtools",
+        "dependencies_time = time.perf_counter() - start_time",
+        "import MeshmerizeMe.scripts.MeshmerizeMe",
+        "total_time = time.perf_counter() - start_time",
+        "print(json.dumps({ 'modules' : sorted(sys.modules), 'dependencies_time' : dependencies_time, 'total_time' : total_time }))",
+    ])
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    for module_name in ["matplotlib", "cv2", "tqdm", "scipy.ndimage", "tkinter", "MeshmerizeMe.tools"]:
+        assert module_name not in result["modules"], f"Meshing should not import {module_name}."
+    # Importing the CLI should take little more than importing the dependencies it always
+    # needs. Both are timed in the same interpreter, so the ratio does not depend on the
+    # speed of the machine; importing matplotlib.pyplot alone would exceed it.
+    assert result["total_time"] < 1.5 * result["dependencies_time"], \
+        f"Importing the CLI took {result['total_time']:.2f} s, importing numpy and svgpathtools {result['dependencies_time']:.2f} s."
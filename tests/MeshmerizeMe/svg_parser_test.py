@@ -4,7 +4,7 @@ import os
 import xml.etree.ElementTree as ET
 import svgpathtools
 import numpy as np
-from MeshmerizeMe import svg_parser, geo_obj
+from MeshmerizeMe import svg_parser, geo_obj, points_estimation
 
 
 SVG_TEST_FILES_DIRECTORY = os.path.join( os.path.dirname(__file__), "test_cases", "svg_test_files" )
@@ -173,6 +173,88 @@ def test_make_vertices(PARSED_SVG_TEST_STRUCTURES):
         for vertex in vertices:
             assert isVertexOnBoxOutline(vertex), "Vertex should be on box outline."
 
+def test_make_vertices_per_path(PARSED_SVG_TEST_STRUCTURES, monkeypatch):
+    paths = PARSED_SVG_TEST_STRUCTURES["box_paths"].get_paths()
+    params = {"Ds":5e-1, "Lx":300, "Ly":300, "Space":svg_parser.Space("0 0 300 300")}
+
+    monkeypatch.setitem(points_estimation.USER_CONFIG, "num_parallel_processes", 2)
+    vertices = svg_parser.make_vertices(paths, params, per_path=True)
+    point_counts = params["PathPointCounts"]
+    assert len(point_counts) == 4, "Should record the number of vertices of every path."
+    assert sum(point_counts) == len(vertices), "Should merge the vertices of all paths."
+
+    # The vertices of each path are merged in document order, starting at the start of the path.
+    path_starts = [(20, 200), (250, 200), (250, 100), (20, 100)]
+    path_offsets = np.concatenate([[0], np.cumsum(point_counts)[:-1]])
+    for path_offset, path_start in zip(path_offsets, path_starts):
+        assert np.allclose(vertices[path_offset].getPos(), path_start), "Each path should start a new run of vertices."
+
+    monkeypatch.setitem(points_estimation.USER_CONFIG, "num_parallel_processes", 1)
+    serial_vertices = svg_parser.make_vertices(paths, params, per_path=True)
+    assert [v.getPos() for v in serial_vertices] == [v.getPos() for v in vertices], "Parallel and serial meshing should agree."
+
+def test_make_vertex_chunks(PARSED_SVG_TEST_STRUCTURES, monkeypatch):
+    paths = PARSED_SVG_TEST_STRUCTURES["box_paths"].get_paths()
+    params = {"Ds":5e-1, "Lx":300, "Ly":300, "Space":svg_parser.Space("0 0 300 300")}
+    monkeypatch.setitem(points_estimation.USER_CONFIG, "num_parallel_processes", 2)
+
+    chunks = list(svg_parser.make_vertex_chunks(paths, params))
+    assert [ len(chunk) for chunk in chunks ] == params["PathPointCounts"], "Should yield the vertices of each path."
+    vertices = svg_parser.make_vertices(paths, params, per_path=True)
+    assert np.array_equal(np.concatenate([ chunk.coords for chunk in chunks ]), vertices.coords), "Should yield the same vertices as per-path mode."
+
+def test_make_vertices_with_springs_and_beams(PARSED_SVG_TEST_STRUCTURES, monkeypatch, tmp_path):
+    paths = PARSED_SVG_TEST_STRUCTURES["box"].get_paths()
+    params = {"Ds":5e-1, "Lx":300, "Ly":300, "Space":svg_parser.Space("0 0 300 300")}
+    monkeypatch.setitem(svg_parser.MESH_CONFIG, "springs", True)
+    monkeypatch.setitem(svg_parser.MESH_CONFIG, "beams", True)
+
+    vertices = svg_parser.make_vertices(paths, params)
+    assert params["PathPointCounts"] == [len(vertices)], "Should record the number of vertices of each path."
+    springs = params["Springs"]
+    beams = params["Beams"]
+    assert len(springs["master"]) == len(beams["mID"]) == len(vertices) - 1, "The box is closed, so its springs and beams should wrap around."
+    assert springs["slave"][-1] == 1, "The last spring should connect back to the first vertex."
+    assert np.allclose(springs["restlen"], 0.5, rtol=svg_parser.ERROR_TOL), "Resting lengths should be about ds."
+
+    # Streaming writes the same springs and beams path by path.
+    monkeypatch.setitem(svg_parser.MESH_CONFIG, "per_path", True)
+    svg_parser.make_vertices(paths, params)
+    geo_obj.write_geo_arrays(str(tmp_path / "whole"), "spring", **params["Springs"])
+    geo_obj.write_geo_arrays(str(tmp_path / "whole"), "beam", **params["Beams"])
+    svg_parser.write_streamed_mesh(str(tmp_path / "streamed"), paths, params)
+    for geo_type in ["spring", "beam"]:
+        whole_lines = (tmp_path / f"whole.{geo_type}").read_text().split("\n")
+        streamed_lines = (tmp_path / f"streamed.{geo_type}").read_text().split("\n")
+        assert int(streamed_lines[0]) == int(whole_lines[0]) and streamed_lines[1:] == whole_lines[1:]
+
+def test_make_vertices_with_mesh_record():
+    def make_paths(d):
+        return [ svg_parser.SvgObject(ET.Element("path", {"d": d})) ]
+    old_d = "M 10 10 L 100 10 L 100 100 C 120 150 150 150 200 100 L 200 10 L 290 10"
+    new_d = "M 10 10 L 100 10 L 100 100 C 120 170 170 150 200 100 L 200 10 L 290 10"
+    params = {"Ds":1, "Lx":300, "Ly":300, "Space":svg_parser.Space("0 0 300 300")}
+
+    old_vertices = svg_parser.make_vertices(make_paths(old_d), params)
+    mesh_record = params["MeshRecord"]
+    new_vertices = svg_parser.make_vertices(make_paths(new_d), params, mesh_record=mesh_record)
+    old_positions = [ v.getPos() for v in old_vertices ]
+    new_positions = [ v.getPos() for v in new_vertices ]
+
+    # Only the vertices on the edited curve (segment 2) may change.
+    num_before = np.sum(mesh_record["vertex_segments"] < 2)
+    num_after = np.sum(mesh_record["vertex_segments"] > 2)
+    assert new_positions[:num_before] == old_positions[:num_before], "Vertices before the edit should be bit-identical."
+    assert new_positions[-num_after:] == old_positions[-num_after:], "Vertices after the edit should be bit-identical."
+    assert len(new_positions) > len(old_positions), "The refit curve is longer, so it should get more vertices."
+
+    rel_errors = np.abs( np.linalg.norm(np.diff(new_positions, axis=0), axis=1) - 1 )
+    refit_rel_errors = rel_errors[num_before - 1:len(new_positions) - num_after]
+    assert np.max(refit_rel_errors) < svg_parser.ERROR_TOL, "Refit points should be spaced ds apart, including at the kept vertices."
+
+    unchanged_vertices = svg_parser.make_vertices(make_paths(old_d), params, mesh_record=mesh_record)
+    assert [ v.getPos() for v in unchanged_vertices ] == old_positions, "An unchanged path should keep all vertices."
+
 def test_chk_vertex_dist():
     vertex1 = geo_obj.Vertex(-2, -1)
     vertex2 = geo_obj.Vertex(1, 3)
@@ -303,4 +385,160 @@ def test_SvgObject_get_aggregate_transform_matrix(PARSED_SVG_TEST_STRUCTURES):
     assert np.allclose( path_svg_objects[2].get_aggregate_transform_matrix(), expected_matrix_2 ), "Should return a matrix representing all the transformations in the SVG file."
     assert np.allclose( path_svg_objects[3].get_aggregate_transform_matrix(), expected_matrix_3 ), "Should return a matrix representing all the transformations in the SVG file."
 
+def test_SvgObject_get_aggregate_transform_matrix_deep_nesting(tmp_path):
+    depth = 5000
+    svg_file = tmp_path / "deep.svg"
+    svg_file.write_text('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 300 300">' + '<g transform="translate(1, 0)">' * depth
+                        + '<path d="M 0 0 L 1 1"/>' + '</g>' * depth + '</svg>')
+    path = [ obj for obj in svg_parser.Svg(str(svg_file)).objcts if obj.type == "path" ][0]
+    assert np.allclose( path.get_aggregate_transform_matrix(), svg_parser.parse_transform(f"translate({depth}, 0)") ), \
+        "Should compose the transforms of all ancestors without recursing through them."
+    path.parent.attr["transform"] = "scale(2)"
+    path.attr["transform"] = "translate(0, 1)"
+    assert np.allclose( path.get_aggregate_transform_matrix(), svg_parser.parse_transform(f"translate({depth - 1}, 0) scale(2) translate(0, 1)") ), \
+        "Changed transforms of the object and its ancestors should be composed again."
+
+def test_SvgObject_get_aggregate_transform_matrix_hand_built():
+    group = svg_parser.SvgObject(ET.Element("g", {"transform" : "translate(10, 0)"}))
+    path = svg_parser.SvgObject(ET.Element("path", {"transform" : "scale(2)"}))
+    path.parent = group
+    assert np.allclose( path.get_aggregate_transform_matrix(), svg_parser.parse_transform("translate(10, 0) scale(2)") ), \
+        "Should compose the transforms of ancestors which were not composed yet."
+    group.attr["transform"] = "translate(99, 0)"
+    assert np.allclose( path.get_aggregate_transform_matrix(), svg_parser.parse_transform("translate(99, 0) scale(2)") ), \
+        "Should compose the matrix again if the transform of an ancestor has changed."
+
+
+
+def test_SvgStream(PARSED_SVG_TEST_STRUCTURES, SVG_TEST_STRUCTURES):
+    for file_name in SVG_TEST_STRUCTURES:
+        svg_stream = svg_parser.SvgStream( SVG_TEST_STRUCTURES[file_name]["absolute_file_path"] )
+        svg = PARSED_SVG_TEST_STRUCTURES[file_name]
+        assert (svg_stream.space.get_origin(), svg_stream.space.get_max_size()) == (svg.space.get_origin(), svg.space.get_max_size()), \
+            "Should find the same space as Svg."
+        streamed_paths = list(svg_stream.get_paths())
+        paths = svg.get_paths()
+        assert [ path.get("d") for path in streamed_paths ] == [ path.get("d") for path in paths ], "Should yield the same paths in the same order."
+        for streamed_path, path in zip(streamed_paths, paths):
+            assert np.allclose( streamed_path.get_aggregate_transform_matrix(), path.get_aggregate_transform_matrix() ), \
+                "Should aggregate the transforms of the ancestors."
+        assert len(svg_stream.root) == 0, "Should discard the processed elements."
+
+    paths, params = svg_parser.get_paths(SVG_TEST_STRUCTURES["box_paths"]["absolute_file_path"], {}, iterparse=True)
+    params.update({"Ds":5e-1, "Lx":300, "Ly":300})
+    chunks = list(svg_parser.make_vertex_chunks(paths, params))
+    assert len(chunks) == 4, "Should mesh the paths of an iterator."
+
+def test_compose_transform():
+    parent_transform_matrix = svg_parser.compose_transform(None, "translate(10, 20)")
+    assert parent_transform_matrix is svg_parser.compose_transform(None, "translate(10, 20)"), "Repeated transforms should share their matrix."
+    assert svg_parser.compose_transform(parent_transform_matrix, None) is parent_transform_matrix, \
+        "An element without transform should share the matrix of its parent."
+    transform_matrix = svg_parser.compose_transform(parent_transform_matrix, "scale(2)")
+    assert np.array_equal( transform_matrix, svg_parser.parse_transform("translate(10, 20) scale(2)") )
+    assert not transform_matrix.flags.writeable, "Shared matrices should be read-only."
+
+def test_transform_path(PARSED_SVG_TEST_STRUCTURES):
+    A = svg_parser.transform_matrix({"Space":svg_parser.Space("0 0 300 300"), "Lx":0.5, "Ly":0.5})
+    for path in PARSED_SVG_TEST_STRUCTURES["box_paths_nested-grouped_many-transforms"].get_paths() + PARSED_SVG_TEST_STRUCTURES["complex_shape"].get_paths():
+        expected_segments = [ svgpathtools.path.transform(segment, A.dot(path.get_aggregate_transform_matrix()))
+                              for segment in svgpathtools.parse_path(path.get("d")) ]
+        segments = svg_parser.transform_path(path, A).to_segments()
+        assert [ type(segment) for segment in segments ] == [ type(segment) for segment in expected_segments ]
+        for segment, expected_segment in zip(segments, expected_segments):
+            assert np.allclose([segment.start, segment.end], [expected_segment.start, expected_segment.end]), \
+                "Should apply the aggregate transform and the map to experimental space."
+
+def test_PathData_transformed_arc():
+    tf = np.array([ [2, 0.5, 3], [0.3, -1.5, 7], [0, 0, 1] ])
+    arc = svgpathtools.parse_path("M 10 10 A 30 15 20 1 0 50 40")[0]
+    transformed_arc = svg_parser.parse_path_data("M 10 10 A 30 15 20 1 0 50 40").transformed(tf).to_segments()[0]
+    points = np.array([ arc.point(t) for t in np.linspace(0, 1, 20) ])
+    points = tf[0,0] * points.real + tf[0,1] * points.imag + tf[0,2] + 1j * (tf[1,0] * points.real + tf[1,1] * points.imag + tf[1,2])
+    # Express the transformed points in the frame of the transformed ellipse.
+    points = (points - transformed_arc.center) * np.exp(-1j * np.radians(transformed_arc.rotation))
+    assert np.allclose( (points.real / transformed_arc.radius.real)**2 + (points.imag / transformed_arc.radius.imag)**2, 1 ), \
+        "The transformed points should lie on the transformed ellipse."
+    mapped_mid_point = complex(*tf[:2].dot([arc.point(0.5).real, arc.point(0.5).imag, 1]))
+    transformed_arc_points = np.array([ transformed_arc.point(t) for t in np.linspace(0, 1, 2001) ])
+    assert np.min(np.abs(transformed_arc_points - mapped_mid_point)) < 0.1, "Should sweep the image of the arc, not its complement."
+    assert transformed_arc.sweep != arc.sweep, "A reflection should reverse the sweep."
+
+def test_parse_path_data():
+    path_data = [ "M 0 0 L 10 10 20 5 l 1 1 2 2 h 5 3 v 2 -1 H 1 V 2 z",
+                  "m 1 2 c 1 2 3 4 5 6 1 1 2 2 3 3 s 1 1 4 4 2 0 3 1 S 9 9 10 10 Z",
+                  "M0,0C1,2,3,4,5,6S7,8,9,10Q1 1 2 2T 3 3 4 4t1 1q 1 2 3 4 t 5 5",
+                  "M 10 10 A 30 15 20 1 0 50 40 a 5 5 0 0110 0 A 0 5 0 0 1 60 60 L 1 1 z M 5 5 l 1 1 Z",
+                  "M1e2-3.5.5.5L-1-1 m 5 5 h 1 v 1 z m 1 1 l 2 2 z" ]
+    for d in path_data:
+        assert svg_parser.parse_path_data(d).to_segments() == list(svgpathtools.parse_path(d)), \
+            "Should parse the same segments as svgpathtools."
+    assert len(svg_parser.parse_path_data("M 5 5 A 5 5 0 0 1 5 5 L 6 6")) == 1, "Should omit arcs whose endpoints coincide."
+    d = "M 0.1 0.7" + " l 0.1 0.2 c 0.1 0.3 0.2 0.1 0.3 0.3 s 0.3 0.1 0.7 0.1 t 0.1 0.1 t 0.2 0 h 0.3 v -0.1 z m 0.3 0.1" * 500
+    segments = svgpathtools.parse_path(d)
+    path_data = svg_parser.parse_path_data(d)
+    assert len(path_data) == len(segments) and np.allclose( path_data.control_points, [ list(segment.bpoints()) + [0j] * (4 - len(segment.bpoints())) for segment in segments ], rtol=0, atol=1e-9 ), \
+        "Should follow long chains of relative commands and closepaths."
+    for d in ["M 1", "M 1 1 L", "M 1 1 Z 2 2", "1 1", "L 1 1 Z"]:
+        with pytest.raises(ValueError):
+            svg_parser.parse_path_data(d)
+
+def test_PathData_to_path_evaluator():
+    d = "M 10 10 A 30 15 20 1 0 50 40 q 10 -30 20 0 c 5 5 10 -10 20 0 L 10 10"
+    evaluator = svg_parser.parse_path_data(d).to_path_evaluator()
+    segments = svgpathtools.parse_path(d)
+    assert np.allclose( evaluator.segment_lengths, [ segment.length() for segment in segments ], rtol=1e-6 ), \
+        "The quadrature should agree with the segment lengths of svgpathtools."
+    assert np.allclose( evaluator.point(evaluator.segment_boundaries[[0, 1, -1]]), [ segments[0].start, segments[1].start, segments[-1].end ] )
+
+def test_use_instances(PARSED_SVG_TEST_STRUCTURES, SVG_TEST_STRUCTURES):
+    paths = PARSED_SVG_TEST_STRUCTURES["cilia_instances"].get_paths()
+    assert [ path.instance_of for path in paths ] == ["base"] + ["cilium"] * 6 + [None], \
+        "Should mesh the referenced paths once per <use> element, but not the contents of <defs> and <symbol>."
+    assert np.allclose( paths[2].get_aggregate_transform_matrix(), svg_parser.parse_transform("translate(50, 250) translate(40, 0)") ), \
+        "Should translate the instance by the x and y attributes of the <use> element."
+    assert np.allclose( paths[5].get_aggregate_transform_matrix(),
+                        svg_parser.parse_transform("translate(50, 250) translate(100, 0) rotate(10) translate(30, 0)") ), \
+        "Should follow nested <use> elements."
 
+    params = {"Ds":5e-1, "Lx":300, "Ly":300, "Space":svg_parser.Space("0 0 300 300")}
+    path_instances = svg_parser.PathInstances(svg_parser.transform_matrix(params))
+    motions = [ path_instances.match(path)[1] for path in paths ]
+    assert [ motion is not None for motion in motions ] == [False, False, True, True, True, True, False, False], \
+        "Should reuse the prototype only for instances which differ from it by a rigid motion."
+
+    vertices = svg_parser.make_vertices(paths, params, per_path=True)
+    for path in paths:
+        path.instance_of = None
+    expected_vertices = svg_parser.make_vertices(paths, params, per_path=True)
+    assert np.allclose( vertices.coords, expected_vertices.coords, atol=1e-6 ), "Moving the vertices of the prototype should be the same as fitting them."
+
+    streamed_paths, _ = svg_parser.get_paths(SVG_TEST_STRUCTURES["cilia_instances"]["absolute_file_path"], {}, iterparse=True)
+    chunks = list(svg_parser.make_vertex_chunks(streamed_paths, params))
+    assert np.allclose( np.concatenate([ chunk.coords for chunk in chunks ]), vertices.coords ), "Should reuse the vertices of streamed instances."
+
+def test_SpacingReport():
+    # Two paths with violations at vertices 2-3 and 5 of the first path and at vertices 8-10 of the second.
+    vertex_errors = np.array([np.nan, 0, 0.5, 0.2, 0, 0.3, 0, np.nan, 1, 2, 0.4, 0.01])
+    coords = np.column_stack((np.arange(12), np.zeros(12)))
+    spacing_report = svg_parser.SpacingReport(tolerance=0.1, worst_k=2)
+    spacing_report.add(coords[:7], vertex_errors[:7], [7])
+    spacing_report.add(coords[7:], vertex_errors[7:], [5])
+    assert spacing_report.num_errors == 10 and np.isclose(spacing_report.get_mean_error(), 0.441)
+    assert (spacing_report.num_violations, spacing_report.num_runs, spacing_report.num_paths_with_violations) == (6, 3, 2)
+    assert spacing_report.worst_errors[:, :3].tolist() == [[2, 9, 1], [1, 8, 1]], "Should keep the worst errors with their vertex and path."
+    assert spacing_report.worst_paths.tolist() == [[3, 2, 2, 2, 0], [3, 1, 3, 8, 1]], \
+        "Should keep the number of violations, runs and the longest run of the worst paths."
+    percentiles = spacing_report.get_percentiles([50, 100])
+    assert 0.2 <= percentiles[0] <= 0.3 * 1.03 and percentiles[1] == 2, "Should read the percentiles from the histogram."
+
+def test_make_vertices_spacing_errors(PARSED_SVG_TEST_STRUCTURES):
+    paths = PARSED_SVG_TEST_STRUCTURES["box_paths"].get_paths()
+    params = {"Ds":5e-1, "Lx":300, "Ly":300, "Space":svg_parser.Space("0 0 300 300")}
+    vertices = svg_parser.make_vertices(paths, params, per_path=True)
+    spacing_errors = params["SpacingErrors"]
+    assert spacing_errors.shape == (len(vertices),)
+    path_starts = np.cumsum([0] + params["PathPointCounts"][:-1])
+    assert np.all(np.isnan(spacing_errors[path_starts])) and np.sum(np.isnan(spacing_errors)) == len(path_starts), \
+        "Only the first vertex of each path should have no spacing error."
+    assert np.nanmax(spacing_errors) < svg_parser.ERROR_TOL